@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks import baselines
+from benchmarks.runner import Result, format_results
+
+
+SIZE_UNITS = {"GiB": 1024**3, "MiB": 1024**2, "KiB": 1024, "B": 1}
+
+
+def _size(value: str) -> int:
+    for unit, factor in SIZE_UNITS.items():
+        if value.endswith(unit):
+            return int(value.removesuffix(unit)) * factor
+
+    return int(value)
+
+
+def _sizes(value: str) -> list[int]:
+    return [_size(part.strip()) for part in value.split(",") if part.strip()]
+
+
+async def _run(args: argparse.Namespace) -> list[Result]:
+    # Imported here, once the environment points the settings at the
+    # benchmark database and storage
+    from benchmarks.harness import Seeder, asgi_client, http_client, reset_database
+    from benchmarks.scenarios import SCENARIOS, Context, Options
+    from src.core.config import get_settings
+    from src.db.session import engine
+    from src.utils.storage import get_storage_backend
+
+    await reset_database(get_settings().db)
+
+    options = Options(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        warmup=args.warmup,
+        upload_sizes=args.upload_sizes,
+        listing_sizes=args.listing_sizes,
+        search_size=args.search_size,
+    )
+    client_context = (
+        asgi_client()
+        if args.transport == "asgi"
+        else http_client(args.concurrency, args.workers, args.server)
+    )
+    results: list[Result] = []
+
+    try:
+        async with client_context as client:
+            context = Context(client, Seeder(), options)
+
+            for name in args.scenario or SCENARIOS:
+                results += await SCENARIOS[name](context)
+    finally:
+        await get_storage_backend().close()
+        await engine.dispose()
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the API against a freshly created database"
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=["auth", "users", "upload", "listing", "search", "stream"],
+        help="run only this scenario, may be repeated (default: all)",
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=20,
+        help="requests sent before measuring each benchmark",
+    )
+    parser.add_argument(
+        "--upload-sizes",
+        type=_sizes,
+        default="16KiB,1MiB,16MiB",
+        help="comma separated file sizes of the upload benchmarks",
+    )
+    parser.add_argument(
+        "--listing-sizes",
+        type=_sizes,
+        default="1000,10000,100000",
+        help="comma separated file counts of the listing benchmarks",
+    )
+    parser.add_argument(
+        "--search-size",
+        type=int,
+        default=1_000_000,
+        help="files the search benchmarks search among",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["asgi", "http"],
+        default="asgi",
+        help="call the app in process (default) or through a uvicorn server",
+    )
+    parser.add_argument(
+        "--server",
+        choices=["uvicorn", "prod"],
+        default="uvicorn",
+        help="server of --transport http: plain uvicorn (default) or the "
+        "production one of src.server",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="server workers for --transport http"
+    )
+    parser.add_argument(
+        "--database",
+        help="database to recreate for the run, must end with _bench "
+        "(default: the configured one with _bench appended)",
+    )
+    parser.add_argument("--save", metavar="NAME", help="save the results as a baseline")
+    parser.add_argument(
+        "--compare", metavar="NAME", help="compare the results with a baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change counted as a regression (default: 0.1)",
+    )
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="exit with status 1 when the comparison finds a regression",
+    )
+    args = parser.parse_args()
+
+    from src.core.config import Settings
+
+    storage_root = tempfile.mkdtemp(prefix="bench-storage-")
+    os.environ["DB__DATABASE"] = args.database or f"{Settings().db.database}_bench"
+    os.environ["STORAGE__ROOT"] = storage_root
+    # Background deletion of the deleted users' files would skew the numbers
+    os.environ.setdefault("REAPER__ENABLED", "false")
+
+    try:
+        results = asyncio.run(_run(args))
+    finally:
+        shutil.rmtree(storage_root, ignore_errors=True)
+
+    print(format_results(results))
+
+    if args.save:
+        path = baselines.save(args.save, results, vars(args))
+        print(f"\nsaved baseline to {path}")
+
+    if args.compare:
+        baseline = baselines.load(args.compare)
+        changes = baselines.compare(results, baseline)
+        print()
+        print(baselines.format_changes(changes, baseline, args.threshold))
+
+        if args.fail_on_regression and any(
+            change.is_regression(args.threshold) for change in changes
+        ):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
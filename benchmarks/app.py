@@ -0,0 +1,53 @@
+from typing import Annotated, Any
+
+from fastapi import Depends, FastAPI, Request
+
+from src.bootstrap import create_app
+from src.core.config import Settings, get_settings
+from src.db.uow import UnitOfWork, get_uow
+from src.services.auth import AuthService, get_auth_service
+
+
+class StubYandexSSO:
+    """
+    Accepts every callback, the Yandex account id is the ``code`` parameter
+    """
+
+    async def __aenter__(self) -> "StubYandexSSO":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        pass
+
+    async def verify_and_process(self, request: Request) -> dict[str, Any]:
+        yandex_id = request.query_params["code"]
+
+        return {
+            "id": yandex_id,
+            "email": f"{yandex_id}@bench.local",
+            "first_name": "Bench",
+            "last_name": "User",
+            "display_name": yandex_id,
+            "picture": None,
+        }
+
+
+def get_stub_auth_service(
+    request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
+) -> AuthService:
+    service = AuthService(settings, request, uow)
+    service.sso = StubYandexSSO()
+
+    return service
+
+
+def create_bench_app() -> FastAPI:
+    """
+    The application with Yandex SSO stubbed out
+    """
+    app = create_app()
+    app.dependency_overrides[get_auth_service] = get_stub_auth_service
+
+    return app
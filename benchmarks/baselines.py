@@ -0,0 +1,129 @@
+import datetime as dt
+import json
+import platform
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable
+
+from benchmarks.runner import Result
+
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+
+# Compared metrics, and whether a higher value is better
+METRICS = {"p50": False, "p95": False, "p99": False, "rps": True}
+
+
+def _git(*args: str) -> str | None:
+    try:
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict[str, Any]:
+    """
+    Where the results come from, so baselines of different machines or
+    commits aren't mistaken for each other
+    """
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": dt.datetime.now(dt.UTC).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.node(),
+    }
+
+
+def baseline_path(name: str) -> Path:
+    """
+    A bare name refers to ``benchmarks/baselines/<name>.json``
+    """
+    path = Path(name)
+    if path.suffix == ".json" or len(path.parts) > 1:
+        return path
+
+    return BASELINES_DIR / f"{name}.json"
+
+
+def save(name: str, results: Iterable[Result], options: dict[str, Any]) -> Path:
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "environment": environment(),
+                "options": options,
+                "results": {result.name: result.to_dict() for result in results},
+            },
+            file,
+            indent=2,
+        )
+
+    return path
+
+
+def load(name: str) -> dict[str, Any]:
+    with open(baseline_path(name)) as file:
+        return json.load(file)
+
+
+@dataclass(frozen=True, slots=True)
+class Change:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline - 1 if self.baseline else 0.0
+
+    def is_regression(self, threshold: float) -> bool:
+        ratio = -self.ratio if METRICS[self.metric] else self.ratio
+        return ratio > threshold
+
+
+def compare(results: Iterable[Result], baseline: dict[str, Any]) -> list[Change]:
+    """
+    Changes of every metric of the benchmarks present in both runs
+    """
+    changes = []
+
+    for result in results:
+        previous = baseline["results"].get(result.name)
+        if previous is None:
+            continue
+
+        for metric in METRICS:
+            changes.append(
+                Change(result.name, metric, previous[metric], getattr(result, metric))
+            )
+
+    return changes
+
+
+def format_changes(
+    changes: Iterable[Change], baseline: dict[str, Any], threshold: float
+) -> str:
+    env = baseline["environment"]
+    lines = [
+        f"compared to {env['commit']}{' (dirty)' if env['dirty'] else ''} "
+        f"from {env['created_at']} on {env['machine']}",
+        f"{'benchmark':<32} {'metric':>6} {'baseline':>10} {'current':>10} "
+        f"{'change':>8}",
+    ]
+
+    for change in changes:
+        mark = "  REGRESSION" if change.is_regression(threshold) else ""
+        lines.append(
+            f"{change.name:<32} {change.metric:>6} {change.baseline:>10.2f} "
+            f"{change.current:>10.2f} {change.ratio:>+8.1%}{mark}"
+        )
+
+    return "\n".join(lines)
@@ -0,0 +1,299 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import AsyncIterator
+
+import asyncpg
+import httpx
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import insert, text
+
+from benchmarks.app import create_bench_app
+from src.core.config import BASE_DIR, DB
+from src.db.models import Blob, User
+from src.db.session import engine
+from src.schemas.auth import TokenPairResponseSchema
+from src.schemas.user import ReadUserSchema, UserTokenDataSchema
+from src.utils.auth import create_tokens
+from src.utils.pagination import encode_cursor
+from src.utils.storage import get_blob_storage
+
+
+# Words of the seeded file names and tags, for the search benchmarks
+WORDS = ("rock", "jazz", "blues", "metal", "piano", "night", "summer", "live")
+
+# Rows per insert, well below the bind parameter limit of asyncpg
+INSERT_BATCH_SIZE = 1000
+
+
+async def reset_database(db: DB, suffix: str = "_bench") -> None:
+    """
+    Recreate the benchmark or test database and migrate it to the latest schema
+    """
+    if not db.database.endswith(suffix):
+        raise RuntimeError(
+            f"Refusing to recreate {db.database!r}, the name must end with {suffix}"
+        )
+
+    connection = await asyncpg.connect(
+        db.model_copy(update={"database": "postgres"}).dsn
+    )
+
+    try:
+        await connection.execute(
+            f'DROP DATABASE IF EXISTS "{db.database}" WITH (FORCE)'
+        )
+        await connection.execute(f'CREATE DATABASE "{db.database}"')
+    finally:
+        await connection.close()
+
+    config = Config(str(BASE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BASE_DIR / "migrations"))
+    await asyncio.to_thread(command.upgrade, config, "head")
+
+
+def payload(size: int, seed: int) -> bytes:
+    """
+    MP3-looking content of ``size`` bytes, distinct for every seed
+    """
+    head = b"ID3" + seed.to_bytes(8, "big")
+    return head + random.Random(seed).randbytes(max(size - len(head), 0))
+
+
+class Seeder:
+    """
+    Fills the benchmark database and storage directly, bypassing the API
+    """
+
+    def __init__(self) -> None:
+        self.storage = get_blob_storage()
+
+    async def users(
+        self, count: int, prefix: str, is_admin: bool = False
+    ) -> list[ReadUserSchema]:
+        users = []
+
+        for start in range(0, count, INSERT_BATCH_SIZE):
+            rows = [
+                {
+                    "id": uuid.uuid4(),
+                    "yandex_id": f"{prefix}-{i}",
+                    "username": f"{prefix}-{i}",
+                    "first_name": "Bench",
+                    "last_name": "User",
+                    "email": f"{prefix}-{i}@bench.local",
+                    "is_admin": is_admin,
+                }
+                for i in range(start, min(start + INSERT_BATCH_SIZE, count))
+            ]
+
+            async with engine.begin() as connection:
+                result = await connection.execute(
+                    insert(User).values(rows).returning(*User.__table__.c)
+                )
+                users += [
+                    ReadUserSchema.model_validate(row, from_attributes=True)
+                    for row in result
+                ]
+
+        return users
+
+    async def blob(self, size: int, seed: int) -> tuple[uuid.UUID, str]:
+        """
+        Store a blob without any files, returns its id and key
+        """
+        content = payload(size, seed)
+        digest = hashlib.sha256(content).hexdigest()
+        key = self.storage.blob_key(digest)
+
+        async def chunks() -> AsyncIterator[bytes]:
+            yield content
+
+        await self.storage.backend.write(key, chunks())
+
+        async with engine.begin() as connection:
+            blob_id = await connection.scalar(
+                insert(Blob)
+                .values(
+                    hash=digest,
+                    path=key,
+                    size=size,
+                    mime_type="audio/mpeg",
+                    ref_count=0,
+                )
+                .returning(Blob.id)
+            )
+
+        return blob_id, key
+
+    async def files(
+        self, user_id: uuid.UUID, count: int, blob_id: uuid.UUID, key: str
+    ) -> None:
+        """
+        Add ``count`` files of the blob to the user, one second apart
+        """
+        async with engine.begin() as connection:
+            await connection.execute(
+                text(
+                    "INSERT INTO files "
+                    "(user_id, name, path, blob_id, tags_text, created_at, updated_at) "
+                    "SELECT :user_id, 'track ' || i || ' ' || w[1 + i % 8], "
+                    ":key, :blob_id, w[1 + i % 5] || ' ' || w[1 + i % 7], "
+                    "now() - i * interval '1 second', now() "
+                    "FROM generate_series(1, :count) AS i, "
+                    "(SELECT CAST(:words AS text[]) AS w) AS words"
+                ),
+                {
+                    "user_id": user_id,
+                    "words": list(WORDS),
+                    "key": key,
+                    "blob_id": blob_id,
+                    "count": count,
+                },
+            )
+            await connection.execute(
+                text("UPDATE blobs SET ref_count = ref_count + :count WHERE id = :id"),
+                {"count": count, "id": blob_id},
+            )
+
+    async def first_file(self, user_id: uuid.UUID) -> uuid.UUID:
+        async with engine.connect() as connection:
+            return await connection.scalar(
+                text("SELECT id FROM files WHERE user_id = :user_id LIMIT 1"),
+                {"user_id": user_id},
+            )
+
+    async def cursor_at(self, user_id: uuid.UUID, offset: int) -> str:
+        """
+        ``my-files`` cursor of the page starting after ``offset`` files
+        """
+        async with engine.connect() as connection:
+            row = (
+                await connection.execute(
+                    text(
+                        "SELECT created_at, id FROM files WHERE user_id = :user_id "
+                        "ORDER BY created_at DESC, id DESC OFFSET :offset LIMIT 1"
+                    ),
+                    {"user_id": user_id, "offset": max(offset - 1, 0)},
+                )
+            ).one()
+
+        return encode_cursor(row.created_at, row.id)
+
+    async def analyze(self) -> None:
+        async with engine.begin() as connection:
+            await connection.execute(text("ANALYZE"))
+
+
+def tokens(user: ReadUserSchema) -> TokenPairResponseSchema:
+    return create_tokens(UserTokenDataSchema(user_id=str(user.id)))
+
+
+@contextlib.asynccontextmanager
+async def asgi_client() -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Client calling the application in this process, no sockets involved
+    """
+    app = create_bench_app()
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            yield client
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(
+    client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 30
+) -> None:
+    deadline = time.monotonic() + timeout
+
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with {process.returncode}")
+
+        try:
+            await client.get("/api/users/my-info")
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+
+            await asyncio.sleep(0.2)
+
+
+def _server_command(server: str, port: int, workers: int) -> list[str]:
+    if server == "prod":
+        return [
+            sys.executable,
+            "-m",
+            "src.server",
+            "benchmarks.app:create_bench_app",
+            "--factory",
+        ]
+
+    return [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "benchmarks.app:create_bench_app",
+        "--factory",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--no-access-log",
+        "--log-level",
+        "warning",
+    ]
+
+
+@contextlib.asynccontextmanager
+async def http_client(
+    concurrency: int, workers: int, server: str = "uvicorn"
+) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Client of a server started for the run, plain uvicorn or the production
+    one of ``src.server``
+    """
+    port = _free_port()
+    process = subprocess.Popen(
+        _server_command(server, port, workers),
+        cwd=BASE_DIR,
+        env={
+            **os.environ,
+            "SERVER__HOST": "127.0.0.1",
+            "SERVER__PORT": str(port),
+            "SERVER__WORKERS": str(workers),
+        },
+    )
+
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency
+            ),
+            timeout=60,
+        ) as client:
+            await _wait_ready(client, process)
+            yield client
+    finally:
+        process.terminate()
+        await asyncio.to_thread(process.wait, 30)
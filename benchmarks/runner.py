@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterable
+
+if TYPE_CHECKING:
+    import httpx
+
+
+Send = Callable[["httpx.AsyncClient", int], Awaitable["httpx.Response"]]
+
+
+@dataclass(frozen=True, slots=True)
+class Result:
+    name: str
+    requests: int
+    errors: int
+    concurrency: int
+    seconds: float
+    rps: float
+    # Latencies in milliseconds
+    p50: float
+    p95: float
+    p99: float
+    mean: float
+    max: float
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def _percentiles(latencies: list[float]) -> tuple[float, float, float]:
+    if len(latencies) < 2:
+        value = latencies[0] if latencies else 0.0
+        return value, value, value
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+async def measure(
+    name: str,
+    client: "httpx.AsyncClient",
+    send: Send,
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+    expected: Iterable[int] = (200,),
+) -> Result:
+    """
+    Send ``requests`` requests from ``concurrency`` concurrent clients
+
+    ``send`` gets the client and the request number, numbers are unique within
+    the run, warmup included, so requests can be made distinct. The first
+    ``warmup`` requests are sent one by one and left out of the results.
+    """
+    expected = frozenset(expected)
+    counter = itertools.count()
+
+    for _ in range(warmup):
+        await send(client, next(counter))
+
+    latencies: list[float] = []
+    errors = 0
+    first_error: str | None = None
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal errors, first_error, remaining
+
+        while remaining > 0:
+            remaining -= 1
+            number = next(counter)
+            start = time.perf_counter()
+
+            try:
+                response = await send(client, number)
+            except Exception as e:
+                errors += 1
+                first_error = first_error or repr(e)
+                continue
+
+            latency = time.perf_counter() - start
+
+            if response.status_code not in expected:
+                errors += 1
+                first_error = first_error or (
+                    f"{response.status_code}: {response.text[:200]}"
+                )
+                continue
+
+            latencies.append(latency * 1000)
+
+    start = time.perf_counter()
+    async with asyncio.TaskGroup() as group:
+        for _ in range(min(concurrency, requests)):
+            group.create_task(worker())
+    seconds = time.perf_counter() - start
+
+    p50, p95, p99 = _percentiles(latencies)
+
+    return Result(
+        name=name,
+        requests=len(latencies),
+        errors=errors,
+        concurrency=concurrency,
+        seconds=seconds,
+        rps=len(latencies) / seconds if seconds else 0.0,
+        p50=p50,
+        p95=p95,
+        p99=p99,
+        mean=statistics.fmean(latencies) if latencies else 0.0,
+        max=max(latencies, default=0.0),
+        error=first_error,
+    )
+
+
+def format_results(results: Iterable[Result]) -> str:
+    lines = [
+        f"{'benchmark':<32} {'reqs':>6} {'errs':>5} {'rps':>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    ]
+
+    for result in results:
+        lines.append(
+            f"{result.name:<32} {result.requests:>6} {result.errors:>5} "
+            f"{result.rps:>9.1f} {result.p50:>9.2f} {result.p95:>9.2f} "
+            f"{result.p99:>9.2f}"
+        )
+        if result.error:
+            lines.append(f"  first error: {result.error}")
+
+    return "\n".join(lines)
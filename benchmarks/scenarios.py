@@ -0,0 +1,315 @@
+import sys
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable
+
+from benchmarks.harness import Seeder, payload, tokens
+from benchmarks.runner import Result, Send, measure
+from src.schemas.user import ReadUserSchema
+
+if TYPE_CHECKING:
+    import httpx
+
+
+# Owners of the files of the search benchmark, the search target is millions
+# of files in all
+SEARCH_OWNERS = 10
+
+# Upper bound of the bytes prepared for one upload benchmark
+UPLOAD_BUDGET = 128 * 1024 * 1024
+STREAM_FILE_SIZE = 8 * 1024 * 1024
+
+
+@dataclass(frozen=True, slots=True)
+class Options:
+    requests: int
+    concurrency: int
+    warmup: int
+    upload_sizes: list[int]
+    listing_sizes: list[int]
+    search_size: int
+
+
+@dataclass(frozen=True, slots=True)
+class Context:
+    client: "httpx.AsyncClient"
+    seeder: Seeder
+    options: Options
+
+    async def run(
+        self,
+        name: str,
+        send: Send,
+        requests: int | None = None,
+        expected: Iterable[int] = (200,),
+    ) -> Result:
+        print(f"running {name}", file=sys.stderr)
+
+        return await measure(
+            name,
+            self.client,
+            send,
+            requests or self.options.requests,
+            self.options.concurrency,
+            self.options.warmup,
+            expected,
+        )
+
+
+def _headers(user: ReadUserSchema) -> dict[str, str]:
+    return {"Authorization": f"Bearer {tokens(user).access_token}"}
+
+
+def _get(
+    path: str, headers: dict[str, str], params: dict[str, str] | None = None
+) -> Send:
+    async def send(client: "httpx.AsyncClient", number: int) -> "httpx.Response":
+        return await client.get(path, params=params, headers=headers)
+
+    return send
+
+
+async def auth(ctx: Context) -> list[Result]:
+    (user,) = await ctx.seeder.users(1, "auth")
+    refresh_token = tokens(user).refresh_token
+
+    async def refresh(client: "httpx.AsyncClient", number: int) -> "httpx.Response":
+        return await client.post(
+            "/api/auth/refresh", json={"refresh_token": refresh_token}
+        )
+
+    async def login(client: "httpx.AsyncClient", number: int) -> "httpx.Response":
+        return await client.get("/api/auth/callback", params={"code": user.yandex_id})
+
+    async def first_login(client: "httpx.AsyncClient", number: int) -> "httpx.Response":
+        # Requests in flight together sign up the same new account
+        account = number // ctx.options.concurrency
+        return await client.get(
+            "/api/auth/callback", params={"code": f"auth-new-{account}"}
+        )
+
+    return [
+        await ctx.run("auth.refresh", refresh),
+        await ctx.run("auth.login", login),
+        await ctx.run("auth.first-login", first_login),
+    ]
+
+
+async def users(ctx: Context) -> list[Result]:
+    (admin,) = await ctx.seeder.users(1, "users-admin", is_admin=True)
+    user, other = await ctx.seeder.users(2, "users")
+    # Every delete takes its own user
+    victims = await ctx.seeder.users(
+        ctx.options.requests + ctx.options.warmup, "users-deleted"
+    )
+    headers, admin_headers = _headers(user), _headers(admin)
+
+    async def update(client: "httpx.AsyncClient", number: int) -> "httpx.Response":
+        return await client.patch(
+            f"/api/users/{user.id}",
+            json={"username": f"users-{number}"},
+            headers=headers,
+        )
+
+    async def delete(client: "httpx.AsyncClient", number: int) -> "httpx.Response":
+        return await client.delete(
+            f"/api/users/{victims[number].id}", headers=admin_headers
+        )
+
+    return [
+        await ctx.run("users.my-info", _get("/api/users/my-info", headers)),
+        await ctx.run("users.get", _get(f"/api/users/{other.id}", headers)),
+        await ctx.run("users.update", update),
+        await ctx.run("users.delete", delete, expected=(204,)),
+    ]
+
+
+async def upload(ctx: Context) -> list[Result]:
+    (user,) = await ctx.seeder.users(1, "upload")
+    headers = _headers(user)
+    results = []
+
+    for size in ctx.options.upload_sizes:
+        requests = max(10, min(ctx.options.requests, UPLOAD_BUDGET // size))
+        base = payload(size, size)
+
+        for kind in ("form", "stream"):
+            # Distinct contents, so no upload is deduplicated against another
+            bodies = [
+                b"ID3" + f"{kind[0]}{number:07d}".encode() + base[11:]
+                for number in range(requests + ctx.options.warmup)
+            ]
+
+            async def send_form(
+                client: "httpx.AsyncClient", number: int
+            ) -> "httpx.Response":
+                return await client.post(
+                    "/api/files/upload",
+                    files={"file": ("track.mp3", bodies[number], "audio/mpeg")},
+                    data={"name": f"upload {number}"},
+                    headers=headers,
+                )
+
+            async def send_stream(
+                client: "httpx.AsyncClient", number: int
+            ) -> "httpx.Response":
+                return await client.post(
+                    "/api/files/upload/stream",
+                    params={"name": f"upload {number}"},
+                    content=bodies[number],
+                    headers=headers,
+                )
+
+            results.append(
+                await ctx.run(
+                    f"upload.{kind}[{_format_size(size)}]",
+                    send_form if kind == "form" else send_stream,
+                    requests,
+                    expected=(201,),
+                )
+            )
+
+    return results
+
+
+async def listing(ctx: Context) -> list[Result]:
+    (admin,) = await ctx.seeder.users(1, "listing-admin", is_admin=True)
+    blob_id, key = await ctx.seeder.blob(64 * 1024, seed=0)
+    owners: list[tuple[int, ReadUserSchema]] = []
+
+    for size in ctx.options.listing_sizes:
+        print(f"seeding {size} files", file=sys.stderr)
+        (user,) = await ctx.seeder.users(1, f"listing-{size}")
+        await ctx.seeder.files(user.id, size, blob_id, key)
+        owners.append((size, user))
+
+    await ctx.seeder.analyze()
+    results = []
+
+    for size, user in owners:
+        headers = _headers(user)
+        cursor = await ctx.seeder.cursor_at(user.id, size // 2)
+
+        results += [
+            await ctx.run(
+                f"listing.first-page[{size}]",
+                _get("/api/files/my-files", headers, {"limit": "50"}),
+            ),
+            await ctx.run(
+                f"listing.middle-page[{size}]",
+                _get("/api/files/my-files", headers, {"limit": "50", "cursor": cursor}),
+            ),
+            await ctx.run(
+                f"listing.large-page[{size}]",
+                _get("/api/files/my-files", headers, {"limit": "500"}),
+            ),
+            await ctx.run(
+                f"search.prefix[{size}]",
+                _get("/api/files/search", headers, {"q": "track 1", "limit": "50"}),
+            ),
+            await ctx.run(
+                f"search.tags[{size}]",
+                _get("/api/files/search", headers, {"q": "jazz", "limit": "50"}),
+            ),
+        ]
+
+    results.append(
+        await ctx.run(
+            f"search.everyone[{sum(ctx.options.listing_sizes)}]",
+            _get(
+                "/api/files/search",
+                _headers(admin),
+                {"q": "jazz night", "everyone": "true", "limit": "50"},
+            ),
+        )
+    )
+
+    return results
+
+
+async def search(ctx: Context) -> list[Result]:
+    """
+    Search among ``search_size`` files, the admin-wide one over all of them
+    """
+    size = ctx.options.search_size
+    (admin,) = await ctx.seeder.users(1, "search-admin", is_admin=True)
+    owners = await ctx.seeder.users(SEARCH_OWNERS, "search")
+    blob_id, key = await ctx.seeder.blob(64 * 1024, seed=2)
+
+    for user in owners:
+        print(f"seeding {size // SEARCH_OWNERS} files", file=sys.stderr)
+        await ctx.seeder.files(user.id, size // SEARCH_OWNERS, blob_id, key)
+
+    await ctx.seeder.analyze()
+
+    headers = _headers(admin)
+    everyone = {"everyone": "true", "limit": "50"}
+    second_page = (
+        await ctx.client.get(
+            "/api/files/search", params={**everyone, "q": "jazz night"}, headers=headers
+        )
+    ).json()["next_cursor"]
+
+    return [
+        await ctx.run(
+            f"search.everyone.rare[{size}]",
+            _get("/api/files/search", headers, {**everyone, "q": "track 12345"}),
+        ),
+        await ctx.run(
+            f"search.everyone.common[{size}]",
+            _get("/api/files/search", headers, {**everyone, "q": "jazz night"}),
+        ),
+        await ctx.run(
+            f"search.everyone.second-page[{size}]",
+            _get(
+                "/api/files/search",
+                headers,
+                {**everyone, "q": "jazz night", "cursor": second_page},
+            ),
+        ),
+        await ctx.run(
+            f"search.user[{size // SEARCH_OWNERS}]",
+            _get(
+                "/api/files/search",
+                _headers(owners[0]),
+                {"q": "jazz night", "limit": "50"},
+            ),
+        ),
+    ]
+
+
+async def stream(ctx: Context) -> list[Result]:
+    (user,) = await ctx.seeder.users(1, "stream")
+    blob_id, key = await ctx.seeder.blob(STREAM_FILE_SIZE, seed=1)
+    await ctx.seeder.files(user.id, 1, blob_id, key)
+    path = f"/api/files/{await ctx.seeder.first_file(user.id)}/stream"
+    headers = _headers(user)
+
+    return [
+        await ctx.run(
+            f"stream.full[{_format_size(STREAM_FILE_SIZE)}]", _get(path, headers)
+        ),
+        await ctx.run(
+            "stream.range[64KiB]",
+            _get(path, {**headers, "Range": "bytes=1048576-1114111"}),
+            expected=(206,),
+        ),
+    ]
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024 or size % 1024:
+            return f"{size}{unit}"
+        size //= 1024
+
+    return f"{size}GiB"
+
+
+SCENARIOS: dict[str, Callable[[Context], Awaitable[list[Result]]]] = {
+    "auth": auth,
+    "users": users,
+    "upload": upload,
+    "listing": listing,
+    "search": search,
+    "stream": stream,
+}
@@ -0,0 +1,88 @@
+"""
+Microbenchmark of ``TokenVerifier.verify`` for an HS256 access token
+
+Runs without the database: ``python -m benchmarks.tokens``. A miss verifies a
+token not seen before (full decode, then cached), a hit verifies the same
+token again.
+"""
+
+import argparse
+import time
+import uuid
+from datetime import UTC, datetime, timedelta
+from typing import Callable
+
+from src.utils.tokens import JWT_BACKENDS, TokenVerifier
+
+
+# At least 32 bytes, PyJWT warns about shorter HS256 keys
+SECRET_KEY = "benchmark-secret-key-of-32-bytes!"
+
+
+def _tokens(verifier: TokenVerifier, count: int) -> list[str]:
+    exp = datetime.now(UTC) + timedelta(minutes=30)
+
+    return [
+        verifier.encode({"user_id": str(uuid.uuid4()), "exp": exp, "type": "access"})
+        for _ in range(count)
+    ]
+
+
+def _per_call(verify: Callable[[str], object], tokens: list[str]) -> float:
+    """
+    Microseconds per ``verify`` call over ``tokens``
+    """
+    start = time.perf_counter()
+    for token in tokens:
+        verify(token)
+
+    return (time.perf_counter() - start) / len(tokens) * 1e6
+
+
+def measure(backend: str, number: int, repeat: int) -> tuple[float, float]:
+    """
+    Best of ``repeat`` runs of ``number`` calls, microseconds per miss and hit
+    """
+    misses, hits = [], []
+
+    for _ in range(repeat):
+        verifier = TokenVerifier(
+            JWT_BACKENDS[backend](), SECRET_KEY, max_size=number * 2
+        )
+        tokens = _tokens(verifier, number)
+
+        misses.append(_per_call(verifier.verify, tokens))
+        hits.append(_per_call(verifier.verify, [tokens[0]] * number))
+
+    return min(misses), min(hits)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time TokenVerifier.verify with a cold and a warm cache"
+    )
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=sorted(JWT_BACKENDS),
+        help="JWT backend to measure, may be repeated (default: all installed)",
+    )
+    parser.add_argument("--number", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'miss, us':>10} {'hit, us':>10} {'speedup':>8}")
+    for backend in args.backend or sorted(JWT_BACKENDS):
+        try:
+            miss, hit = measure(backend, args.number, args.repeat)
+        except RuntimeError as e:
+            if args.backend:
+                raise
+            print(f"{backend:<8} skipped: {e}")
+            continue
+
+        print(f"{backend:<8} {miss:>10.2f} {hit:>10.2f} {miss / hit:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""User tombstones
+
+Revision ID: 197a40353f8a
+Revises: 38299ebdb8df
+Create Date: 2026-10-18 15:11:37.204815
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "197a40353f8a"
+down_revision: Union[str, None] = "38299ebdb8df"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "users", sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True)
+    )
+
+    # Only live users have to be unique, a deleted one may sign up again
+    op.drop_index("users_yandex_id_idx", table_name="users")
+    op.create_index(
+        "users_yandex_id_idx",
+        "users",
+        ["yandex_id"],
+        unique=True,
+        postgresql_where=sa.text("deleted_at IS NULL"),
+    )
+    op.drop_constraint("users_email_key", "users", type_="unique")
+    op.create_index(
+        "users_email_idx",
+        "users",
+        ["email"],
+        unique=True,
+        postgresql_where=sa.text("deleted_at IS NULL"),
+    )
+    op.create_index(
+        "users_deleted_at_idx",
+        "users",
+        ["deleted_at"],
+        unique=False,
+        postgresql_where=sa.text("deleted_at IS NOT NULL"),
+    )
+    op.create_index(
+        "blobs_unreferenced_idx",
+        "blobs",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("ref_count <= 0"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("blobs_unreferenced_idx", table_name="blobs")
+    op.drop_index("users_deleted_at_idx", table_name="users")
+    op.drop_index("users_email_idx", table_name="users")
+    op.create_unique_constraint("users_email_key", "users", ["email"])
+    op.drop_index("users_yandex_id_idx", table_name="users")
+    op.create_index("users_yandex_id_idx", "users", ["yandex_id"], unique=True)
+    op.drop_column("users", "deleted_at")
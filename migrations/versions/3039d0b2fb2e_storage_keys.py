@@ -0,0 +1,46 @@
+"""Storage keys
+
+Revision ID: 3039d0b2fb2e
+Revises: 197a40353f8a
+Create Date: 2026-10-18 16:02:13.518204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.core.config import BASE_DIR
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3039d0b2fb2e"
+down_revision: Union[str, None] = "197a40353f8a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Absolute paths of blobs and of the older per-user files
+PATH_PATTERN = "/files/((?:blobs/|[0-9a-f-]{36}/).*)$"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Paths become keys relative to the storage root, i.e. the files directory
+    for table in ("files", "blobs"):
+        op.execute(
+            sa.text(
+                f"UPDATE {table} SET path = substring(path from :pattern) "
+                "WHERE path ~ :pattern"
+            ).bindparams(pattern=PATH_PATTERN)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ("files", "blobs"):
+        op.execute(
+            sa.text(
+                f"UPDATE {table} SET path = :root || path WHERE path NOT LIKE '/%'"
+            ).bindparams(root=f"{BASE_DIR / 'files'}/")
+        )
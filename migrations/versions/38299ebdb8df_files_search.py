@@ -0,0 +1,77 @@
+"""Files search
+
+Revision ID: 38299ebdb8df
+Revises: fdad453aee34
+Create Date: 2026-10-18 14:02:51.660413
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "38299ebdb8df"
+down_revision: Union[str, None] = "fdad453aee34"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column("files", sa.Column("tags_text", sa.String(), nullable=True))
+    # Adding a stored generated column rewrites the table once
+    op.add_column(
+        "files",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('simple', name), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(tags_text, '')), 'B')",
+                persisted=True,
+            ),
+            nullable=False,
+        ),
+    )
+    op.execute(
+        "UPDATE files SET tags_text = m.tags_text "
+        "FROM (SELECT file_id, concat_ws(' ', title, artist, album, genre) AS tags_text "
+        "FROM file_metadata) AS m WHERE m.file_id = files.id"
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "files_search_vector_idx",
+            "files",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "files_name_trgm_idx",
+            "files",
+            [sa.text("lower(name) gin_trgm_ops")],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "files_name_trgm_idx", table_name="files", postgresql_concurrently=True
+        )
+        op.drop_index(
+            "files_search_vector_idx", table_name="files", postgresql_concurrently=True
+        )
+
+    op.drop_column("files", "search_vector")
+    op.drop_column("files", "tags_text")
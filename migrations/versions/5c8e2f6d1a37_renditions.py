@@ -0,0 +1,77 @@
+"""Renditions
+
+Revision ID: 5c8e2f6d1a37
+Revises: e4b1c07a9d52
+Create Date: 2026-10-18 19:52:03.118472
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c8e2f6d1a37"
+down_revision: Union[str, None] = "e4b1c07a9d52"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "renditions",
+        sa.Column(
+            "blob_id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            nullable=False,
+        ),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("mime_type", sa.String(), nullable=False),
+        sa.Column(
+            "last_used_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["blob_id"],
+            ["blobs.id"],
+            name=op.f("renditions_blob_id_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("renditions_pkey")),
+        sa.UniqueConstraint("blob_id", "name", name=op.f("renditions_blob_id_key")),
+    )
+    op.create_index(
+        "renditions_last_used_at_idx", "renditions", ["last_used_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("renditions_last_used_at_idx", table_name="renditions")
+    op.drop_table("renditions")
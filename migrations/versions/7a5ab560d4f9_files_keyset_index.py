@@ -0,0 +1,52 @@
+"""Files keyset index
+
+Revision ID: 7a5ab560d4f9
+Revises: bdaa7b1f28ba
+Create Date: 2026-10-18 11:03:41.902117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7a5ab560d4f9"
+down_revision: Union[str, None] = "bdaa7b1f28ba"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The composite index also serves plain user_id lookups
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "files_user_id_created_at_id_idx",
+            "files",
+            ["user_id", "created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "files_user_id_idx", table_name="files", postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "files_user_id_idx",
+            "files",
+            ["user_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "files_user_id_created_at_id_idx",
+            table_name="files",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,82 @@
+"""Waveform peaks
+
+Revision ID: 9b3d7e1f4c26
+Revises: 5c8e2f6d1a37
+Create Date: 2026-10-18 21:07:45.291638
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3d7e1f4c26"
+down_revision: Union[str, None] = "5c8e2f6d1a37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "peaks",
+        sa.Column(
+            "blob_id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            nullable=False,
+        ),
+        sa.Column("path", sa.String(), nullable=True),
+        sa.Column("levels", postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("failed", sa.Boolean(), server_default="false", nullable=False),
+        sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column(
+            "id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["blob_id"],
+            ["blobs.id"],
+            name=op.f("peaks_blob_id_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("peaks_pkey")),
+        sa.UniqueConstraint("blob_id", name=op.f("peaks_blob_id_key")),
+    )
+    op.create_index(
+        "peaks_pending_idx",
+        "peaks",
+        ["created_at"],
+        unique=False,
+        postgresql_where=sa.text("path IS NULL AND failed IS false"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "peaks_pending_idx",
+        table_name="peaks",
+        postgresql_where=sa.text("path IS NULL AND failed IS false"),
+    )
+    op.drop_table("peaks")
@@ -0,0 +1,37 @@
+"""Upload lock token
+
+Revision ID: a6c41f0e8d73
+Revises: 9b3d7e1f4c26
+Create Date: 2026-10-19 09:12:08.517204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a6c41f0e8d73"
+down_revision: Union[str, None] = "9b3d7e1f4c26"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "uploads",
+        sa.Column(
+            "lock_token",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            nullable=True,
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("uploads", "lock_token")
@@ -0,0 +1,72 @@
+"""Content addressed blobs
+
+Revision ID: bdaa7b1f28ba
+Revises: 908f325297f3
+Create Date: 2026-10-18 10:12:04.518230
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = "bdaa7b1f28ba"
+down_revision: Union[str, None] = "908f325297f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "blobs",
+        sa.Column("hash", sa.String(), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("mime_type", sa.String(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), server_default="1", nullable=False),
+        sa.Column(
+            "id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("blobs_pkey")),
+        sa.UniqueConstraint("hash", name=op.f("blobs_hash_key")),
+    )
+    op.add_column(
+        "files",
+        sa.Column(
+            "blob_id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            nullable=True,
+        ),
+    )
+    op.create_index(op.f("files_blob_id_idx"), "files", ["blob_id"], unique=False)
+    op.create_foreign_key(
+        op.f("files_blob_id_fkey"), "files", "blobs", ["blob_id"], ["id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(op.f("files_blob_id_fkey"), "files", type_="foreignkey")
+    op.drop_index(op.f("files_blob_id_idx"), table_name="files")
+    op.drop_column("files", "blob_id")
+    op.drop_table("blobs")
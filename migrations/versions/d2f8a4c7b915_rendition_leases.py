@@ -0,0 +1,42 @@
+"""Rendition leases
+
+Revision ID: d2f8a4c7b915
+Revises: a6c41f0e8d73
+Create Date: 2026-10-19 11:36:52.804317
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f8a4c7b915"
+down_revision: Union[str, None] = "a6c41f0e8d73"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A rendition being encoded has a row without the object yet
+    op.alter_column("renditions", "path", existing_type=sa.String(), nullable=True)
+    op.alter_column("renditions", "size", existing_type=sa.BigInteger(), nullable=True)
+    op.alter_column("renditions", "mime_type", existing_type=sa.String(), nullable=True)
+    op.add_column(
+        "renditions",
+        sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM renditions WHERE path IS NULL")
+    op.drop_column("renditions", "locked_until")
+    op.alter_column(
+        "renditions", "mime_type", existing_type=sa.String(), nullable=False
+    )
+    op.alter_column("renditions", "size", existing_type=sa.BigInteger(), nullable=False)
+    op.alter_column("renditions", "path", existing_type=sa.String(), nullable=False)
@@ -0,0 +1,72 @@
+"""Resumable uploads
+
+Revision ID: e4b1c07a9d52
+Revises: 3039d0b2fb2e
+Create Date: 2026-10-18 18:41:27.630914
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4b1c07a9d52"
+down_revision: Union[str, None] = "3039d0b2fb2e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "uploads",
+        sa.Column(
+            "user_id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            nullable=False,
+        ),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("length", sa.BigInteger(), nullable=False),
+        sa.Column("offset", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("mime_type", sa.String(), nullable=True),
+        sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column(
+            "id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+            name=op.f("uploads_user_id_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("uploads_pkey")),
+    )
+    op.create_index(op.f("uploads_user_id_idx"), "uploads", ["user_id"], unique=False)
+    op.create_index("uploads_expires_at_idx", "uploads", ["expires_at"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uploads_expires_at_idx", table_name="uploads")
+    op.drop_index(op.f("uploads_user_id_idx"), table_name="uploads")
+    op.drop_table("uploads")
@@ -0,0 +1,149 @@
+"""File metadata
+
+Revision ID: fdad453aee34
+Revises: 7a5ab560d4f9
+Create Date: 2026-10-18 13:24:09.318022
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "fdad453aee34"
+down_revision: Union[str, None] = "7a5ab560d4f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "file_metadata",
+        sa.Column(
+            "file_id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            nullable=False,
+        ),
+        sa.Column("format", sa.String(), nullable=False),
+        sa.Column("codec", sa.String(), nullable=True),
+        sa.Column("duration", sa.Float(), nullable=True),
+        sa.Column("bitrate", sa.Integer(), nullable=True),
+        sa.Column("sample_rate", sa.Integer(), nullable=True),
+        sa.Column("channels", sa.Integer(), nullable=True),
+        sa.Column("bits_per_sample", sa.Integer(), nullable=True),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("artist", sa.String(), nullable=True),
+        sa.Column("album", sa.String(), nullable=True),
+        sa.Column("genre", sa.String(), nullable=True),
+        sa.Column("date", sa.String(), nullable=True),
+        sa.Column("track_number", sa.Integer(), nullable=True),
+        sa.Column(
+            "tags",
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default="{}",
+            nullable=False,
+        ),
+        sa.Column(
+            "id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["file_id"],
+            ["files.id"],
+            name=op.f("file_metadata_file_id_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("file_metadata_pkey")),
+        sa.UniqueConstraint("file_id", name=op.f("file_metadata_file_id_key")),
+    )
+    op.create_index(
+        op.f("file_metadata_album_idx"), "file_metadata", ["album"], unique=False
+    )
+    op.create_index(
+        op.f("file_metadata_artist_idx"), "file_metadata", ["artist"], unique=False
+    )
+    op.create_index(
+        op.f("file_metadata_bitrate_idx"), "file_metadata", ["bitrate"], unique=False
+    )
+    op.create_index(
+        op.f("file_metadata_codec_idx"), "file_metadata", ["codec"], unique=False
+    )
+    op.create_index(
+        op.f("file_metadata_duration_idx"),
+        "file_metadata",
+        ["duration"],
+        unique=False,
+    )
+    op.create_table(
+        "metadata_jobs",
+        sa.Column(
+            "file_id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            nullable=False,
+        ),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("failed", sa.Boolean(), server_default="false", nullable=False),
+        sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column(
+            "id",
+            sqlalchemy_utils.types.uuid.UUIDType(binary=False),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["file_id"],
+            ["files.id"],
+            name=op.f("metadata_jobs_file_id_fkey"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("metadata_jobs_pkey")),
+        sa.UniqueConstraint("file_id", name=op.f("metadata_jobs_file_id_key")),
+    )
+    op.create_index(
+        "metadata_jobs_created_at_idx", "metadata_jobs", ["created_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("metadata_jobs_created_at_idx", table_name="metadata_jobs")
+    op.drop_table("metadata_jobs")
+    op.drop_index(op.f("file_metadata_duration_idx"), table_name="file_metadata")
+    op.drop_index(op.f("file_metadata_codec_idx"), table_name="file_metadata")
+    op.drop_index(op.f("file_metadata_bitrate_idx"), table_name="file_metadata")
+    op.drop_index(op.f("file_metadata_artist_idx"), table_name="file_metadata")
+    op.drop_index(op.f("file_metadata_album_idx"), table_name="file_metadata")
+    op.drop_table("file_metadata")
@@ -1,3 +1,4 @@
 from .auth import router as auth_router
 from .users import router as users_router
 from .files import router as files_router
+from .system import router as system_router
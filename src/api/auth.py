@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends
 from fastapi_sso.sso.yandex import YandexSSO
 
 from src.core.config import Settings, get_settings
+from src.db.uow import read_only
 from src.schemas.auth import (
     TokenPairResponseSchema,
     RefreshTokenSchema,
@@ -13,9 +14,10 @@ from src.schemas.user import ReadUserSchema
 from src.services.auth import AuthService, get_auth_service
 from src.services.refresh import RefreshTokenService, get_refresh_token_service
 from src.utils.auth import get_current_user
+from src.utils.serialization import TrustedSchemaRoute
 
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=TrustedSchemaRoute)
 
 
 @router.get("/login")
@@ -35,7 +37,11 @@ async def callback(auth_service: Annotated[AuthService, Depends(get_auth_service
     return await auth_service.execute()
 
 
-@router.post("/refresh", response_model=AccessTokenResponseSchema)
+@router.post(
+    "/refresh",
+    response_model=AccessTokenResponseSchema,
+    dependencies=[Depends(read_only)],
+)
 async def refresh(
     data: RefreshTokenSchema,
     refresh_token_service: Annotated[
@@ -1,20 +1,51 @@
 import uuid
+from email.utils import format_datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, status, UploadFile, Form, HTTPException
+from pydantic import StringConstraints
 
-from src.schemas.file import ReadFileSchema
+from fastapi import (
+    APIRouter,
+    Depends,
+    status,
+    UploadFile,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+
+from src.db.uow import read_only
+from src.schemas.file import (
+    ReadFileSchema,
+    FilePageSchema,
+    BatchUploadResultSchema,
+    FileSearchPageSchema,
+    StartUploadSchema,
+    ReadUploadSchema,
+)
 from src.schemas.user import ReadUserSchema
 from src.services.files import (
     UploadFilesService,
     get_upload_file_service,
+    ResumableUploadService,
+    get_resumable_upload_service,
     GetUsersFilesService,
     get_get_users_files_service,
+    StreamFileService,
+    get_stream_file_service,
+    GetFilePeaksService,
+    get_file_peaks_service,
+    SearchFilesService,
+    get_search_files_service,
 )
 from src.utils.auth import get_current_user
+from src.utils.serialization import TrustedSchemaRoute
 
 
-router = APIRouter(prefix="/files", tags=["files"])
+router = APIRouter(prefix="/files", tags=["files"], route_class=TrustedSchemaRoute)
 
 
 @router.post(
@@ -32,24 +63,231 @@ async def upload_file(
     return await service.execute(file, current_user, name)
 
 
-@router.get("/my-files", response_model=list[ReadFileSchema])
+@router.post(
+    "/upload/stream",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ReadFileSchema,
+)
+async def upload_file_stream(
+    request: Request,
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[UploadFilesService, Depends(get_upload_file_service)],
+    name: str = Query(max_length=100),
+):
+    """
+    Upload a file sent as the raw request body
+    """
+    content_length = request.headers.get("content-length")
+
+    return await service.execute_stream(
+        request.stream(),
+        int(content_length) if content_length and content_length.isdigit() else None,
+        current_user,
+        name,
+    )
+
+
+@router.post("/upload/batch", response_model=BatchUploadResultSchema)
+async def upload_files_batch(
+    files: list[UploadFile],
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[UploadFilesService, Depends(get_upload_file_service)],
+    names: list[Annotated[str, StringConstraints(max_length=100)]] = Form(),
+):
+    """
+    Upload many files at once, the n-th name belongs to the n-th file
+
+    Every part is checked like a single upload and gets its own result.
+    """
+    return await service.execute_batch(files, names, current_user)
+
+
+def _upload_headers(upload: ReadUploadSchema) -> dict[str, str]:
+    return {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.length),
+        "Upload-Expires": format_datetime(upload.expires_at, usegmt=True),
+        "Cache-Control": "no-store",
+    }
+
+
+@router.post(
+    "/uploads", status_code=status.HTTP_201_CREATED, response_model=ReadUploadSchema
+)
+async def create_upload(
+    data: StartUploadSchema,
+    request: Request,
+    response: Response,
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[ResumableUploadService, Depends(get_resumable_upload_service)],
+):
+    """
+    Start a resumable upload of a file of ``length`` bytes
+
+    Send the content with ``PATCH`` to the returned ``Location`` in as many
+    chunks as needed, then finalize the upload.
+    """
+    upload = await service.create(data, current_user)
+    response.headers["Location"] = str(
+        request.url_for("append_upload", upload_id=upload.id)
+    )
+
+    return upload
+
+
+@router.head("/uploads/{upload_id}")
+async def get_upload_offset(
+    upload_id: uuid.UUID,
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[ResumableUploadService, Depends(get_resumable_upload_service)],
+):
+    """
+    Get the offset to resume the upload from in the ``Upload-Offset`` header
+    """
+    upload = await service.get(upload_id, current_user)
+
+    return Response(headers=_upload_headers(upload))
+
+
+@router.patch("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def append_upload(
+    upload_id: uuid.UUID,
+    request: Request,
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[ResumableUploadService, Depends(get_resumable_upload_service)],
+    upload_offset: int = Header(ge=0),
+):
+    """
+    Append the raw request body to the upload at ``Upload-Offset``
+
+    The offset must be the one the server has. The new offset is returned in
+    the ``Upload-Offset`` header.
+    """
+    upload = await service.append(
+        upload_id, upload_offset, request.stream(), current_user
+    )
+
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT, headers=_upload_headers(upload)
+    )
+
+
+@router.post(
+    "/uploads/{upload_id}/finalize",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ReadFileSchema,
+)
+async def finalize_upload(
+    upload_id: uuid.UUID,
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[ResumableUploadService, Depends(get_resumable_upload_service)],
+):
+    """
+    Turn the complete upload into a file
+    """
+    return await service.finalize(upload_id, current_user)
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_upload(
+    upload_id: uuid.UUID,
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[ResumableUploadService, Depends(get_resumable_upload_service)],
+):
+    """
+    Abandon the upload and drop what was received
+    """
+    await service.delete(upload_id, current_user)
+
+
+@router.get(
+    "/my-files", response_model=FilePageSchema, dependencies=[Depends(read_only)]
+)
 async def get_my_files(
     current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
     service: Annotated[GetUsersFilesService, Depends(get_get_users_files_service)],
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None),
+):
+    """
+    Get a page of files of the current user, newest first
+    """
+    return await service.execute(current_user, limit=limit, cursor=cursor)
+
+
+@router.get(
+    "/search", response_model=FileSearchPageSchema, dependencies=[Depends(read_only)]
+)
+async def search_files(
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[SearchFilesService, Depends(get_search_files_service)],
+    q: str = Query(min_length=1, max_length=100),
+    everyone: bool = Query(False),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None),
 ):
     """
-    Get the list of files of the current user
+    Search files by name prefix and by words of the name and tags, best first
+
+    Searches the current user's files, admins can search everyone's with
+    ``everyone=true``.
     """
-    return await service.execute(current_user)
+    return await service.execute(
+        current_user, q, everyone=everyone, limit=limit, cursor=cursor
+    )
 
 
-@router.get("/{user_id}", response_model=list[ReadFileSchema])
+@router.get(
+    "/{user_id}", response_model=FilePageSchema, dependencies=[Depends(read_only)]
+)
 async def get_users_files(
     user_id: uuid.UUID,
     service: Annotated[GetUsersFilesService, Depends(get_get_users_files_service)],
     current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None),
+):
+    """
+    Get a page of files of the user with the given id, newest first
+    """
+    return await service.execute(current_user, user_id, limit=limit, cursor=cursor)
+
+
+@router.api_route(
+    "/{file_id}/stream", methods=["GET", "HEAD"], dependencies=[Depends(read_only)]
+)
+async def stream_file(
+    file_id: uuid.UUID,
+    request: Request,
+    service: Annotated[StreamFileService, Depends(get_stream_file_service)],
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    rendition: str | None = Query(None, max_length=50),
 ):
     """
-    Get the list of files of the user with the given id
+    Stream or download the file content, supports byte ranges for seeking
+
+    A lower bitrate rendition is streamed to clients hinting a slow or
+    metered connection, ``rendition`` picks one explicitly, ``original``
+    the original.
+    """
+    return await service.execute(file_id, current_user, request, rendition)
+
+
+@router.api_route(
+    "/{file_id}/peaks", methods=["GET", "HEAD"], dependencies=[Depends(read_only)]
+)
+async def get_file_peaks(
+    file_id: uuid.UUID,
+    request: Request,
+    service: Annotated[GetFilePeaksService, Depends(get_file_peaks_service)],
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    samples_per_pixel: int | None = Query(None, gt=0),
+):
+    """
+    Waveform peaks of the file in the audiowaveform binary format
+
+    Served at the coarsest precomputed zoom level with at most
+    ``samples_per_pixel`` samples per min/max pair, the most detailed one by
+    default.
     """
-    return await service.execute(current_user, user_id)
+    return await service.execute(file_id, current_user, request, samples_per_pixel)
@@ -0,0 +1,84 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from src.db.uow import read_only
+from src.schemas.system import PoolStatsSchema, ProfileSchema, ProfileSummarySchema
+from src.schemas.user import ReadUserSchema
+from src.services.system import (
+    GetProfileService,
+    ListProfilesService,
+    PoolStatsService,
+    get_get_profile_service,
+    get_list_profiles_service,
+    get_pool_stats_service,
+)
+from src.utils.auth import get_current_user
+from src.utils.serialization import TrustedSchemaRoute
+
+
+router = APIRouter(prefix="/system", tags=["system"], route_class=TrustedSchemaRoute)
+
+
+@router.get(
+    "/pool", response_model=list[PoolStatsSchema], dependencies=[Depends(read_only)]
+)
+async def get_pool_stats(
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[PoolStatsService, Depends(get_pool_stats_service)],
+):
+    """
+    Get database connection pool stats (superusers only)
+    """
+    return await service.execute(current_user)
+
+
+@router.get(
+    "/profiles",
+    response_model=list[ProfileSummarySchema],
+    dependencies=[Depends(read_only)],
+)
+async def list_profiles(
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[ListProfilesService, Depends(get_list_profiles_service)],
+):
+    """
+    List the stored request profiles, newest first (superusers only)
+    """
+    return await service.execute(current_user)
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    response_model=ProfileSchema,
+    dependencies=[Depends(read_only)],
+)
+async def get_profile(
+    profile_id: str,
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[GetProfileService, Depends(get_get_profile_service)],
+):
+    """
+    Get a request profile with its stack samples (superusers only)
+    """
+    return await service.execute(current_user, profile_id)
+
+
+@router.get(
+    "/profiles/{profile_id}/stacks",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(read_only)],
+)
+async def get_profile_stacks(
+    profile_id: str,
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+    service: Annotated[GetProfileService, Depends(get_get_profile_service)],
+):
+    """
+    Get the stack samples of a request profile in the collapsed format read by
+    flame graph tools (superusers only)
+    """
+    profile = await service.execute(current_user, profile_id)
+
+    return "".join(f"{stack} {count}\n" for stack, count in profile.stacks.items())
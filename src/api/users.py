@@ -3,7 +3,13 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, status
 
-from src.schemas.user import ReadUserSchema, UpdateUserSchema
+from src.db.uow import read_only
+from src.schemas.user import (
+    ReadUserSchema,
+    UpdateUserSchema,
+    DeleteUsersSchema,
+    DeleteUsersResultSchema,
+)
 from src.services.users import (
     get_retrieve_user_service,
     RetrieveUserService,
@@ -11,14 +17,19 @@ from src.services.users import (
     get_update_user_service,
     get_delete_user_service,
     DeleteUserService,
+    get_delete_users_service,
+    DeleteUsersService,
 )
 from src.utils.auth import get_current_user
+from src.utils.serialization import TrustedSchemaRoute
 
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=TrustedSchemaRoute)
 
 
-@router.get("/my-info", response_model=ReadUserSchema)
+@router.get(
+    "/my-info", response_model=ReadUserSchema, dependencies=[Depends(read_only)]
+)
 async def get_my_info(
     current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
 ):
@@ -28,7 +39,9 @@ async def get_my_info(
     return current_user
 
 
-@router.get("/{user_id}", response_model=ReadUserSchema)
+@router.get(
+    "/{user_id}", response_model=ReadUserSchema, dependencies=[Depends(read_only)]
+)
 async def get_user(
     user_id: uuid.UUID,
     service: Annotated[RetrieveUserService, Depends(get_retrieve_user_service)],
@@ -61,5 +74,21 @@ async def delete_user(
 ) -> None:
     """
     Delete user
+
+    Files of the user are removed in the background.
     """
     return await service.execute(user_id, current_user)
+
+
+@router.post("/bulk-delete", response_model=DeleteUsersResultSchema)
+async def delete_users(
+    data: DeleteUsersSchema,
+    service: Annotated[DeleteUsersService, Depends(get_delete_users_service)],
+    current_user: Annotated[ReadUserSchema, Depends(get_current_user)],
+) -> DeleteUsersResultSchema:
+    """
+    Delete many users at once
+
+    Files of the users are removed in the background.
+    """
+    return await service.execute(data, current_user)
@@ -1,12 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from src.core.config import get_settings, Settings
+from src.db.session import engine, replica_engines
 from src.routers import apply_routers
+from src.utils.cache import get_user_cache
+from src.utils.instrumentation import (
+    MetricsMiddleware,
+    get_metrics_exporter,
+    instrument_engine,
+)
+from src.utils.mime import get_mime_detector
+from src.utils.profiling import ProfilingMiddleware, get_profiler
+from src.utils.storage import get_storage_backend
+from src.workers.reaper import get_storage_reaper
 
 
 settings: Settings = get_settings()
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    user_cache = get_user_cache()
+
+    await user_cache.backend.start()
+
+    stop_reaper = asyncio.Event()
+    reaper = None
+    if settings.reaper.enabled:
+        reaper = asyncio.create_task(get_storage_reaper().run(stop_reaper))
+
+    stop_metrics = asyncio.Event()
+    metrics = None
+    if settings.metrics.enabled:
+        metrics = asyncio.create_task(get_metrics_exporter().run(stop_metrics))
+
+    yield
+
+    stop_reaper.set()
+    if reaper is not None:
+        await reaper
+
+    stop_metrics.set()
+    if metrics is not None:
+        await metrics
+
+    await user_cache.backend.stop()
+    get_mime_detector().shutdown()
+    await get_storage_backend().close()
+
+
 def create_app() -> FastAPI:
     app = FastAPI(
         title=settings.fastapi.title,
@@ -14,8 +61,26 @@ def create_app() -> FastAPI:
         version=settings.fastapi.version,
         docs_url=settings.fastapi.docs_url,
         redoc_url=settings.fastapi.redoc_url,
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
 
     app = apply_routers(app)
 
+    if settings.metrics.enabled or settings.profiling.enabled:
+        instrument_engine(engine, "primary")
+        for i, replica in enumerate(replica_engines):
+            instrument_engine(replica, f"replica-{i}")
+
+    if settings.profiling.enabled:
+        app.add_middleware(ProfilingMiddleware, profiler=get_profiler())
+
+    if settings.metrics.enabled:
+        app.add_route(
+            settings.metrics.path,
+            get_metrics_exporter().endpoint,
+            include_in_schema=False,
+        )
+        app.add_middleware(MetricsMiddleware)
+
     return app
@@ -1,5 +1,6 @@
 from functools import cached_property, lru_cache
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -17,6 +18,20 @@ class DB(BaseModel):
     password: str = "postgres"
     provider: str = "postgresql+asyncpg"
 
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = False
+    statement_cache_size: int = 100
+    # PgBouncer in transaction mode can't keep server-side prepared statements
+    pgbouncer: bool = False
+
+    # Full SQLAlchemy URLs of read replicas, e.g. postgresql+asyncpg://...
+    replica_urls: list[str] = []
+    # How long a user's reads stay on the primary after their own write
+    replica_stickiness_seconds: float = 5
+
     naming_convention: dict[str, str] = {
         "ix": "%(column_0_label)s_idx",
         "uq": "%(table_name)s_%(column_0_name)s_key",
@@ -29,6 +44,10 @@ class DB(BaseModel):
     def url(self) -> str:
         return f"postgresql+asyncpg://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
 
+    @property
+    def dsn(self) -> str:
+        return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
+
 
 class Yandex(BaseModel):
     client_id: str = "some_client_id"
@@ -59,14 +78,37 @@ class Dev(BaseModel):
     reload: bool = True
 
 
+class Server(BaseModel):
+    host: str = "0.0.0.0"
+    port: int = 8000
+    # Worker processes, 0 starts one per CPU
+    workers: int = 0
+    loop: Literal["auto", "asyncio", "uvloop"] = "uvloop"
+    http: Literal["auto", "h11", "httptools"] = "httptools"
+    backlog: int = 2048
+    keep_alive: int = 5
+    # How long stopping workers wait for requests in flight, uploads included
+    graceful_timeout: float = 30
+    limit_concurrency: int | None = None
+    forwarded_allow_ips: str = "127.0.0.1"
+    access_log: bool = False
+
+
 class Auth(BaseModel):
     secret_key: str = "not_a_secret"
     access_token_expire_minutes: int = 15
     refresh_token_expire_minutes: int = 60 * 24 * 7
+    jwt_backend: Literal["jose", "pyjwt"] = "jose"
+    token_cache_size: int = 10_000
 
 
 class Files(BaseModel):
     max_size: int = 1024 * 1024 * 50
+    chunk_size: int = 1024 * 1024
+    sniff_size: int = 2048
+    mime_workers: int = 2
+    batch_max_files: int = 100
+    batch_concurrency: int = 4
     allowed_types: list[str] = [
         "audio/mpeg",
         "audio/wav",
@@ -75,13 +117,150 @@ class Files(BaseModel):
     ]
 
 
+class Uploads(BaseModel):
+    # Resumable uploads untouched for this long are deleted with their part
+    expire_seconds: int = 60 * 60 * 24
+    # Lease of the request appending a chunk or finalizing, renewed while it
+    # runs, so only a request that died holds the upload that long
+    lock_seconds: int = 60 * 10
+
+
+class Rendition(BaseModel):
+    codec: Literal["opus", "mp3"]
+    # kbit/s
+    bitrate: int
+
+
+class Transcode(BaseModel):
+    enabled: bool = True
+    # ffmpeg binary, looked up in PATH unless it is a path
+    encoder: str = "ffmpeg"
+    renditions: dict[str, Rendition] = {
+        "opus-48": Rendition(codec="opus", bitrate=48),
+        "opus-96": Rendition(codec="opus", bitrate=96),
+        "mp3-96": Rendition(codec="mp3", bitrate=96),
+        "mp3-160": Rendition(codec="mp3", bitrate=160),
+    }
+    concurrency: int = 2
+    timeout: float = 600
+    # Renditions beyond this many bytes in total are evicted, least recently
+    # streamed first
+    disk_budget: int = 1024 * 1024 * 1024 * 10
+    # How stale the last use of a rendition may get before it is updated
+    touch_interval: float = 60 * 60
+
+
+class S3(BaseModel):
+    # Any S3-compatible endpoint, buckets are addressed path-style
+    endpoint_url: str = "http://localhost:9000"
+    bucket: str = "files"
+    region: str = "us-east-1"
+    access_key: str = "some_access_key"
+    secret_key: str = "some_secret_key"
+    # Uploads larger than one part go multipart, S3 needs at least 5 MiB parts
+    part_size: int = 1024 * 1024 * 8
+    concurrency: int = 4
+    timeout: float = 30
+
+
+class Storage(BaseModel):
+    backend: Literal["local", "s3"] = "local"
+    # Directory of the local backend, also holds the upload temp files
+    root: Path = BASE_DIR / "files"
+    s3: S3 = S3()
+
+    # Blobs go to <levels> nested directories named after <width> hex digits
+    # of their hash each, e.g. 2 and 2 give ab/cd/abcd..., 0 keeps them flat
+    layout_levels: int = 2
+    layout_width: int = 2
+    migrate_batch_size: int = 200
+    migrate_concurrency: int = 8
+
+
+class Cache(BaseModel):
+    user_max_size: int = 10_000
+    user_ttl_seconds: int = 60
+    invalidation_backend: Literal["local", "postgres"] = "local"
+    invalidation_channel: str = "user_cache_invalidation"
+
+
+class Metadata(BaseModel):
+    processes: int = 2
+    batch_size: int = 32
+    poll_interval: float = 2.0
+    lease_seconds: int = 300
+    # Seconds a file may be parsed, below lease_seconds so that a stuck file
+    # fails before another worker claims its job again
+    timeout: float = 120
+    max_attempts: int = 3
+    backfill_batch_size: int = 1000
+
+
+class Peaks(BaseModel):
+    # ffmpeg binary, looked up in PATH unless it is a path
+    decoder: str = "ffmpeg"
+    # Audio is decoded to mono at this rate, in Hz
+    sample_rate: int = 22050
+    # Zoom levels, in samples per min/max pair
+    levels: list[int] = [256, 1024, 4096]
+    bits: Literal[8, 16] = 8
+    processes: int = 2
+    batch_size: int = 8
+    poll_interval: float = 2.0
+    lease_seconds: int = 600
+    timeout: float = 300
+    max_attempts: int = 3
+    backfill_batch_size: int = 1000
+
+
+class Reaper(BaseModel):
+    enabled: bool = True
+    batch_size: int = 500
+    concurrency: int = 16
+    poll_interval: float = 30.0
+
+
+class Metrics(BaseModel):
+    # Served by the public app, off unless asked for
+    enabled: bool = False
+    path: str = "/metrics"
+    # Bearer token scrapers have to send, the endpoint is open without it
+    token: str | None = None
+    # Shared directory for the metrics of several worker processes, emptied
+    # on every server start
+    multiproc_dir: str | None = None
+    flush_interval: float = 5.0
+
+
+class Profiling(BaseModel):
+    enabled: bool = False
+    # Fraction of requests profiled at random, 0 leaves only the debug header
+    sample_rate: float = 0.0
+    header: str = "X-Debug-Profile"
+    # Signs the debug header, defaults to the auth secret key
+    secret_key: str | None = None
+    interval: float = 0.005
+    dir: Path = BASE_DIR / "profiles"
+    max_profiles: int = 200
+
+
 class Settings(BaseSettings):
     db: DB = DB()
     yandex: Yandex = Yandex()
     fastapi: FastApi = FastApi()
     dev: Dev = Dev()
+    server: Server = Server()
     auth: Auth = Auth()
     files: Files = Files()
+    uploads: Uploads = Uploads()
+    transcode: Transcode = Transcode()
+    storage: Storage = Storage()
+    cache: Cache = Cache()
+    metadata: Metadata = Metadata()
+    peaks: Peaks = Peaks()
+    reaper: Reaper = Reaper()
+    metrics: Metrics = Metrics()
+    profiling: Profiling = Profiling()
 
     admin_emails: list[str] | None = None
 
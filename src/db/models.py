@@ -1,7 +1,18 @@
 import uuid
 import datetime as dt
 
-from sqlalchemy import MetaData, DateTime, ForeignKey
+from sqlalchemy import (
+    MetaData,
+    DateTime,
+    ForeignKey,
+    BigInteger,
+    Integer,
+    Index,
+    Computed,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.ext.asyncio import (
     AsyncAttrs,
 )
@@ -45,27 +56,259 @@ class Base(AsyncAttrs, DeclarativeBase):
 
 class User(Base):
     __tablename__ = "users"
+    # A deleted user keeps its row until the reaper is done with its files,
+    # meanwhile the same Yandex account can sign up again
+    __table_args__ = (
+        Index(
+            "users_yandex_id_idx",
+            "yandex_id",
+            unique=True,
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "users_email_idx",
+            "email",
+            unique=True,
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "users_deleted_at_idx",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+    )
 
-    yandex_id: Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
+    yandex_id: Mapped[str] = mapped_column(nullable=False)
     username: Mapped[str] = mapped_column(nullable=False)
     first_name: Mapped[str] = mapped_column(nullable=False)
     last_name: Mapped[str] = mapped_column(nullable=False)
-    email: Mapped[str] = mapped_column(nullable=False, unique=True)
+    email: Mapped[str] = mapped_column(nullable=False)
     is_admin: Mapped[bool] = mapped_column(nullable=False)
+    deleted_at: Mapped[dt.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
 
     files: Mapped[list["File"]] = relationship(back_populates="user")
 
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        Index("files_user_id_created_at_id_idx", "user_id", "created_at", "id"),
+        Index("files_search_vector_idx", "search_vector", postgresql_using="gin"),
+    )
 
     user_id: Mapped[uuid.UUID] = mapped_column(
         UUIDType(binary=False),
         ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
     name: Mapped[str] = mapped_column(nullable=False)
     path: Mapped[str] = mapped_column(nullable=False)
+    blob_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUIDType(binary=False),
+        ForeignKey("blobs.id"),
+        nullable=True,
+        index=True,
+    )
+
+    # Title, artist, album and genre from the extracted metadata
+    tags_text: Mapped[str | None] = mapped_column(nullable=True)
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', name), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(tags_text, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
 
     user: Mapped[User] = relationship(back_populates="files")
+    blob: Mapped["Blob | None"] = relationship(back_populates="files")
+
+
+# Trigram index for prefix and substring matches on the lowercased name
+Index(
+    "files_name_trgm_idx",
+    func.lower(File.name).label("name_lower"),
+    postgresql_using="gin",
+    postgresql_ops={"name_lower": "gin_trgm_ops"},
+)
+
+
+class Blob(Base):
+    __tablename__ = "blobs"
+    __table_args__ = (
+        Index("blobs_unreferenced_idx", "id", postgresql_where=text("ref_count <= 0")),
+    )
+
+    hash: Mapped[str] = mapped_column(nullable=False, unique=True)
+    path: Mapped[str] = mapped_column(nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    mime_type: Mapped[str] = mapped_column(nullable=False)
+    ref_count: Mapped[int] = mapped_column(
+        nullable=False, default=1, server_default="1"
+    )
+
+    files: Mapped[list[File]] = relationship(back_populates="blob")
+
+
+class FileMetadata(Base):
+    __tablename__ = "file_metadata"
+
+    file_id: Mapped[uuid.UUID] = mapped_column(
+        UUIDType(binary=False),
+        ForeignKey("files.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+    )
+    format: Mapped[str] = mapped_column(nullable=False)
+    codec: Mapped[str | None] = mapped_column(nullable=True, index=True)
+    duration: Mapped[float | None] = mapped_column(nullable=True, index=True)
+    bitrate: Mapped[int | None] = mapped_column(nullable=True, index=True)
+    sample_rate: Mapped[int | None] = mapped_column(nullable=True)
+    channels: Mapped[int | None] = mapped_column(nullable=True)
+    bits_per_sample: Mapped[int | None] = mapped_column(nullable=True)
+    title: Mapped[str | None] = mapped_column(nullable=True)
+    artist: Mapped[str | None] = mapped_column(nullable=True, index=True)
+    album: Mapped[str | None] = mapped_column(nullable=True, index=True)
+    genre: Mapped[str | None] = mapped_column(nullable=True)
+    date: Mapped[str | None] = mapped_column(nullable=True)
+    track_number: Mapped[int | None] = mapped_column(nullable=True)
+    tags: Mapped[dict[str, str]] = mapped_column(
+        JSONB, nullable=False, default=dict, server_default="{}"
+    )
+
+
+class MetadataJob(Base):
+    """
+    Pending metadata extraction of a file
+
+    A job is leased by a worker until ``locked_until`` and deleted once done.
+    """
+
+    __tablename__ = "metadata_jobs"
+    __table_args__ = (Index("metadata_jobs_created_at_idx", "created_at"),)
+
+    file_id: Mapped[uuid.UUID] = mapped_column(
+        UUIDType(binary=False),
+        ForeignKey("files.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+    )
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+    failed: Mapped[bool] = mapped_column(
+        nullable=False, default=False, server_default="false"
+    )
+    locked_until: Mapped[dt.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    error: Mapped[str | None] = mapped_column(nullable=True)
+
+
+class Upload(Base):
+    """
+    Resumable upload in progress
+
+    The bytes received so far are kept in a local part file named after the
+    upload, only the first ``offset`` bytes of it count. A request appending
+    to the upload or finalizing it holds it until ``locked_until``, renewing
+    the lease while it runs, and releases it with its ``lock_token``.
+    """
+
+    __tablename__ = "uploads"
+    __table_args__ = (Index("uploads_expires_at_idx", "expires_at"),)
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUIDType(binary=False),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    name: Mapped[str] = mapped_column(nullable=False)
+    length: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    offset: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
+    # Sniffed from the first chunk
+    mime_type: Mapped[str | None] = mapped_column(nullable=True)
+    locked_until: Mapped[dt.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    lock_token: Mapped[uuid.UUID | None] = mapped_column(
+        UUIDType(binary=False), nullable=True
+    )
+    expires_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+
+
+class Rendition(Base):
+    """
+    Transcoded copy of a blob, made on demand for clients that can't afford
+    the original
+
+    Renditions are a cache: the least recently used ones are evicted once
+    they take more than the disk budget. The row is claimed before encoding:
+    pending until ``path`` is set, leased by a process until ``locked_until``.
+    """
+
+    __tablename__ = "renditions"
+    __table_args__ = (
+        UniqueConstraint("blob_id", "name"),
+        Index("renditions_last_used_at_idx", "last_used_at"),
+    )
+
+    blob_id: Mapped[uuid.UUID] = mapped_column(
+        UUIDType(binary=False),
+        ForeignKey("blobs.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    # Name of the rendition in the transcoding settings
+    name: Mapped[str] = mapped_column(nullable=False)
+    path: Mapped[str | None] = mapped_column(nullable=True)
+    size: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    mime_type: Mapped[str | None] = mapped_column(nullable=True)
+    last_used_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    locked_until: Mapped[dt.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+
+class Peaks(Base):
+    """
+    Waveform peaks of a blob, an audiowaveform data object per zoom level
+
+    The row is also the job computing them: pending until ``path`` is set,
+    leased by a worker until ``locked_until``.
+    """
+
+    __tablename__ = "peaks"
+    __table_args__ = (
+        Index(
+            "peaks_pending_idx",
+            "created_at",
+            postgresql_where=text("path IS NULL AND failed IS false"),
+        ),
+    )
+
+    blob_id: Mapped[uuid.UUID] = mapped_column(
+        UUIDType(binary=False),
+        ForeignKey("blobs.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+    )
+    # Level objects are stored as <path>.<samples per pixel>.dat
+    path: Mapped[str | None] = mapped_column(nullable=True)
+    levels: Mapped[list[int] | None] = mapped_column(ARRAY(Integer), nullable=True)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+    failed: Mapped[bool] = mapped_column(
+        nullable=False, default=False, server_default="false"
+    )
+    locked_until: Mapped[dt.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    error: Mapped[str | None] = mapped_column(nullable=True)
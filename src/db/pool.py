@@ -0,0 +1,40 @@
+import time
+from typing import Any
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+
+class PoolMetrics:
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.acquire_time_total = 0.0
+        self.acquire_time_max = 0.0
+
+    def observe(self, acquire_time: float) -> None:
+        self.checkouts += 1
+        self.acquire_time_total += acquire_time
+        self.acquire_time_max = max(self.acquire_time_max, acquire_time)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long checkouts wait for a connection
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self) -> PoolProxiedConnection:
+        start = time.perf_counter()
+
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+
+        self.metrics.observe(time.perf_counter() - start)
+        return connection
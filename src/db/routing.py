@@ -0,0 +1,64 @@
+import itertools
+from typing import Sequence
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.utils.cache import TTLCache
+
+
+class ReplicaRouter:
+    """
+    Chooses the database a unit of work talks to
+
+    Writable work always goes to the primary. Read-only work is spread over the
+    replicas round-robin, except for keys (user ids) that committed a write in
+    the last ``stickiness`` seconds: those stay on the primary so they read
+    their own writes despite replication lag. The recent writers are only
+    known to the process, work whose reads are shared beyond the request asks
+    for the primary explicitly. Read-only sessions run in autocommit mode, so
+    a read never issues BEGIN/COMMIT.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: Sequence[AsyncEngine] = (),
+        stickiness: float = 5,
+        max_sticky_keys: int = 100_000,
+    ) -> None:
+        self.primary = primary
+        self.replicas = list(replicas)
+
+        self._writable = async_sessionmaker(primary, expire_on_commit=False)
+        self._primary_read_only = self._read_only_session_maker(primary)
+        self._replicas_read_only = itertools.cycle(
+            [self._read_only_session_maker(replica) for replica in self.replicas]
+        )
+
+        self._recent_writers: TTLCache[str, bool] = TTLCache(
+            max_size=max_sticky_keys, ttl=stickiness
+        )
+
+    @staticmethod
+    def _read_only_session_maker(
+        engine: AsyncEngine,
+    ) -> async_sessionmaker[AsyncSession]:
+        return async_sessionmaker(
+            engine.execution_options(isolation_level="AUTOCOMMIT"),
+            expire_on_commit=False,
+        )
+
+    def get_session_maker(
+        self, read_only: bool, key: str | None = None, primary: bool = False
+    ) -> async_sessionmaker[AsyncSession]:
+        if not read_only:
+            return self._writable
+
+        if primary or not self.replicas or (key and self._recent_writers.get(key)):
+            return self._primary_read_only
+
+        return next(self._replicas_read_only)
+
+    def mark_write(self, keys: set[str]) -> None:
+        for key in keys:
+            self._recent_writers.set(key, True)
@@ -1,16 +1,73 @@
-from typing import AsyncGenerator
+import uuid
+from typing import Any
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 
-from src.core.config import get_settings, Settings
+from src.core.config import get_settings, Settings, DB
+from src.db.pool import InstrumentedQueuePool
+from src.db.routing import ReplicaRouter
+from src.schemas.system import PoolStatsSchema
 
 
 settings: Settings = get_settings()
 
-engine = create_async_engine(settings.db.url)
+
+def get_engine_options(db: DB) -> dict[str, Any]:
+    connect_args: dict[str, Any] = {"statement_cache_size": db.statement_cache_size}
+
+    if db.pgbouncer:
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # Unnamed statements could collide between clients sharing a backend
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": db.pool_size,
+        "max_overflow": db.max_overflow,
+        "pool_timeout": db.pool_timeout,
+        "pool_recycle": db.pool_recycle,
+        "pool_pre_ping": db.pool_pre_ping,
+        "connect_args": connect_args,
+    }
+
+
+engine = create_async_engine(settings.db.url, **get_engine_options(settings.db))
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+replica_engines = [
+    create_async_engine(url, **get_engine_options(settings.db))
+    for url in settings.db.replica_urls
+]
+router = ReplicaRouter(
+    engine,
+    replica_engines,
+    stickiness=settings.db.replica_stickiness_seconds,
+)
+
+
+def get_pool_stats(name: str, async_engine: AsyncEngine) -> PoolStatsSchema:
+    pool: InstrumentedQueuePool = async_engine.pool
+    metrics = pool.metrics
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
-        yield session
+    return PoolStatsSchema(
+        name=name,
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        overflow=max(pool.overflow(), 0),
+        checkouts=metrics.checkouts,
+        timeouts=metrics.timeouts,
+        acquire_time_avg_ms=(
+            metrics.acquire_time_total / metrics.checkouts * 1000
+            if metrics.checkouts
+            else 0.0
+        ),
+        acquire_time_max_ms=metrics.acquire_time_max * 1000,
+    )
@@ -0,0 +1,136 @@
+import uuid
+from functools import cached_property
+from typing import AsyncGenerator
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.routing import ReplicaRouter
+from src.db.session import router
+from src.repositories.blob_repo import BlobRepository
+from src.repositories.file_repo import FileRepository
+from src.repositories.metadata_repo import MetadataRepository
+from src.repositories.peaks_repo import PeaksRepository
+from src.repositories.rendition_repo import RenditionRepository
+from src.repositories.upload_repo import UploadRepository
+from src.repositories.user_repo import UserRepository
+
+
+class UnitOfWork:
+    """
+    Request-scoped session shared by the auth dependency, services and repositories
+
+    Repositories only flush, the service that owns the request commits once.
+    The session is opened on first use, so the database it talks to can still
+    be routed by the user the request acts for.
+    """
+
+    def __init__(self, router: ReplicaRouter, read_only: bool = False) -> None:
+        self.router = router
+        self.read_only = read_only
+
+        self.user_key: str | None = None
+        self.primary = False
+        self.written_keys: set[str] = set()
+        self._session: AsyncSession | None = None
+
+    def bind_user(self, user_id: str | uuid.UUID) -> None:
+        """
+        Route this work by user so it reads the user's own recent writes
+        """
+        if self._session is None:
+            self.user_key = str(user_id)
+
+    def read_primary(self) -> bool:
+        """
+        Send the reads of this work to the primary, returns whether they go there
+
+        For reads whose result outlives the request, like a cached user. Other
+        workers don't know who wrote recently, a replica may still lag behind
+        a write made through them. Too late once a read-only session is open.
+        """
+        if self._session is None:
+            self.primary = True
+
+        return self.primary or not self.read_only
+
+    def touch(self, user_id: str | uuid.UUID) -> None:
+        """
+        Mark a user whose reads must stay on the primary after the commit
+        """
+        self.written_keys.add(str(user_id))
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            session_maker = self.router.get_session_maker(
+                self.read_only, self.user_key, self.primary
+            )
+            self._session = session_maker()
+
+        return self._session
+
+    @cached_property
+    def users(self) -> UserRepository:
+        return UserRepository(self.session)
+
+    @cached_property
+    def files(self) -> FileRepository:
+        return FileRepository(self.session)
+
+    @cached_property
+    def blobs(self) -> BlobRepository:
+        return BlobRepository(self.session)
+
+    @cached_property
+    def metadata(self) -> MetadataRepository:
+        return MetadataRepository(self.session)
+
+    @cached_property
+    def peaks(self) -> PeaksRepository:
+        return PeaksRepository(self.session)
+
+    @cached_property
+    def renditions(self) -> RenditionRepository:
+        return RenditionRepository(self.session)
+
+    @cached_property
+    def uploads(self) -> UploadRepository:
+        return UploadRepository(self.session)
+
+    async def commit(self) -> None:
+        if self.read_only:
+            raise RuntimeError("Read-only unit of work can't be committed")
+
+        await self.session.commit()
+
+        if self.user_key:
+            self.written_keys.add(self.user_key)
+        self.router.mark_write(self.written_keys)
+
+    async def rollback(self) -> None:
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+def read_only(request: Request) -> None:
+    """
+    Route dependency that makes the request's unit of work read-only
+
+    Must be declared in the route's ``dependencies`` so it is resolved before
+    the unit of work is created.
+    """
+    request.state.read_only = True
+
+
+async def get_uow(request: Request) -> AsyncGenerator[UnitOfWork, None]:
+    uow = UnitOfWork(router, read_only=getattr(request.state, "read_only", False))
+
+    try:
+        yield uow
+    finally:
+        await uow.close()
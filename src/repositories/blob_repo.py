@@ -0,0 +1,176 @@
+import uuid
+
+from sqlalchemy import delete, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import Blob, File
+from src.schemas.file import CreateBlobSchema, ReadBlobSchema
+from src.utils.profiling import traced_methods
+
+
+@traced_methods("repository")
+class BlobRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def acquire_blob(self, data: CreateBlobSchema) -> tuple[ReadBlobSchema, bool]:
+        """
+        Insert the blob or take one more reference to the existing one
+
+        Returns the blob and whether it was created by this call.
+        """
+        return (await self.acquire_blobs([data]))[data.hash]
+
+    async def acquire_blobs(
+        self, data: list[CreateBlobSchema]
+    ) -> dict[str, tuple[ReadBlobSchema, bool]]:
+        """
+        Insert the blobs or take ``refs`` more references to the existing ones
+
+        Hashes must be unique. Rows are sorted by hash so concurrent calls lock
+        them in the same order. Returns every blob by hash along with whether
+        it was created by this call.
+        """
+        stmt = insert(Blob).values(
+            [
+                {
+                    "hash": item.hash,
+                    "path": item.path,
+                    "size": item.size,
+                    "mime_type": item.mime_type,
+                    "ref_count": item.refs,
+                }
+                for item in sorted(data, key=lambda item: item.hash)
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Blob.hash],
+            set_={"ref_count": Blob.ref_count + stmt.excluded.ref_count},
+        ).returning(
+            Blob.id,
+            Blob.hash,
+            Blob.path,
+            Blob.size,
+            Blob.mime_type,
+            Blob.ref_count,
+            literal_column("xmax = 0").label("created"),
+        )
+
+        rows = (await self.session.execute(stmt)).all()
+
+        return {
+            row.hash: (
+                ReadBlobSchema.model_validate(row, from_attributes=True),
+                row.created,
+            )
+            for row in rows
+        }
+
+    async def get_blobs(
+        self, limit: int, after: uuid.UUID | None = None
+    ) -> list[ReadBlobSchema]:
+        stmt = select(Blob).order_by(Blob.id).limit(limit)
+
+        if after is not None:
+            stmt = stmt.where(Blob.id > after)
+
+        blobs = (await self.session.execute(stmt)).scalars().all()
+
+        return [
+            ReadBlobSchema.model_validate(blob, from_attributes=True) for blob in blobs
+        ]
+
+    async def lock_blobs(self, blob_ids: list[uuid.UUID]) -> list[ReadBlobSchema]:
+        """
+        Lock the referenced blobs among ``blob_ids`` that nobody else holds
+        """
+        stmt = (
+            select(Blob)
+            .where(Blob.id.in_(blob_ids), Blob.ref_count > 0)
+            .order_by(Blob.hash)
+            .with_for_update(skip_locked=True)
+        )
+
+        blobs = (await self.session.execute(stmt)).scalars().all()
+
+        return [
+            ReadBlobSchema.model_validate(blob, from_attributes=True) for blob in blobs
+        ]
+
+    async def move_blobs(self, paths: dict[uuid.UUID, str]) -> None:
+        """
+        Point the blobs and every file referencing them at their new paths
+        """
+        if not paths:
+            return
+
+        await self.session.execute(
+            update(Blob),
+            [{"id": blob_id, "path": path} for blob_id, path in paths.items()],
+        )
+
+        stmt = (
+            update(File)
+            .where(File.blob_id == Blob.id, Blob.id.in_(list(paths)))
+            .values(path=Blob.path)
+            .execution_options(synchronize_session=False)
+        )
+
+        await self.session.execute(stmt)
+
+    async def release_file_blobs(self, file_ids: list[uuid.UUID]) -> None:
+        """
+        Drop the references held by the files
+
+        Blobs left without references are reclaimed by ``lock_unreferenced``
+        and ``delete_blobs`` once the files are gone.
+        """
+        refs = (
+            select(File.blob_id, func.count().label("refs"))
+            .where(File.id.in_(file_ids), File.blob_id.is_not(None))
+            .group_by(File.blob_id)
+            .subquery()
+        )
+
+        stmt = (
+            update(Blob)
+            .where(Blob.id == refs.c.blob_id)
+            .values(ref_count=Blob.ref_count - refs.c.refs)
+            .execution_options(synchronize_session=False)
+        )
+
+        await self.session.execute(stmt)
+
+    async def lock_unreferenced(self, limit: int) -> list[ReadBlobSchema]:
+        """
+        Lock up to ``limit`` blobs nothing references anymore
+
+        The lock holds back an upload of the same content until the blob row is
+        deleted, so the upload can't find the blob and lose its file to the
+        unlink.
+        """
+        stmt = (
+            select(Blob)
+            .where(Blob.ref_count <= 0)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        blobs = (await self.session.execute(stmt)).scalars().all()
+
+        return [
+            ReadBlobSchema.model_validate(blob, from_attributes=True) for blob in blobs
+        ]
+
+    async def delete_blobs(self, blob_ids: list[uuid.UUID]) -> None:
+        if not blob_ids:
+            return
+
+        stmt = (
+            delete(Blob)
+            .where(Blob.id.in_(blob_ids), Blob.ref_count <= 0)
+            .execution_options(synchronize_session=False)
+        )
+
+        await self.session.execute(stmt)
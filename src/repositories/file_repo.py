@@ -1,30 +1,242 @@
+import datetime as dt
+import re
 import uuid
 
-from sqlalchemy import select
+from sqlalchemy import case, delete, func, insert, literal, or_, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.models import File
-from src.schemas.file import ReadFileSchema, CreateFileSchema
+from src.db.models import File, Blob, FileMetadata, User
+from src.schemas.file import (
+    ReadFileSchema,
+    CreateFileSchema,
+    ReadBlobSchema,
+    FileContentSchema,
+    FilePageSchema,
+    FileSearchPageSchema,
+)
+from src.utils.pagination import encode_cursor, encode_rank_cursor
+from src.utils.profiling import traced_methods
 
 
+@traced_methods("repository")
 class FileRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
     async def create_file(self, data: CreateFileSchema) -> ReadFileSchema:
-        new_file = File(user_id=data.user_id, name=data.name, path=data.path)
+        new_file = File(
+            user_id=data.user_id, name=data.name, path=data.path, blob_id=data.blob_id
+        )
 
         self.session.add(new_file)
         await self.session.flush()
-        await self.session.refresh(new_file)
 
         return ReadFileSchema.model_validate(new_file, from_attributes=True)
 
-    async def get_user_files(self, user_id: uuid.UUID) -> list[ReadFileSchema]:
-        stmt = select(File).where(File.user_id == user_id)
-        result = (await self.session.execute(stmt)).scalars().all()
+    async def create_files(self, data: list[CreateFileSchema]) -> list[ReadFileSchema]:
+        """
+        Insert all files with batched multi-row ``INSERT ... RETURNING``
+        """
+        stmt = insert(File).returning(
+            File.id, File.name, File.path, sort_by_parameter_order=True
+        )
+
+        rows = (
+            await self.session.execute(stmt, [item.model_dump() for item in data])
+        ).all()
 
-        print(result)
         return [
-            ReadFileSchema.model_validate(file, from_attributes=True) for file in result
+            ReadFileSchema.model_validate(row, from_attributes=True) for row in rows
         ]
+
+    async def get_user_files(
+        self,
+        user_id: uuid.UUID,
+        limit: int,
+        after: tuple[dt.datetime, uuid.UUID] | None = None,
+    ) -> FilePageSchema:
+        stmt = (
+            select(File.id, File.name, File.path, File.created_at)
+            .where(File.user_id == user_id)
+            .order_by(File.created_at.desc(), File.id.desc())
+            .limit(limit + 1)
+        )
+
+        if after:
+            stmt = stmt.where(tuple_(File.created_at, File.id) < tuple_(*after))
+
+        rows = (await self.session.execute(stmt)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+        # One validation pass over the whole page, in pydantic-core
+        return FilePageSchema.model_validate(
+            {"items": rows, "next_cursor": next_cursor}, from_attributes=True
+        )
+
+    async def search_files(
+        self,
+        query: str,
+        limit: int,
+        user_id: uuid.UUID | None = None,
+        after: tuple[float, uuid.UUID] | None = None,
+    ) -> FileSearchPageSchema:
+        """
+        Rank files whose name starts with ``query`` or whose name or tags contain
+        words starting with the words of ``query``
+
+        Searches the files of ``user_id`` or, without it, the files of every
+        live user.
+        """
+        query = query.lower()
+        prefix = func.lower(File.name).startswith(query, autoescape=True)
+
+        # Only letters and digits reach to_tsquery, so user input can't break it
+        words = re.findall(r"[^\W_]+", query)
+        if words:
+            ts_query = func.to_tsquery(
+                "simple", " & ".join(f"{word}:*" for word in words)
+            )
+            matches = or_(File.search_vector.op("@@")(ts_query), prefix)
+            rank = func.ts_rank_cd(File.search_vector, ts_query)
+        else:
+            matches = prefix
+            rank = literal(0.0)
+
+        # A name that starts with the query beats any word match
+        rank = (rank + case((prefix, 1.0), else_=0.0)).label("rank")
+
+        stmt = (
+            select(File.id, File.user_id, File.name, File.path, rank)
+            .where(matches)
+            .order_by(rank.desc(), File.id.desc())
+            .limit(limit + 1)
+        )
+
+        if user_id:
+            stmt = stmt.where(File.user_id == user_id)
+        else:
+            # Files of deleted users are hidden until the reaper gets to them
+            stmt = stmt.join(User, User.id == File.user_id).where(
+                User.deleted_at.is_(None)
+            )
+
+        if after:
+            stmt = stmt.where(tuple_(rank, File.id) < tuple_(*after))
+
+        rows = (await self.session.execute(stmt)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_rank_cursor(rows[-1].rank, rows[-1].id)
+
+        return FileSearchPageSchema.model_validate(
+            {"items": rows, "next_cursor": next_cursor}, from_attributes=True
+        )
+
+    async def get_file_content(self, file_id: uuid.UUID) -> FileContentSchema | None:
+        stmt = (
+            select(
+                File.id,
+                File.user_id,
+                File.name,
+                File.path,
+                File.blob_id,
+                Blob.hash,
+                Blob.mime_type,
+                FileMetadata.bitrate,
+            )
+            .outerjoin(Blob, File.blob_id == Blob.id)
+            .outerjoin(FileMetadata, FileMetadata.file_id == File.id)
+            .join(User, User.id == File.user_id)
+            .where(File.id == file_id, User.deleted_at.is_(None))
+        )
+
+        row = (await self.session.execute(stmt)).one_or_none()
+
+        if not row:
+            return None
+
+        return FileContentSchema.model_validate(row, from_attributes=True)
+
+    async def get_legacy_files(
+        self, limit: int, after: uuid.UUID | None = None
+    ) -> list[ReadFileSchema]:
+        """
+        Files uploaded before the blob store, ordered by id
+        """
+        stmt = (
+            select(File.id, File.name, File.path)
+            .where(File.blob_id.is_(None))
+            .order_by(File.id)
+            .limit(limit)
+        )
+
+        if after is not None:
+            stmt = stmt.where(File.id > after)
+
+        rows = (await self.session.execute(stmt)).all()
+
+        return [
+            ReadFileSchema.model_validate(row, from_attributes=True) for row in rows
+        ]
+
+    async def lock_legacy_files(
+        self, file_ids: list[uuid.UUID]
+    ) -> list[ReadFileSchema]:
+        """
+        Lock the files among ``file_ids`` that nobody else holds and that are
+        still outside the blob store
+        """
+        stmt = (
+            select(File.id, File.name, File.path)
+            .where(File.id.in_(file_ids), File.blob_id.is_(None))
+            .order_by(File.id)
+            .with_for_update(skip_locked=True)
+        )
+
+        rows = (await self.session.execute(stmt)).all()
+
+        return [
+            ReadFileSchema.model_validate(row, from_attributes=True) for row in rows
+        ]
+
+    async def attach_blobs(self, blobs: dict[uuid.UUID, ReadBlobSchema]) -> None:
+        """
+        Point the files at the blobs now holding their content
+        """
+        if not blobs:
+            return
+
+        await self.session.execute(
+            update(File),
+            [
+                {"id": file_id, "path": blob.path, "blob_id": blob.id}
+                for file_id, blob in blobs.items()
+            ],
+        )
+
+    async def get_user_file_ids(
+        self, user_id: uuid.UUID, limit: int
+    ) -> list[uuid.UUID]:
+        stmt = select(File.id).where(File.user_id == user_id).limit(limit)
+
+        return list((await self.session.execute(stmt)).scalars())
+
+    async def get_legacy_paths(self, file_ids: list[uuid.UUID]) -> list[str]:
+        stmt = select(File.path).where(File.id.in_(file_ids), File.blob_id.is_(None))
+
+        return list((await self.session.execute(stmt)).scalars())
+
+    async def delete_files(self, file_ids: list[uuid.UUID]) -> None:
+        stmt = (
+            delete(File)
+            .where(File.id.in_(file_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+        await self.session.execute(stmt)
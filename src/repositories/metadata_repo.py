@@ -0,0 +1,180 @@
+import datetime as dt
+import uuid
+
+from sqlalchemy import delete, exists, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import File, FileMetadata, MetadataJob
+from src.schemas.metadata import FileMetadataSchema, MetadataJobSchema
+from src.utils.profiling import traced_methods
+
+
+@traced_methods("repository")
+class MetadataRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def enqueue(self, file_ids: list[uuid.UUID]) -> None:
+        if not file_ids:
+            return
+
+        stmt = (
+            insert(MetadataJob)
+            .values([{"file_id": file_id} for file_id in file_ids])
+            .on_conflict_do_nothing(index_elements=[MetadataJob.file_id])
+        )
+
+        await self.session.execute(stmt)
+
+    async def enqueue_missing(self, limit: int) -> int:
+        """
+        Queue up to ``limit`` files that have neither metadata nor a job yet
+        """
+        missing = (
+            select(func.gen_random_uuid(), File.id)
+            .where(
+                ~exists().where(FileMetadata.file_id == File.id),
+                ~exists().where(MetadataJob.file_id == File.id),
+            )
+            .limit(limit)
+        )
+
+        stmt = (
+            insert(MetadataJob)
+            .from_select(["id", "file_id"], missing)
+            .on_conflict_do_nothing(index_elements=[MetadataJob.file_id])
+        )
+
+        return (await self.session.execute(stmt)).rowcount
+
+    async def claim_jobs(
+        self, limit: int, lease_seconds: float
+    ) -> list[MetadataJobSchema]:
+        """
+        Lease up to ``limit`` of the oldest jobs that nobody is working on
+
+        Jobs locked by a concurrent claim are skipped, jobs whose lease expired
+        (their worker died) are claimed again.
+        """
+        claimable = (
+            select(MetadataJob.id)
+            .where(
+                MetadataJob.failed.is_(False),
+                or_(
+                    MetadataJob.locked_until.is_(None),
+                    MetadataJob.locked_until < func.now(),
+                ),
+            )
+            .order_by(MetadataJob.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        stmt = (
+            update(MetadataJob)
+            .where(MetadataJob.id.in_(claimable), File.id == MetadataJob.file_id)
+            .values(
+                locked_until=func.now() + dt.timedelta(seconds=lease_seconds),
+                attempts=MetadataJob.attempts + 1,
+            )
+            .returning(
+                MetadataJob.id, MetadataJob.file_id, MetadataJob.attempts, File.path
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        rows = (await self.session.execute(stmt)).all()
+
+        return [
+            MetadataJobSchema.model_validate(row, from_attributes=True) for row in rows
+        ]
+
+    async def finish_jobs(
+        self, job_ids: list[uuid.UUID], data: list[FileMetadataSchema]
+    ) -> None:
+        """
+        Store the extracted metadata and drop the jobs
+
+        Files deleted while their job was running are skipped, the ones still
+        there are key-share locked so they can't go away before the commit.
+        """
+        if data:
+            alive = select(File.id).where(File.id.in_([item.file_id for item in data]))
+            file_ids = set(
+                (
+                    await self.session.execute(
+                        alive.with_for_update(read=True, key_share=True)
+                    )
+                ).scalars()
+            )
+
+            rows = [item.model_dump() for item in data if item.file_id in file_ids]
+
+            if rows:
+                stmt = insert(FileMetadata).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[FileMetadata.file_id],
+                    set_={
+                        **{
+                            key: stmt.excluded[key]
+                            for key in rows[0]
+                            if key != "file_id"
+                        },
+                        "updated_at": func.now(),
+                    },
+                )
+                await self.session.execute(stmt)
+
+                # Make the tags searchable through the file's search vector
+                await self.session.execute(
+                    update(File),
+                    [
+                        {
+                            "id": row["file_id"],
+                            "tags_text": " ".join(
+                                row[key]
+                                for key in ("title", "artist", "album", "genre")
+                                if row[key]
+                            ),
+                        }
+                        for row in rows
+                    ],
+                )
+
+        if job_ids:
+            await self.session.execute(
+                delete(MetadataJob).where(MetadataJob.id.in_(job_ids))
+            )
+
+    async def fail_jobs(
+        self, jobs: list[MetadataJobSchema], errors: list[str], max_attempts: int
+    ) -> None:
+        """
+        Release the jobs for a retry, or park them once out of attempts
+        """
+        if not jobs:
+            return
+
+        await self.session.execute(
+            update(MetadataJob),
+            [
+                {
+                    "id": job.id,
+                    "error": error,
+                    "failed": job.attempts >= max_attempts,
+                    "locked_until": None,
+                }
+                for job, error in zip(jobs, errors)
+            ],
+        )
+
+    async def retry_failed(self) -> int:
+        stmt = (
+            update(MetadataJob)
+            .where(MetadataJob.failed.is_(True))
+            .values(failed=False, attempts=0, error=None)
+            .execution_options(synchronize_session=False)
+        )
+
+        return (await self.session.execute(stmt)).rowcount
@@ -0,0 +1,154 @@
+import datetime as dt
+import uuid
+
+from sqlalchemy import exists, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import Blob, Peaks
+from src.schemas.peaks import PeaksJobSchema, ReadPeaksSchema
+from src.utils.peaks import level_key
+from src.utils.profiling import traced_methods
+
+
+@traced_methods("repository")
+class PeaksRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def enqueue(self, blob_ids: list[uuid.UUID]) -> None:
+        if not blob_ids:
+            return
+
+        stmt = (
+            insert(Peaks)
+            .values([{"blob_id": blob_id} for blob_id in blob_ids])
+            .on_conflict_do_nothing(index_elements=[Peaks.blob_id])
+        )
+
+        await self.session.execute(stmt)
+
+    async def enqueue_missing(self, limit: int) -> int:
+        """
+        Queue up to ``limit`` referenced blobs that have no peaks row yet
+        """
+        missing = (
+            select(func.gen_random_uuid(), Blob.id)
+            .where(Blob.ref_count > 0, ~exists().where(Peaks.blob_id == Blob.id))
+            .limit(limit)
+        )
+
+        stmt = (
+            insert(Peaks)
+            .from_select(["id", "blob_id"], missing)
+            .on_conflict_do_nothing(index_elements=[Peaks.blob_id])
+        )
+
+        return (await self.session.execute(stmt)).rowcount
+
+    async def claim_jobs(
+        self, limit: int, lease_seconds: float
+    ) -> list[PeaksJobSchema]:
+        """
+        Lease up to ``limit`` of the oldest pending blobs nobody is working on
+        """
+        claimable = (
+            select(Peaks.id)
+            .where(
+                Peaks.path.is_(None),
+                Peaks.failed.is_(False),
+                or_(Peaks.locked_until.is_(None), Peaks.locked_until < func.now()),
+            )
+            .order_by(Peaks.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        stmt = (
+            update(Peaks)
+            .where(Peaks.id.in_(claimable), Blob.id == Peaks.blob_id)
+            .values(
+                locked_until=func.now() + dt.timedelta(seconds=lease_seconds),
+                attempts=Peaks.attempts + 1,
+            )
+            .returning(Peaks.id, Peaks.blob_id, Peaks.attempts, Blob.path)
+            .execution_options(synchronize_session=False)
+        )
+
+        rows = (await self.session.execute(stmt)).all()
+
+        return [
+            PeaksJobSchema.model_validate(row, from_attributes=True) for row in rows
+        ]
+
+    async def finish_job(self, job: PeaksJobSchema, levels: list[int]) -> bool:
+        """
+        Mark the peaks of the job computed, ``False`` if the blob went meanwhile
+        """
+        stmt = (
+            update(Peaks)
+            .where(Peaks.id == job.id)
+            .values(path=job.path, levels=levels, locked_until=None, error=None)
+            .returning(Peaks.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        return (await self.session.execute(stmt)).scalar_one_or_none() is not None
+
+    async def fail_jobs(
+        self, jobs: list[PeaksJobSchema], errors: list[str], max_attempts: int
+    ) -> None:
+        """
+        Release the jobs for a retry, or park them once out of attempts
+        """
+        if not jobs:
+            return
+
+        await self.session.execute(
+            update(Peaks),
+            [
+                {
+                    "id": job.id,
+                    "error": error,
+                    "failed": job.attempts >= max_attempts,
+                    "locked_until": None,
+                }
+                for job, error in zip(jobs, errors)
+            ],
+        )
+
+    async def retry_failed(self) -> int:
+        stmt = (
+            update(Peaks)
+            .where(Peaks.failed.is_(True))
+            .values(failed=False, attempts=0, error=None)
+            .execution_options(synchronize_session=False)
+        )
+
+        return (await self.session.execute(stmt)).rowcount
+
+    async def get_peaks(self, blob_id: uuid.UUID) -> ReadPeaksSchema | None:
+        """
+        The peaks of the blob, once computed
+        """
+        stmt = select(Peaks.blob_id, Peaks.path, Peaks.levels).where(
+            Peaks.blob_id == blob_id, Peaks.path.is_not(None)
+        )
+
+        row = (await self.session.execute(stmt)).one_or_none()
+
+        if row is None:
+            return None
+
+        return ReadPeaksSchema.model_validate(row, from_attributes=True)
+
+    async def get_blob_peaks_keys(self, blob_ids: list[uuid.UUID]) -> list[str]:
+        stmt = select(Peaks.path, Peaks.levels).where(
+            Peaks.blob_id.in_(blob_ids), Peaks.path.is_not(None)
+        )
+
+        return [
+            level_key(row.path, level)
+            for row in await self.session.execute(stmt)
+            for level in row.levels
+        ]
@@ -0,0 +1,150 @@
+import datetime as dt
+import uuid
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import Rendition
+from src.schemas.file import CreateRenditionSchema, ReadRenditionSchema
+from src.utils.profiling import traced_methods
+
+
+@traced_methods("repository")
+class RenditionRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_rendition(
+        self, blob_id: uuid.UUID, name: str
+    ) -> ReadRenditionSchema | None:
+        """
+        The rendition of the blob, unless it isn't made yet
+        """
+        stmt = select(Rendition).where(
+            Rendition.blob_id == blob_id,
+            Rendition.name == name,
+            Rendition.path.is_not(None),
+        )
+
+        rendition = (await self.session.execute(stmt)).scalar_one_or_none()
+
+        if rendition is None:
+            return None
+
+        return ReadRenditionSchema.model_validate(rendition, from_attributes=True)
+
+    async def claim_rendition(
+        self, blob_id: uuid.UUID, name: str, lease_seconds: float
+    ) -> uuid.UUID | None:
+        """
+        Lease the making of the rendition for ``lease_seconds``
+
+        Returns the id of the pending row, ``None`` if the rendition is made
+        already or another process holds a lease that hasn't run out.
+        """
+        locked_until = func.now() + dt.timedelta(seconds=lease_seconds)
+
+        stmt = insert(Rendition).values(
+            blob_id=blob_id, name=name, locked_until=locked_until
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Rendition.blob_id, Rendition.name],
+            set_={"locked_until": locked_until},
+            where=Rendition.path.is_(None) & (Rendition.locked_until < func.now()),
+        ).returning(Rendition.id)
+
+        return (await self.session.execute(stmt)).scalar_one_or_none()
+
+    async def finish_rendition(
+        self, rendition_id: uuid.UUID, data: CreateRenditionSchema
+    ) -> ReadRenditionSchema | None:
+        """
+        Record the made rendition, ``None`` if the row is gone or was
+        finished by another process
+        """
+        stmt = (
+            update(Rendition)
+            .where(Rendition.id == rendition_id, Rendition.path.is_(None))
+            .values(
+                path=data.path,
+                size=data.size,
+                mime_type=data.mime_type,
+                last_used_at=func.now(),
+                locked_until=None,
+            )
+            .returning(*Rendition.__table__.c)
+            .execution_options(synchronize_session=False)
+        )
+
+        row = (await self.session.execute(stmt)).one_or_none()
+
+        if row is None:
+            return None
+
+        return ReadRenditionSchema.model_validate(row, from_attributes=True)
+
+    async def release_rendition(self, rendition_id: uuid.UUID) -> None:
+        """
+        Give the rendition up after a failed encoding, the next request tries again
+        """
+        stmt = (
+            delete(Rendition)
+            .where(Rendition.id == rendition_id, Rendition.path.is_(None))
+            .execution_options(synchronize_session=False)
+        )
+
+        await self.session.execute(stmt)
+
+    async def touch(self, rendition_id: uuid.UUID) -> None:
+        stmt = (
+            update(Rendition)
+            .where(Rendition.id == rendition_id)
+            .values(last_used_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+        await self.session.execute(stmt)
+
+    async def total_size(self) -> int:
+        return await self.session.scalar(
+            select(func.coalesce(func.sum(Rendition.size), 0))
+        )
+
+    async def lock_least_recent(self, limit: int) -> list[ReadRenditionSchema]:
+        """
+        Lock up to ``limit`` of the least recently used renditions
+        """
+        stmt = (
+            select(Rendition)
+            .where(Rendition.path.is_not(None))
+            .order_by(Rendition.last_used_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        renditions = (await self.session.execute(stmt)).scalars().all()
+
+        return [
+            ReadRenditionSchema.model_validate(rendition, from_attributes=True)
+            for rendition in renditions
+        ]
+
+    async def get_blob_rendition_paths(self, blob_ids: list[uuid.UUID]) -> list[str]:
+        stmt = select(Rendition.path).where(
+            Rendition.blob_id.in_(blob_ids), Rendition.path.is_not(None)
+        )
+
+        return list((await self.session.execute(stmt)).scalars())
+
+    async def delete_renditions(self, rendition_ids: list[uuid.UUID]) -> None:
+        if not rendition_ids:
+            return
+
+        stmt = (
+            delete(Rendition)
+            .where(Rendition.id.in_(rendition_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+        await self.session.execute(stmt)
@@ -0,0 +1,177 @@
+import datetime as dt
+import uuid
+
+from sqlalchemy import ColumnElement, delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import Upload
+from src.schemas.file import CreateUploadSchema, ReadUploadSchema
+from src.utils.profiling import traced_methods
+
+
+def _unlocked() -> ColumnElement[bool]:
+    return or_(Upload.locked_until.is_(None), Upload.locked_until < func.now())
+
+
+@traced_methods("repository")
+class UploadRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_upload(
+        self, data: CreateUploadSchema, expire_seconds: float
+    ) -> ReadUploadSchema:
+        stmt = (
+            insert(Upload)
+            .values(
+                **data.model_dump(),
+                expires_at=func.now() + dt.timedelta(seconds=expire_seconds),
+            )
+            .returning(*Upload.__table__.c)
+        )
+
+        row = (await self.session.execute(stmt)).one()
+
+        return ReadUploadSchema.model_validate(row, from_attributes=True)
+
+    async def get_upload(self, upload_id: uuid.UUID) -> ReadUploadSchema | None:
+        """
+        The upload, unless it expired
+        """
+        stmt = select(Upload).where(
+            Upload.id == upload_id, Upload.expires_at > func.now()
+        )
+
+        upload = (await self.session.execute(stmt)).scalar_one_or_none()
+
+        if upload is None:
+            return None
+
+        return ReadUploadSchema.model_validate(upload, from_attributes=True)
+
+    async def lock_upload(
+        self,
+        upload_id: uuid.UUID,
+        offset: int,
+        lock_seconds: float,
+        expire_seconds: float,
+    ) -> uuid.UUID | None:
+        """
+        Hold the upload for ``lock_seconds`` if it is still at ``offset``
+
+        Returns the token of the lease, ``None`` while another request holds
+        it. Also postpones the expiry, an upload expires ``expire_seconds``
+        after it was last touched.
+        """
+        token = uuid.uuid4()
+        stmt = (
+            update(Upload)
+            .where(
+                Upload.id == upload_id,
+                Upload.offset == offset,
+                Upload.expires_at > func.now(),
+                _unlocked(),
+            )
+            .values(
+                locked_until=func.now() + dt.timedelta(seconds=lock_seconds),
+                lock_token=token,
+                expires_at=func.now() + dt.timedelta(seconds=expire_seconds),
+            )
+            .returning(Upload.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        if (await self.session.execute(stmt)).scalar_one_or_none() is None:
+            return None
+
+        return token
+
+    async def renew_lock(
+        self, upload_id: uuid.UUID, token: uuid.UUID, lock_seconds: float
+    ) -> bool:
+        """
+        Extend the lease, ``False`` if it was lost to another request
+        """
+        stmt = (
+            update(Upload)
+            .where(Upload.id == upload_id, Upload.lock_token == token)
+            .values(locked_until=func.now() + dt.timedelta(seconds=lock_seconds))
+            .returning(Upload.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        return (await self.session.execute(stmt)).scalar_one_or_none() is not None
+
+    async def unlock_upload(
+        self,
+        upload_id: uuid.UUID,
+        token: uuid.UUID,
+        offset: int,
+        mime_type: str | None,
+    ) -> ReadUploadSchema | None:
+        """
+        Release the lease and record the offset
+
+        ``None`` if the lease was lost to another request, nothing is changed.
+        """
+        stmt = (
+            update(Upload)
+            .where(Upload.id == upload_id, Upload.lock_token == token)
+            .values(
+                offset=offset, mime_type=mime_type, locked_until=None, lock_token=None
+            )
+            .returning(*Upload.__table__.c)
+            .execution_options(synchronize_session=False)
+        )
+
+        row = (await self.session.execute(stmt)).one_or_none()
+
+        if row is None:
+            return None
+
+        return ReadUploadSchema.model_validate(row, from_attributes=True)
+
+    async def delete_locked_upload(
+        self, upload_id: uuid.UUID, token: uuid.UUID
+    ) -> bool:
+        """
+        Delete the upload if the lease is still held, returns whether it was
+        """
+        stmt = (
+            delete(Upload)
+            .where(Upload.id == upload_id, Upload.lock_token == token)
+            .returning(Upload.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        return (await self.session.execute(stmt)).scalar_one_or_none() is not None
+
+    async def get_user_upload_ids(self, user_id: uuid.UUID) -> list[uuid.UUID]:
+        stmt = select(Upload.id).where(Upload.user_id == user_id)
+
+        return list((await self.session.execute(stmt)).scalars())
+
+    async def lock_expired(self, limit: int) -> list[uuid.UUID]:
+        """
+        Lock up to ``limit`` expired uploads no request is working on
+        """
+        stmt = (
+            select(Upload.id)
+            .where(Upload.expires_at <= func.now(), _unlocked())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        return list((await self.session.execute(stmt)).scalars())
+
+    async def delete_uploads(self, upload_ids: list[uuid.UUID]) -> None:
+        if not upload_ids:
+            return
+
+        stmt = (
+            delete(Upload)
+            .where(Upload.id.in_(upload_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+        await self.session.execute(stmt)
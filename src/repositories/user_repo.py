@@ -1,31 +1,24 @@
 import uuid
 
-from sqlalchemy import select, update, delete
+from sqlalchemy import func, select, update, delete
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.db.models import User
 from src.schemas.user import ReadUserSchema, CreateUserSchema, UpdateUserSchema
+from src.utils.profiling import traced_methods
 
 
+@traced_methods("repository")
 class UserRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_user_by_yandex_id(self, yandex_id: str) -> ReadUserSchema | None:
-        stmt = select(User).where(User.yandex_id == yandex_id)
-
-        user: User | None = (await self.session.execute(stmt)).scalar_one_or_none()
-
-        if not user:
-            return None
-
-        return ReadUserSchema.model_validate(user, from_attributes=True)
-
     async def get_user_by_id(self, user_id: str | uuid.UUID) -> ReadUserSchema | None:
         if isinstance(user_id, str):
-            stmt = select(User).where(User.id == uuid.UUID(user_id))
-        else:
-            stmt = select(User).where(User.id == user_id)
+            user_id = uuid.UUID(user_id)
+
+        stmt = select(User).where(User.id == user_id, User.deleted_at.is_(None))
 
         user: User | None = (await self.session.execute(stmt)).scalar_one_or_none()
 
@@ -34,21 +27,29 @@ class UserRepository:
         else:
             return ReadUserSchema.model_validate(user, from_attributes=True)
 
-    async def create_user(self, data: CreateUserSchema) -> ReadUserSchema:
-        new_user = User(
-            yandex_id=data.yandex_id,
-            username=data.username,
-            first_name=data.first_name,
-            last_name=data.last_name,
-            email=data.email,
-            is_admin=data.is_admin,
-        )
-
-        self.session.add(new_user)
-        await self.session.commit()
-        await self.session.refresh(new_user)
-
-        return ReadUserSchema.model_validate(new_user, from_attributes=True)
+    async def upsert_user(self, data: CreateUserSchema) -> ReadUserSchema:
+        """
+        Create the live user of the Yandex account or refresh its profile
+
+        One statement whichever way it goes, concurrent first logins of the
+        same account end up with the same user. The username and the admin
+        flag are only set on creation, both can be changed afterwards.
+        """
+        stmt = insert(User).values(**data.model_dump())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.yandex_id],
+            index_where=User.deleted_at.is_(None),
+            set_={
+                "first_name": stmt.excluded.first_name,
+                "last_name": stmt.excluded.last_name,
+                "email": stmt.excluded.email,
+                "updated_at": func.now(),
+            },
+        ).returning(*User.__table__.c)
+
+        row = (await self.session.execute(stmt)).one()
+
+        return ReadUserSchema.model_validate(row, from_attributes=True)
 
     async def update_user(
         self, user_id: uuid.UUID, data: UpdateUserSchema
@@ -61,7 +62,6 @@ class UserRepository:
         )
 
         user: User = (await self.session.execute(stmt)).scalar_one()
-        await self.session.commit()
 
         return ReadUserSchema.model_validate(user, from_attributes=True)
 
@@ -69,4 +69,31 @@ class UserRepository:
         stmt = delete(User).where(User.id == user_id)
 
         await self.session.execute(stmt)
-        await self.session.commit()
+
+    async def tombstone_users(self, user_ids: list[uuid.UUID]) -> list[uuid.UUID]:
+        """
+        Mark the users deleted, returns the ids of the ones that were live
+        """
+        stmt = (
+            update(User)
+            .where(User.id.in_(user_ids), User.deleted_at.is_(None))
+            .values(deleted_at=func.now())
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        return list((await self.session.execute(stmt)).scalars())
+
+    async def lock_deleted_user(self) -> uuid.UUID | None:
+        """
+        Lock the oldest deleted user that no other reaper is working on
+        """
+        stmt = (
+            select(User.id)
+            .where(User.deleted_at.is_not(None))
+            .order_by(User.deleted_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+
+        return (await self.session.execute(stmt)).scalar_one_or_none()
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, APIRouter
 
-from src.api import auth_router, users_router, files_router
+from src.api import auth_router, users_router, files_router, system_router
 
 
 def apply_routers(app: FastAPI) -> FastAPI:
@@ -9,6 +9,7 @@ def apply_routers(app: FastAPI) -> FastAPI:
     main_router.include_router(auth_router)
     main_router.include_router(users_router)
     main_router.include_router(files_router)
+    main_router.include_router(system_router)
 
     app.include_router(main_router)
 
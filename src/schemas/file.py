@@ -1,6 +1,8 @@
+import datetime as dt
 import uuid
+from pathlib import Path
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ReadFileSchema(BaseModel):
@@ -9,7 +11,110 @@ class ReadFileSchema(BaseModel):
     path: str
 
 
+class FilePageSchema(BaseModel):
+    items: list[ReadFileSchema]
+    next_cursor: str | None = None
+
+
+class FileSearchItemSchema(ReadFileSchema):
+    user_id: uuid.UUID
+    rank: float
+
+
+class FileSearchPageSchema(BaseModel):
+    items: list[FileSearchItemSchema]
+    next_cursor: str | None = None
+
+
+class FileContentSchema(BaseModel):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    name: str
+    path: str
+    blob_id: uuid.UUID | None
+    hash: str | None
+    mime_type: str | None
+    # Bits per second, once the metadata is extracted
+    bitrate: int | None = None
+
+
 class CreateFileSchema(BaseModel):
     user_id: uuid.UUID
     name: str
     path: str
+    blob_id: uuid.UUID | None = None
+
+
+class ReadBlobSchema(BaseModel):
+    id: uuid.UUID
+    hash: str
+    path: str
+    size: int
+    mime_type: str
+    ref_count: int
+
+
+class CreateBlobSchema(BaseModel):
+    hash: str
+    path: str
+    size: int
+    mime_type: str
+    refs: int = 1
+
+
+class StagedFileSchema(BaseModel):
+    tmp_path: Path
+    hash: str
+    size: int
+    mime_type: str
+
+
+class BatchUploadItemSchema(BaseModel):
+    index: int
+    name: str
+    file: ReadFileSchema | None = None
+    error: str | None = None
+
+
+class BatchUploadResultSchema(BaseModel):
+    items: list[BatchUploadItemSchema]
+
+
+class StartUploadSchema(BaseModel):
+    name: str = Field(max_length=100)
+    # Total size of the file in bytes
+    length: int = Field(gt=0)
+
+
+class CreateUploadSchema(BaseModel):
+    user_id: uuid.UUID
+    name: str
+    length: int
+
+
+class ReadUploadSchema(BaseModel):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    name: str
+    length: int
+    offset: int
+    mime_type: str | None
+    expires_at: dt.datetime
+
+
+class ReadRenditionSchema(BaseModel):
+    id: uuid.UUID
+    blob_id: uuid.UUID
+    name: str
+    path: str
+    size: int
+    mime_type: str
+    last_used_at: dt.datetime
+
+
+class CreateRenditionSchema(BaseModel):
+    blob_id: uuid.UUID
+    name: str
+    path: str
+    size: int
+    mime_type: str
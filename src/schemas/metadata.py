@@ -0,0 +1,28 @@
+import uuid
+
+from pydantic import BaseModel
+
+
+class FileMetadataSchema(BaseModel):
+    file_id: uuid.UUID
+    format: str
+    codec: str | None = None
+    duration: float | None = None
+    bitrate: int | None = None
+    sample_rate: int | None = None
+    channels: int | None = None
+    bits_per_sample: int | None = None
+    title: str | None = None
+    artist: str | None = None
+    album: str | None = None
+    genre: str | None = None
+    date: str | None = None
+    track_number: int | None = None
+    tags: dict[str, str] = {}
+
+
+class MetadataJobSchema(BaseModel):
+    id: uuid.UUID
+    file_id: uuid.UUID
+    path: str
+    attempts: int
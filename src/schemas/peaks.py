@@ -0,0 +1,17 @@
+import uuid
+
+from pydantic import BaseModel
+
+
+class PeaksJobSchema(BaseModel):
+    id: uuid.UUID
+    blob_id: uuid.UUID
+    # Of the blob, the level objects are stored next to it
+    path: str
+    attempts: int
+
+
+class ReadPeaksSchema(BaseModel):
+    blob_id: uuid.UUID
+    path: str
+    levels: list[int]
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class PoolStatsSchema(BaseModel):
+    name: str
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    acquire_time_avg_ms: float
+    acquire_time_max_ms: float
+
+
+class SpanStatsSchema(BaseModel):
+    count: int
+    seconds: float
+
+
+class ProfileSummarySchema(BaseModel):
+    id: str
+    trigger: str
+    method: str
+    path: str
+    route: str | None
+    status: int
+    started_at: datetime
+    duration: float
+    samples: int
+    interval: float
+    spans: dict[str, SpanStatsSchema]
+
+
+class ProfileSchema(ProfileSummarySchema):
+    # Collapsed stacks, root first, to their sample counts
+    stacks: dict[str, int]
@@ -1,6 +1,6 @@
 import uuid
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
 
 class YandexUserResponseSchema(BaseModel):
@@ -45,3 +45,12 @@ class UpdateUserSchema(BaseModel):
     username: str | None = None
     first_name: str | None = None
     last_name: str | None = None
+
+
+class DeleteUsersSchema(BaseModel):
+    user_ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+
+
+class DeleteUsersResultSchema(BaseModel):
+    deleted: list[uuid.UUID]
+    not_found: list[uuid.UUID]
@@ -0,0 +1,222 @@
+import argparse
+import contextlib
+import logging
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+
+import uvicorn
+
+from src.core.config import Settings, get_settings
+
+
+logger = logging.getLogger("uvicorn.error")
+
+# Workers dying sooner than this after their start are respawned with a delay
+MIN_WORKER_LIFETIME = 1.0
+
+
+def _check_installed(module: str) -> None:
+    try:
+        __import__(module)
+    except ImportError as e:
+        raise RuntimeError(
+            f"SERVER__LOOP/SERVER__HTTP require {module}, install the 'prod' extra "
+            "or set them to auto"
+        ) from e
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    """
+    Listening socket shared by the workers
+
+    Unlike ``uvicorn.Config.bind_socket`` the protocol is given explicitly:
+    asyncio sets TCP_NODELAY only on connections accepted from IPPROTO_TCP
+    sockets, small responses wait for delayed ACKs (about 40 ms) otherwise.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+
+    return sock
+
+
+class Supervisor:
+    """
+    Runs the application in pre-forked uvicorn worker processes
+
+    The application is imported and created once in this process, before the
+    workers are forked, so they start fast and share the memory of everything
+    loaded at import. Every worker accepts connections on the listening socket
+    bound here and runs the lifespan on its own.
+
+    SIGTERM or SIGINT stop the workers gracefully: they stop accepting, let
+    the requests in flight, uploads included, finish for up to
+    ``graceful_timeout`` seconds, then run the lifespan shutdown. Workers
+    still alive a few seconds past that are killed. A worker that dies while
+    the server runs is replaced.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, graceful_timeout: float):
+        self.config = config
+        self.workers_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.workers: dict[int, float] = {}
+        self.stopping = False
+        self.socket: socket.socket | None = None
+
+    def run(self) -> None:
+        self.config.load()
+        self.socket = _bind_socket(self.config.host, self.config.port)
+        logger.info("Listening on %s:%d", self.config.host, self.config.port)
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGALRM, self._kill)
+
+        logger.info("Starting %d workers", self.workers_count)
+        for _ in range(self.workers_count):
+            self._spawn()
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            started_at = self.workers.pop(pid, None)
+            if started_at is None:
+                continue
+
+            if self.stopping:
+                logger.info("Worker %d stopped", pid)
+                continue
+
+            logger.error(
+                "Worker %d exited with %d, starting a new one",
+                pid,
+                os.waitstatus_to_exitcode(status),
+            )
+            if time.monotonic() - started_at < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+
+            if not self.stopping:
+                self._spawn()
+
+        self.socket.close()
+        logger.info("Server stopped")
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+
+        if pid:
+            self.workers[pid] = time.monotonic()
+            return
+
+        # Worker, uvicorn installs its own SIGTERM and SIGINT handlers
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGALRM):
+            signal.signal(sig, signal.SIG_DFL)
+
+        code = 0
+        try:
+            uvicorn.Server(self.config).run(sockets=[self.socket])
+        except BaseException:
+            logger.exception("Worker %d failed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _stop(self, sig: int, frame: object) -> None:
+        if not self.stopping:
+            logger.info("Stopping workers, waiting for requests in flight")
+            self.stopping = True
+            signal.alarm(int(self.graceful_timeout) + 5)
+
+        # A second SIGINT makes the workers quit without waiting
+        for pid in self.workers:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, sig)
+
+    def _kill(self, sig: int, frame: object) -> None:
+        for pid in self.workers:
+            logger.error("Killing worker %d, graceful shutdown timed out", pid)
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+
+
+def _clear_metrics_dir(directory: str) -> None:
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+
+    for entry in path.glob("*.json"):
+        entry.unlink(missing_ok=True)
+
+
+def serve(settings: Settings, app: str, factory: bool = False) -> None:
+    server = settings.server
+
+    if server.loop == "uvloop":
+        _check_installed("uvloop")
+    if server.http == "httptools":
+        _check_installed("httptools")
+
+    workers = server.workers or os.cpu_count() or 1
+
+    config = uvicorn.Config(
+        app,
+        factory=factory,
+        host=server.host,
+        port=server.port,
+        loop=server.loop,
+        http=server.http,
+        backlog=server.backlog,
+        timeout_keep_alive=server.keep_alive,
+        timeout_graceful_shutdown=server.graceful_timeout,
+        limit_concurrency=server.limit_concurrency,
+        proxy_headers=True,
+        forwarded_allow_ips=server.forwarded_allow_ips,
+        access_log=server.access_log,
+    )
+
+    if settings.metrics.enabled:
+        if settings.metrics.multiproc_dir:
+            # Totals of the previous run would be carried over otherwise
+            _clear_metrics_dir(settings.metrics.multiproc_dir)
+        elif workers > 1:
+            logger.warning(
+                "METRICS__MULTIPROC_DIR is not set, /metrics reports one worker only"
+            )
+
+        if not settings.metrics.token:
+            logger.warning(
+                "METRICS__TOKEN is not set, %s is open to anyone reaching the app",
+                settings.metrics.path,
+            )
+
+    Supervisor(config, workers, server.graceful_timeout).run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the production server")
+    parser.add_argument(
+        "app",
+        nargs="?",
+        default="src.main:app",
+        help="application to serve (default: src.main:app)",
+    )
+    parser.add_argument(
+        "--factory",
+        action="store_true",
+        help="the application is a function creating it",
+    )
+    args = parser.parse_args()
+
+    serve(get_settings(), args.app, args.factory)
+
+
+if __name__ == "__main__":
+    main()
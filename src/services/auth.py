@@ -1,11 +1,10 @@
 from typing import Annotated
 
-from fastapi import requests, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import requests, status, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 
 from src.core.config import Settings, get_settings
-from src.db.session import get_async_session
-from src.repositories.user_repo import UserRepository
+from src.db.uow import UnitOfWork, get_uow
 from src.schemas.auth import TokenPairResponseSchema
 from src.schemas.user import (
     YandexUserResponseSchema,
@@ -14,35 +13,49 @@ from src.schemas.user import (
     UserTokenDataSchema,
 )
 from src.utils.auth import create_tokens
+from src.utils.cache import get_user_cache
+from src.utils.profiling import traced_methods
 
 
+@traced_methods("service")
 class AuthService:
-    def __init__(
-        self, settings: Settings, request: requests.Request, db_session: AsyncSession
-    ):
+    def __init__(self, settings: Settings, request: requests.Request, uow: UnitOfWork):
         self.sso = settings.yandex.get_yandex_sso
         self.request = request
         self.settings = settings
-        self.db_session = db_session
+        self.uow = uow
 
     async def execute(self) -> TokenPairResponseSchema:
         yandex_user: YandexUserResponseSchema = await self._verify_user()
-        user_repository = UserRepository(self.db_session)
-
-        user: ReadUserSchema | None = await user_repository.get_user_by_yandex_id(
-            yandex_user.id
+        user_data = CreateUserSchema(
+            yandex_id=yandex_user.id,
+            email=yandex_user.email,
+            username=yandex_user.display_name,
+            first_name=yandex_user.first_name,
+            last_name=yandex_user.last_name,
+            is_admin=yandex_user.email.lower() in (self.settings.admin_emails or []),
         )
 
-        if not user:
-            new_user_data = CreateUserSchema(
-                yandex_id=yandex_user.id,
-                email=yandex_user.email,
-                username=yandex_user.display_name,
-                first_name=yandex_user.first_name,
-                last_name=yandex_user.last_name,
-                is_admin=yandex_user.email.lower() in self.settings.admin_emails,
-            )
-            user: ReadUserSchema = await user_repository.create_user(new_user_data)
+        try:
+            user: ReadUserSchema = await self.uow.users.upsert_user(user_data)
+        except IntegrityError:
+            # Racing first logins of an account may collide on the email index
+            # before the yandex_id one, the winner is committed by now
+            await self.uow.rollback()
+
+            try:
+                user = await self.uow.users.upsert_user(user_data)
+            except IntegrityError:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Email is used by another user",
+                )
+
+        self.uow.touch(user.id)
+        await self.uow.commit()
+
+        # The profile may have been refreshed
+        await get_user_cache().invalidate(user.id)
 
         return create_tokens(data=UserTokenDataSchema(user_id=str(user.id)))
 
@@ -59,6 +72,6 @@ class AuthService:
 def get_auth_service(
     request: requests.Request,
     settings: Annotated[Settings, Depends(get_settings)],
-    db_session: Annotated[AsyncSession, Depends(get_async_session)],
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
 ) -> AuthService:
-    return AuthService(settings, request, db_session)
+    return AuthService(settings, request, uow)
@@ -1,99 +1,646 @@
-import io
+import asyncio
+import contextlib
+import functools
+import hashlib
+import logging
+import mimetypes
+import time
 import uuid
-from typing import Annotated
-
-import aiofiles
-import aiofiles.os
-import magic
-from fastapi import UploadFile, HTTPException, status, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from src.core.config import Settings, BASE_DIR, get_settings
-from src.db.session import get_async_session
-from src.repositories.user_repo import UserRepository
-from src.schemas.file import CreateFileSchema, ReadFileSchema
+from collections import Counter
+from typing import Annotated, AsyncIterator
+
+from fastapi import UploadFile, HTTPException, status, Depends, Request
+
+from src.core.config import Settings, get_settings
+from src.db.uow import UnitOfWork, get_uow
+from src.schemas.file import (
+    CreateFileSchema,
+    ReadFileSchema,
+    CreateBlobSchema,
+    ReadBlobSchema,
+    FileContentSchema,
+    FilePageSchema,
+    FileSearchPageSchema,
+    StagedFileSchema,
+    BatchUploadItemSchema,
+    BatchUploadResultSchema,
+    StartUploadSchema,
+    CreateUploadSchema,
+    ReadUploadSchema,
+)
 from src.schemas.user import ReadUserSchema
-from src.repositories.file_repo import FileRepository
+from src.utils.files import (
+    FileTooLargeError,
+    hash_file,
+    iter_upload_file,
+    read_head,
+    rechunk,
+    write_stream,
+)
+from src.utils.instrumentation import observe_upload
+from src.utils.mime import MimeDetector, get_mime_detector
+from src.utils.pagination import decode_cursor, decode_rank_cursor
+from src.utils.profiling import traced_methods
+from src.utils.responses import RangeFileResponse, RangeResponse, RangeStreamResponse
+from src.utils.peaks import level_key
+from src.utils.storage import (
+    BlobStorage,
+    ObjectStat,
+    StorageBackend,
+    UploadParts,
+    get_blob_storage,
+    get_upload_parts,
+)
+from src.utils.transcode import (
+    CLIENT_HINTS,
+    Transcoder,
+    choose_rendition,
+    get_transcoder,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
+@traced_methods("service")
 class UploadFilesService:
-    def __init__(self, settings: Settings, db_session: AsyncSession):
+    def __init__(
+        self,
+        settings: Settings,
+        uow: UnitOfWork,
+        storage: BlobStorage,
+        detector: MimeDetector,
+    ):
         self.settings = settings
-        self.db_session = db_session
+        self.uow = uow
+        self.storage = storage
+        self.detector = detector
 
     async def execute(
         self, file: UploadFile, current_user: ReadUserSchema, name: str
     ) -> ReadFileSchema:
-        upload_dir = BASE_DIR / "files" / str(current_user.id)
-        upload_dir.mkdir(parents=True, exist_ok=True)
+        self._check_size(file.size)
+
+        return await self._store(
+            iter_upload_file(file, self.settings.files.chunk_size),
+            current_user,
+            name,
+        )
+
+    async def execute_stream(
+        self,
+        body: AsyncIterator[bytes],
+        content_length: int | None,
+        current_user: ReadUserSchema,
+        name: str,
+    ) -> ReadFileSchema:
+        self._check_size(content_length)
+
+        return await self._store(
+            rechunk(body, self.settings.files.chunk_size),
+            current_user,
+            name,
+        )
+
+    async def execute_batch(
+        self,
+        files: list[UploadFile],
+        names: list[str],
+        current_user: ReadUserSchema,
+    ) -> BatchUploadResultSchema:
+        if len(files) != len(names):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Each file must have a name",
+            )
+
+        if len(files) > self.settings.files.batch_max_files:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Too many files"
+            )
 
-        file_ext = None
-        if "." in file.filename:
-            file_ext = file.filename.split(".")[-1]
+        semaphore = asyncio.Semaphore(self.settings.files.batch_concurrency)
 
-        safe_filename = f"{uuid.uuid4()}{'.' + file_ext if file_ext else ''}"
-        upload_path = upload_dir / safe_filename
+        async def stage(file: UploadFile) -> StagedFileSchema:
+            async with semaphore:
+                self._check_size(file.size)
+                return await self._stage(
+                    iter_upload_file(file, self.settings.files.chunk_size)
+                )
+
+        results = await asyncio.gather(
+            *(stage(file) for file in files), return_exceptions=True
+        )
+
+        items = [
+            BatchUploadItemSchema(index=index, name=name)
+            for index, name in enumerate(names)
+        ]
+        staged: dict[int, StagedFileSchema] = {}
+
+        for index, result in enumerate(results):
+            if isinstance(result, StagedFileSchema):
+                staged[index] = result
+            elif isinstance(result, HTTPException):
+                items[index].error = result.detail
+            else:
+                items[index].error = "Something went wrong while uploading file"
 
-        file_content: bytes = await file.read(1024)
+        if not staged:
+            return BatchUploadResultSchema(items=items)
+
+        # Identical parts share one blob, which takes a reference per part
+        refs = Counter(file.hash for file in staged.values())
+        by_hash = {file.hash: file for file in staged.values()}
+        blobs: dict[str, tuple[ReadBlobSchema, bool]] = {}
+
+        try:
+            blobs = await self.uow.blobs.acquire_blobs(
+                [
+                    CreateBlobSchema(
+                        hash=file.hash,
+                        path=self.storage.blob_key(file.hash),
+                        size=file.size,
+                        mime_type=file.mime_type,
+                        refs=refs[file.hash],
+                    )
+                    for file in by_hash.values()
+                ]
+            )
 
-        mime: magic.Magic = magic.Magic(mime=True)
-        file_type: str = mime.from_buffer(file_content)
+            async def publish(digest: str, blob: ReadBlobSchema, created: bool) -> None:
+                async with semaphore:
+                    await self.storage.publish(
+                        by_hash[digest].tmp_path, blob.path, created
+                    )
+
+            await asyncio.gather(
+                *(
+                    publish(digest, blob, created)
+                    for digest, (blob, created) in blobs.items()
+                )
+            )
+
+            new_files = await self.uow.files.create_files(
+                [
+                    CreateFileSchema(
+                        user_id=current_user.id,
+                        name=names[index],
+                        path=blobs[file.hash][0].path,
+                        blob_id=blobs[file.hash][0].id,
+                    )
+                    for index, file in staged.items()
+                ]
+            )
+
+            await self.uow.metadata.enqueue([new_file.id for new_file in new_files])
+            await self.uow.peaks.enqueue(
+                [blob.id for blob, created in blobs.values() if created]
+            )
+
+        except Exception:
+            await self._unpublish(
+                [blob.path for blob, created in blobs.values() if created]
+            )
+            await self.uow.rollback()
+            for index in staged:
+                items[index].error = "Something went wrong while uploading file"
+        else:
+            await self.uow.commit()
+            for index, new_file in zip(staged, new_files):
+                items[index].file = new_file
+        finally:
+            for file in staged.values():
+                await self.storage.discard(file.tmp_path)
+
+        return BatchUploadResultSchema(items=items)
+
+    def _check_size(self, size: int | None) -> None:
+        if size is not None and size > self.settings.files.max_size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="File size is too large"
+            )
+
+    async def _check_type(self, head: bytes) -> str:
+        file_type: str = await self.detector.detect(
+            head[: self.settings.files.sniff_size]
+        )
 
         if file_type not in self.settings.files.allowed_types:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="File type not allowed"
             )
 
-        if file.size > self.settings.files.max_size:
+        return file_type
+
+    async def _stage(self, chunks: AsyncIterator[bytes]) -> StagedFileSchema:
+        """
+        Check the file type and write the stream to a temp file, hashing it
+        """
+        head, chunks = await read_head(chunks, self.settings.files.sniff_size)
+        file_type = await self._check_type(head)
+
+        tmp_path = self.storage.temp_path()
+        digest = hashlib.sha256()
+        start = time.perf_counter()
+
+        try:
+            size = await write_stream(
+                chunks, tmp_path, self.settings.files.max_size, digest
+            )
+
+        except FileTooLargeError:
+            await self.storage.discard(tmp_path)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="File size is too large"
             )
 
+        except Exception:
+            await self.storage.discard(tmp_path)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Something went wrong while uploading file",
+            )
+
+        observe_upload(size, time.perf_counter() - start)
+
+        return StagedFileSchema(
+            tmp_path=tmp_path, hash=digest.hexdigest(), size=size, mime_type=file_type
+        )
+
+    async def _store(
+        self,
+        chunks: AsyncIterator[bytes],
+        current_user: ReadUserSchema,
+        name: str,
+    ) -> ReadFileSchema:
+        return await self._save(await self._stage(chunks), current_user, name)
+
+    async def _save(
+        self, staged: StagedFileSchema, current_user: ReadUserSchema, name: str
+    ) -> ReadFileSchema:
+        """
+        Store the staged file as a new file of the user and commit
+
+        The temp file is gone afterwards, whether it was stored or not.
+        """
+        blob, created = None, False
+
         try:
-            file_stream = io.BytesIO(file_content)
+            blob, created = await self.uow.blobs.acquire_blob(
+                CreateBlobSchema(
+                    hash=staged.hash,
+                    path=self.storage.blob_key(staged.hash),
+                    size=staged.size,
+                    mime_type=staged.mime_type,
+                )
+            )
 
-            file_repo = FileRepository(self.db_session)
+            await self.storage.publish(staged.tmp_path, blob.path, created)
 
-            new_file: ReadFileSchema = await file_repo.create_file(
+            new_file: ReadFileSchema = await self.uow.files.create_file(
                 CreateFileSchema(
-                    user_id=current_user.id, name=name, path=str(upload_path)
+                    user_id=current_user.id,
+                    name=name,
+                    path=blob.path,
+                    blob_id=blob.id,
                 )
             )
 
-            async with aiofiles.open(upload_path, "wb") as buffer:
-                await buffer.write(file_stream.getvalue())
-
-                while chunk := await file.read(1024):
-                    await buffer.write(chunk)
+            await self.uow.metadata.enqueue([new_file.id])
+            if created:
+                await self.uow.peaks.enqueue([blob.id])
 
         except Exception:
-            await self.db_session.rollback()
-            if aiofiles.os.path.exists(upload_path):
-                await aiofiles.os.remove(upload_path)
-
+            if created:
+                await self._unpublish([blob.path])
+            await self.uow.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Something went wrong while uploading file",
             )
         else:
-            await self.db_session.commit()
+            await self.uow.commit()
             return new_file
+        finally:
+            await self.storage.discard(staged.tmp_path)
+
+    async def _unpublish(self, keys: list[str]) -> None:
+        """
+        Delete the objects stored for blobs created by an upload that failed
+
+        Called before the rollback: the new rows are locked until then, so no
+        concurrent upload of the same content can have taken them over.
+        """
+        for key in keys:
+            with contextlib.suppress(Exception):
+                await self.storage.backend.delete(key)
+
+
+@traced_methods("service")
+class ResumableUploadService(UploadFilesService):
+    """
+    Uploads sent in chunks over any number of requests, tus style
+
+    The upload is created with the total length of the file, then chunks are
+    appended at the offset the server has. After a dropped connection the
+    client asks for that offset and sends the rest from there. Once every
+    byte is there the upload is finalized into a file like a single upload.
+    Chunks go to a local part file, the upload row keeps the offset.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        uow: UnitOfWork,
+        storage: BlobStorage,
+        detector: MimeDetector,
+        parts: UploadParts,
+    ):
+        super().__init__(settings, uow, storage, detector)
+        self.parts = parts
+
+    async def create(
+        self, data: StartUploadSchema, current_user: ReadUserSchema
+    ) -> ReadUploadSchema:
+        self._check_size(data.length)
+
+        upload = await self.uow.uploads.create_upload(
+            CreateUploadSchema(
+                user_id=current_user.id, name=data.name, length=data.length
+            ),
+            self.settings.uploads.expire_seconds,
+        )
+        await self.uow.commit()
+
+        return upload
+
+    async def get(
+        self, upload_id: uuid.UUID, current_user: ReadUserSchema
+    ) -> ReadUploadSchema:
+        upload = await self.uow.uploads.get_upload(upload_id)
+
+        if upload is None or upload.user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found"
+            )
+
+        return upload
+
+    async def append(
+        self,
+        upload_id: uuid.UUID,
+        offset: int,
+        body: AsyncIterator[bytes],
+        current_user: ReadUserSchema,
+    ) -> ReadUploadSchema:
+        """
+        Write the chunk at ``offset``, returns the upload with its new offset
+
+        The type is checked once the head is in, across chunks if the first
+        ones are shorter. What made it to the part before a dropped connection
+        or an error is kept.
+        """
+        upload = await self.get(upload_id, current_user)
+
+        if offset != upload.offset:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Upload offset mismatch"
+            )
+
+        token = await self._lock(upload)
+
+        mime_type = upload.mime_type
+        start = time.perf_counter()
+
+        try:
+            async with self._leased(upload, token):
+                chunks = rechunk(body, self.settings.files.chunk_size)
+
+                if mime_type is None:
+                    mime_type, chunks = await self._sniff(upload, offset, chunks)
+
+                await self.parts.write(
+                    upload.id, offset, chunks, upload.length - offset
+                )
+
+        except HTTPException:
+            # Not an allowed type, the upload can never be finalized
+            await self._delete(upload, token)
+            raise
+
+        except FileTooLargeError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Chunk exceeds the upload length",
+            )
+
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Something went wrong while uploading file",
+            )
+
+        finally:
+            size = min(await self.parts.size(upload.id), upload.length)
+            if size > offset:
+                observe_upload(size - offset, time.perf_counter() - start)
+
+            updated = await self.uow.uploads.unlock_upload(
+                upload.id, token, size, mime_type if size else None
+            )
+            await self.uow.commit()
+
+        if updated is None:
+            # The lease ran out and another request took the upload over
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Upload is in progress"
+            )
+
+        return updated
+
+    async def finalize(
+        self, upload_id: uuid.UUID, current_user: ReadUserSchema
+    ) -> ReadFileSchema:
+        upload = await self.get(upload_id, current_user)
+
+        if upload.offset != upload.length:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Upload is not complete"
+            )
+
+        token = await self._lock(upload)
+
+        # The part stays until the file is committed, so a failed finalize
+        # can be repeated
+        tmp_path = self.storage.temp_path()
+
+        mime_type = upload.mime_type
+
+        try:
+            async with self._leased(upload, token):
+                if mime_type is None:
+                    mime_type = await self._check_type(
+                        await self.parts.read_head(
+                            upload.id, self.settings.files.sniff_size
+                        )
+                    )
 
+                await self.parts.link(upload.id, tmp_path)
+                digest = await hash_file(tmp_path)
 
+        except HTTPException:
+            await self._delete(upload, token)
+            raise
+
+        except Exception:
+            await self.storage.discard(tmp_path)
+            await self._unlock(upload, token)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Something went wrong while uploading file",
+            )
+
+        if not await self.uow.uploads.delete_locked_upload(upload.id, token):
+            await self.storage.discard(tmp_path)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Upload is in progress"
+            )
+
+        try:
+            new_file = await self._save(
+                StagedFileSchema(
+                    tmp_path=tmp_path,
+                    hash=digest,
+                    size=upload.length,
+                    mime_type=mime_type,
+                ),
+                current_user,
+                upload.name,
+            )
+        except HTTPException:
+            await self._unlock(upload, token)
+            raise
+
+        await self.parts.delete(upload.id)
+
+        return new_file
+
+    async def delete(self, upload_id: uuid.UUID, current_user: ReadUserSchema) -> None:
+        upload = await self.get(upload_id, current_user)
+
+        token = await self._lock(upload)
+        await self._delete(upload, token)
+
+    async def _sniff(
+        self, upload: ReadUploadSchema, offset: int, chunks: AsyncIterator[bytes]
+    ) -> tuple[str | None, AsyncIterator[bytes]]:
+        """
+        Check the type on the part so far and the head of the chunk
+
+        ``None`` while the head is incomplete, a short first chunk would be
+        taken for ``application/octet-stream`` otherwise.
+        """
+        sniff_size = min(self.settings.files.sniff_size, upload.length)
+        head = await self.parts.read_head(upload.id, min(offset, sniff_size))
+
+        if len(head) < sniff_size:
+            chunk_head, chunks = await read_head(chunks, sniff_size - len(head))
+            head += chunk_head
+
+        if len(head) < sniff_size:
+            return None, chunks
+
+        return await self._check_type(head), chunks
+
+    async def _lock(self, upload: ReadUploadSchema) -> uuid.UUID:
+        token = await self.uow.uploads.lock_upload(
+            upload.id,
+            upload.offset,
+            self.settings.uploads.lock_seconds,
+            self.settings.uploads.expire_seconds,
+        )
+
+        if token is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Upload is in progress"
+            )
+
+        # Committed right away, the chunk is received without a transaction
+        await self.uow.commit()
+
+        return token
+
+    @contextlib.asynccontextmanager
+    async def _leased(
+        self, upload: ReadUploadSchema, token: uuid.UUID
+    ) -> AsyncIterator[None]:
+        """
+        Keep renewing the lease on the upload while the block runs
+
+        A slow chunk may take longer than one lease, only a request that died
+        lets it run out.
+        """
+        renewal = asyncio.create_task(self._renew(upload.id, token))
+
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await renewal
+
+    async def _renew(self, upload_id: uuid.UUID, token: uuid.UUID) -> None:
+        lock_seconds = self.settings.uploads.lock_seconds
+
+        while True:
+            await asyncio.sleep(lock_seconds / 3)
+
+            # In a session of its own, the request's one may be in use
+            uow = UnitOfWork(self.uow.router)
+
+            try:
+                renewed = await uow.uploads.renew_lock(upload_id, token, lock_seconds)
+                await uow.commit()
+            except Exception:
+                logger.exception("Renewing the lease on upload %s failed", upload_id)
+                continue
+            finally:
+                await uow.close()
+
+            if not renewed:
+                return
+
+    async def _unlock(self, upload: ReadUploadSchema, token: uuid.UUID) -> None:
+        await self.uow.uploads.unlock_upload(
+            upload.id, token, upload.offset, upload.mime_type
+        )
+        await self.uow.commit()
+
+    async def _delete(self, upload: ReadUploadSchema, token: uuid.UUID) -> None:
+        deleted = await self.uow.uploads.delete_locked_upload(upload.id, token)
+        await self.uow.commit()
+
+        if deleted:
+            await self.parts.delete(upload.id)
+
+
+@traced_methods("service")
 class GetUsersFilesService:
-    def __init__(self, db_session: AsyncSession):
-        self.db_session = db_session
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
 
     async def execute(
-        self, current_user: ReadUserSchema, user_id: uuid.UUID = None
-    ) -> list[ReadFileSchema]:
-        file_repo = FileRepository(self.db_session)
-
+        self,
+        current_user: ReadUserSchema,
+        user_id: uuid.UUID = None,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> FilePageSchema:
         _id = user_id or current_user.id
 
         if user_id:
-            user_repo = UserRepository(self.db_session)
-            if not await user_repo.get_user_by_id(_id):
+            if not await self.uow.users.get_user_by_id(_id):
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
                 )
@@ -104,17 +651,283 @@ class GetUsersFilesService:
                 detail="You don't have permission to get other user's files",
             )
 
-        return await file_repo.get_user_files(_id)
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+
+        return await self.uow.files.get_user_files(_id, limit, after)
+
+
+@traced_methods("service")
+class SearchFilesService:
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
+
+    async def execute(
+        self,
+        current_user: ReadUserSchema,
+        query: str,
+        everyone: bool = False,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> FileSearchPageSchema:
+        if everyone and not current_user.is_admin:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have permission to get other user's files",
+            )
+
+        try:
+            after = decode_rank_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+
+        return await self.uow.files.search_files(
+            query, limit, user_id=None if everyone else current_user.id, after=after
+        )
+
+
+async def _get_file_content(
+    uow: UnitOfWork, file_id: uuid.UUID, current_user: ReadUserSchema
+) -> FileContentSchema:
+    file: FileContentSchema | None = await uow.files.get_file_content(file_id)
+
+    if not file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
+        )
+
+    if not current_user.is_admin and current_user.id != file.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to get other user's files",
+        )
+
+    return file
+
+
+def _object_response(
+    backend: StorageBackend,
+    key: str,
+    stat: ObjectStat,
+    request: Request,
+    etag: str,
+    media_type: str,
+) -> RangeResponse:
+    # Local files go out with sendfile, anything else is streamed through
+    if local_path := backend.local_path(key):
+        return RangeFileResponse(
+            local_path,
+            stat.size,
+            stat.mtime,
+            request.headers,
+            etag=etag,
+            media_type=media_type,
+            method=request.method,
+        )
+
+    return RangeStreamResponse(
+        functools.partial(backend.read, key),
+        stat.size,
+        stat.mtime,
+        request.headers,
+        etag=etag,
+        media_type=media_type,
+        method=request.method,
+    )
+
+
+@traced_methods("service")
+class StreamFileService:
+    def __init__(
+        self,
+        settings: Settings,
+        uow: UnitOfWork,
+        storage: BlobStorage,
+        transcoder: Transcoder,
+    ):
+        self.settings = settings
+        self.uow = uow
+        self.storage = storage
+        self.transcoder = transcoder
+
+    def _choose_rendition(
+        self, file: FileContentSchema, request: Request, rendition: str | None
+    ) -> str | None:
+        transcode = self.settings.transcode
+
+        if rendition not in (None, "original", *transcode.renditions):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown rendition"
+            )
+
+        # Files stored before blobs have no renditions
+        if rendition == "original" or not transcode.enabled or file.blob_id is None:
+            return None
+
+        if rendition is not None:
+            return rendition
+
+        return choose_rendition(transcode.renditions, request.headers, file.bitrate)
+
+    async def execute(
+        self,
+        file_id: uuid.UUID,
+        current_user: ReadUserSchema,
+        request: Request,
+        rendition: str | None = None,
+    ) -> RangeResponse:
+        file = await _get_file_content(self.uow, file_id, current_user)
+
+        backend = self.storage.backend
+        path = file.path
+        media_type = (
+            file.mime_type
+            or mimetypes.guess_type(file.path)[0]
+            or "application/octet-stream"
+        )
+        etag_suffix = ""
+        stat = None
+
+        if name := self._choose_rendition(file, request, rendition):
+            made = await self.transcoder.get(self.uow, file, name)
+
+            # The original is streamed if the rendition failed or was evicted
+            if made is not None:
+                with contextlib.suppress(FileNotFoundError):
+                    stat = await backend.stat(made.path)
+                    path, media_type = made.path, made.mime_type
+                    etag_suffix = f"-{name}"
+
+        if stat is None:
+            try:
+                stat = await backend.stat(path)
+            except FileNotFoundError:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
+                )
+
+        if file.hash:
+            etag = f'"{file.hash}{etag_suffix}"'
+        else:
+            etag = f'"{stat.size:x}-{int(stat.mtime * 1e9):x}"'
+
+        response = _object_response(backend, path, stat, request, etag, media_type)
+
+        if self.settings.transcode.enabled and rendition is None:
+            # The representation depends on these, caches have to know
+            response.headers["Vary"] = f"Accept, {CLIENT_HINTS}"
+            response.headers["Accept-CH"] = CLIENT_HINTS
+
+        return response
+
+
+@traced_methods("service")
+class GetFilePeaksService:
+    def __init__(self, uow: UnitOfWork, storage: BlobStorage):
+        self.uow = uow
+        self.storage = storage
+
+    async def execute(
+        self,
+        file_id: uuid.UUID,
+        current_user: ReadUserSchema,
+        request: Request,
+        samples_per_pixel: int | None = None,
+    ) -> RangeResponse:
+        file = await _get_file_content(self.uow, file_id, current_user)
+
+        # Files stored before blobs have no peaks
+        peaks = await self.uow.peaks.get_peaks(file.blob_id) if file.blob_id else None
+
+        if peaks is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Peaks not found"
+            )
+
+        # The coarsest level still as detailed as asked for, clients zoom out
+        # of it on their own
+        level = max(
+            (level for level in peaks.levels if level <= (samples_per_pixel or 0)),
+            default=min(peaks.levels),
+        )
+        key = level_key(peaks.path, level)
+
+        try:
+            stat = await self.storage.backend.stat(key)
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Peaks not found"
+            )
+
+        response = _object_response(
+            self.storage.backend,
+            key,
+            stat,
+            request,
+            etag=f'"{file.hash}-peaks-{level}"',
+            media_type="application/octet-stream",
+        )
+
+        # Peaks of a blob never change
+        response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+
+        return response
 
 
 def get_upload_file_service(
     settings: Annotated[Settings, Depends(get_settings)],
-    db_session: Annotated[AsyncSession, Depends(get_async_session)],
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
+    storage: Annotated[BlobStorage, Depends(get_blob_storage)],
+    detector: Annotated[MimeDetector, Depends(get_mime_detector)],
 ) -> UploadFilesService:
-    return UploadFilesService(settings=settings, db_session=db_session)
+    return UploadFilesService(
+        settings=settings, uow=uow, storage=storage, detector=detector
+    )
+
+
+def get_resumable_upload_service(
+    settings: Annotated[Settings, Depends(get_settings)],
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
+    storage: Annotated[BlobStorage, Depends(get_blob_storage)],
+    detector: Annotated[MimeDetector, Depends(get_mime_detector)],
+    parts: Annotated[UploadParts, Depends(get_upload_parts)],
+) -> ResumableUploadService:
+    return ResumableUploadService(
+        settings=settings, uow=uow, storage=storage, detector=detector, parts=parts
+    )
 
 
 def get_get_users_files_service(
-    db_session: Annotated[AsyncSession, Depends(get_async_session)],
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
 ) -> GetUsersFilesService:
-    return GetUsersFilesService(db_session=db_session)
+    return GetUsersFilesService(uow=uow)
+
+
+def get_search_files_service(
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
+) -> SearchFilesService:
+    return SearchFilesService(uow=uow)
+
+
+def get_stream_file_service(
+    settings: Annotated[Settings, Depends(get_settings)],
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
+    storage: Annotated[BlobStorage, Depends(get_blob_storage)],
+    transcoder: Annotated[Transcoder, Depends(get_transcoder)],
+) -> StreamFileService:
+    return StreamFileService(
+        settings=settings, uow=uow, storage=storage, transcoder=transcoder
+    )
+
+
+def get_file_peaks_service(
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
+    storage: Annotated[BlobStorage, Depends(get_blob_storage)],
+) -> GetFilePeaksService:
+    return GetFilePeaksService(uow=uow, storage=storage)
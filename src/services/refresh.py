@@ -2,22 +2,20 @@ from typing import Annotated
 
 from fastapi import HTTPException, status
 from fastapi.params import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.session import get_async_session
-from src.repositories.user_repo import UserRepository
+from src.db.uow import UnitOfWork, get_uow
 from src.schemas.auth import RefreshTokenSchema, AccessTokenResponseSchema
 from src.schemas.user import UserTokenDataSchema, ReadUserSchema
 from src.utils.auth import verify_token, create_tokens
+from src.utils.profiling import traced_methods
 
 
+@traced_methods("service")
 class RefreshTokenService:
-    def __init__(self, db_session: AsyncSession) -> None:
-        self.db_session = db_session
+    def __init__(self, uow: UnitOfWork) -> None:
+        self.uow = uow
 
     async def execute(self, data: RefreshTokenSchema) -> AccessTokenResponseSchema:
-        user_repository: UserRepository = UserRepository(session=self.db_session)
-
         user_token_data: UserTokenDataSchema | None = verify_token(
             data.refresh_token, token_type="refresh"
         )
@@ -27,7 +25,9 @@ class RefreshTokenService:
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
             )
 
-        user: ReadUserSchema | None = await user_repository.get_user_by_id(
+        self.uow.bind_user(user_token_data.user_id)
+
+        user: ReadUserSchema | None = await self.uow.users.get_user_by_id(
             user_token_data.user_id
         )
 
@@ -40,6 +40,6 @@ class RefreshTokenService:
 
 
 def get_refresh_token_service(
-    db_session: Annotated[AsyncSession, Depends(get_async_session)],
+    uow: Annotated[UnitOfWork, Depends(get_uow)],
 ) -> RefreshTokenService:
-    return RefreshTokenService(db_session)
+    return RefreshTokenService(uow)
@@ -0,0 +1,71 @@
+import asyncio
+
+from fastapi import HTTPException, status
+
+from src.db.session import engine, replica_engines, get_pool_stats
+from src.schemas.system import PoolStatsSchema, ProfileSchema, ProfileSummarySchema
+from src.schemas.user import ReadUserSchema
+from src.utils.profiling import ProfileStore, get_profile_store, traced_methods
+
+
+def _check_admin(current_user: ReadUserSchema) -> None:
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission for this action",
+        )
+
+
+@traced_methods("service")
+class PoolStatsService:
+    async def execute(self, current_user: ReadUserSchema) -> list[PoolStatsSchema]:
+        _check_admin(current_user)
+
+        return [get_pool_stats("primary", engine)] + [
+            get_pool_stats(f"replica-{i}", replica)
+            for i, replica in enumerate(replica_engines)
+        ]
+
+
+class ListProfilesService:
+    def __init__(self, store: ProfileStore):
+        self.store = store
+
+    async def execute(self, current_user: ReadUserSchema) -> list[ProfileSummarySchema]:
+        _check_admin(current_user)
+
+        return [
+            ProfileSummarySchema.model_validate(profile)
+            for profile in await asyncio.to_thread(self.store.list)
+        ]
+
+
+class GetProfileService:
+    def __init__(self, store: ProfileStore):
+        self.store = store
+
+    async def execute(
+        self, current_user: ReadUserSchema, profile_id: str
+    ) -> ProfileSchema:
+        _check_admin(current_user)
+
+        profile = await asyncio.to_thread(self.store.load, profile_id)
+
+        if profile is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+            )
+
+        return ProfileSchema.model_validate(profile)
+
+
+def get_pool_stats_service() -> PoolStatsService:
+    return PoolStatsService()
+
+
+def get_list_profiles_service() -> ListProfilesService:
+    return ListProfilesService(get_profile_store())
+
+
+def get_get_profile_service() -> GetProfileService:
+    return GetProfileService(get_profile_store())
@@ -1,21 +1,30 @@
 import uuid
 from typing import Annotated
 
-import aiofiles.os
 from fastapi import HTTPException, status
 from fastapi.params import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.core.config import BASE_DIR
-from src.db.session import get_async_session
+from src.db.uow import UnitOfWork, get_uow
 from src.repositories.user_repo import UserRepository
-from src.schemas.user import ReadUserSchema, UpdateUserSchema
-
-
+from src.schemas.user import (
+    ReadUserSchema,
+    UpdateUserSchema,
+    DeleteUsersSchema,
+    DeleteUsersResultSchema,
+)
+from src.utils.cache import get_user_cache
+from src.utils.profiling import traced_methods
+from src.workers.reaper import get_storage_reaper
+
+
+@traced_methods("service")
 class BaseUserService:
-    def __init__(self, db_session: AsyncSession) -> None:
-        self.db_session = db_session
-        self.user_repository = UserRepository(db_session)
+    def __init__(self, uow: UnitOfWork) -> None:
+        self.uow = uow
+
+    @property
+    def user_repository(self) -> UserRepository:
+        return self.uow.users
 
     async def _get_user_or_404(self, user_id: uuid.UUID) -> ReadUserSchema:
         user = await self.user_repository.get_user_by_id(user_id)
@@ -34,11 +43,13 @@ class BaseUserService:
             )
 
 
+@traced_methods("service")
 class RetrieveUserService(BaseUserService):
     async def execute(self, user_id: uuid.UUID) -> ReadUserSchema:
         return await self._get_user_or_404(user_id)
 
 
+@traced_methods("service")
 class UpdateUserService(BaseUserService):
     async def execute(
         self, user_id: uuid.UUID, data: UpdateUserSchema, current_user: ReadUserSchema
@@ -51,9 +62,16 @@ class UpdateUserService(BaseUserService):
                 detail="You don't have permission to update this user",
             )
 
-        return await self.user_repository.update_user(user_id, data)
+        updated_user = await self.user_repository.update_user(user_id, data)
+        self.uow.touch(user_id)
+        await self.uow.commit()
+
+        await get_user_cache().invalidate(user_id)
 
+        return updated_user
 
+
+@traced_methods("service")
 class DeleteUserService(BaseUserService):
     async def execute(self, user_id: uuid.UUID, current_user: ReadUserSchema) -> None:
         self._check_admin_permissions(current_user)
@@ -66,22 +84,46 @@ class DeleteUserService(BaseUserService):
         #         detail="You can't delete superusers",
         #     )
 
-        users_file_path = BASE_DIR / "files" / str(user_id)
+        await self._delete([user.id])
+
+    async def _delete(self, user_ids: list[uuid.UUID]) -> list[uuid.UUID]:
+        """
+        Hide the users right away, their files are reclaimed by the storage reaper
+        """
+        deleted = await self.user_repository.tombstone_users(user_ids)
+        for user_id in deleted:
+            self.uow.touch(user_id)
+        await self.uow.commit()
+
+        user_cache = get_user_cache()
+        for user_id in deleted:
+            await user_cache.invalidate(user_id)
+
+        get_storage_reaper().wake()
+
+        return deleted
+
+
+@traced_methods("service")
+class DeleteUsersService(DeleteUserService):
+    async def execute(
+        self, data: DeleteUsersSchema, current_user: ReadUserSchema
+    ) -> DeleteUsersResultSchema:
+        self._check_admin_permissions(current_user)
 
-        if await aiofiles.os.path.exists(users_file_path):
-            for file in await aiofiles.os.scandir(users_file_path):
-                if file.is_file():
-                    await aiofiles.os.remove(file.path)
-            await aiofiles.os.rmdir(users_file_path)
+        deleted = await self._delete(data.user_ids)
 
-        await self.user_repository.delete_user(user_id)
+        return DeleteUsersResultSchema(
+            deleted=deleted,
+            not_found=[user_id for user_id in data.user_ids if user_id not in deleted],
+        )
 
 
 def get_service(service_class):
     def _get_service(
-        db_session: Annotated[AsyncSession, Depends(get_async_session)],
+        uow: Annotated[UnitOfWork, Depends(get_uow)],
     ) -> service_class:
-        return service_class(db_session=db_session)
+        return service_class(uow=uow)
 
     return _get_service
 
@@ -89,3 +131,4 @@ def get_service(service_class):
 get_retrieve_user_service = get_service(RetrieveUserService)
 get_update_user_service = get_service(UpdateUserService)
 get_delete_user_service = get_service(DeleteUserService)
+get_delete_users_service = get_service(DeleteUsersService)
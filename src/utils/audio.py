@@ -0,0 +1,566 @@
+import os
+import struct
+from typing import Any, BinaryIO, Iterator
+
+
+class MetadataError(Exception):
+    pass
+
+
+# Largest metadata packet or block that is read into memory, cover art included
+MAX_BLOCK_SIZE = 16 * 1024 * 1024
+
+INT_FIELDS = ("bitrate", "sample_rate", "channels", "bits_per_sample", "track_number")
+
+ID3_TAGS = {
+    "TIT2": "title",
+    "TT2": "title",
+    "TPE1": "artist",
+    "TP1": "artist",
+    "TALB": "album",
+    "TAL": "album",
+    "TCON": "genre",
+    "TCO": "genre",
+    "TDRC": "date",
+    "TYER": "date",
+    "TYE": "date",
+    "TRCK": "track_number",
+    "TRK": "track_number",
+}
+
+VORBIS_TAGS = {
+    "TITLE": "title",
+    "ARTIST": "artist",
+    "ALBUM": "album",
+    "GENRE": "genre",
+    "DATE": "date",
+    "TRACKNUMBER": "track_number",
+}
+
+RIFF_INFO_TAGS = {
+    "INAM": "title",
+    "IART": "artist",
+    "IPRD": "album",
+    "IGNR": "genre",
+    "ICRD": "date",
+    "ITRK": "track_number",
+}
+
+WAVE_FORMATS = {
+    0x0001: "pcm",
+    0x0003: "ieee_float",
+    0x0006: "alaw",
+    0x0007: "mulaw",
+    0x0055: "mp3",
+}
+
+# Kilobits per second by (version is MPEG-1, layer)
+MPEG_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Hz by the version bits: MPEG-2.5, reserved, MPEG-2, MPEG-1
+MPEG_SAMPLE_RATES = {
+    0b00: (11025, 12000, 8000),
+    0b10: (22050, 24000, 16000),
+    0b11: (44100, 48000, 32000),
+}
+
+
+def _read_exact(file: BinaryIO, size: int) -> bytes:
+    if size > MAX_BLOCK_SIZE:
+        raise MetadataError("Metadata block is too large")
+
+    data = file.read(size)
+    if len(data) != size:
+        raise MetadataError("Unexpected end of file")
+
+    return data
+
+
+def _apply_tags(
+    result: dict[str, Any], tags: dict[str, str], mapping: dict[str, str]
+) -> None:
+    # Postgres text can't hold NUL characters
+    tags = {
+        key.replace("\x00", ""): value.replace("\x00", "")
+        for key, value in tags.items()
+    }
+    result["tags"] = tags
+
+    for key, field in mapping.items():
+        if key in tags and result.get(field) is None:
+            result[field] = tags[key]
+
+    track = result.get("track_number")
+    if isinstance(track, str):
+        number = track.split("/")[0].strip()
+        result["track_number"] = int(number) if number.isdecimal() else None
+
+
+def _finish(result: dict[str, Any], audio_size: int) -> dict[str, Any]:
+    duration = result.get("duration")
+
+    if not result.get("bitrate") and duration:
+        result["bitrate"] = int(audio_size * 8 / duration)
+
+    # Garbage headers must not overflow the integer columns
+    for key in INT_FIELDS:
+        if result.get(key) is not None and not 0 <= result[key] < 2**31:
+            result[key] = None
+
+    return result
+
+
+def _parse_vorbis_comment(data: bytes) -> dict[str, str]:
+    """
+    Parse a Vorbis comment block shared by Vorbis, Opus and FLAC
+    """
+    tags: dict[str, str] = {}
+
+    try:
+        (vendor_length,) = struct.unpack_from("<I", data, 0)
+        offset = 4 + vendor_length
+        (count,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+
+        for _ in range(count):
+            (length,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            comment = data[offset : offset + length].decode("utf-8", "replace")
+            offset += length
+
+            key, sep, value = comment.partition("=")
+            if not sep:
+                continue
+
+            key = key.upper()
+            tags[key] = f"{tags[key]}; {value}" if key in tags else value
+
+    except struct.error:
+        # A truncated block still yields the comments read so far
+        pass
+
+    return tags
+
+
+def _parse_streaminfo(data: bytes) -> dict[str, Any]:
+    (packed,) = struct.unpack_from(">Q", data, 10)
+
+    sample_rate = packed >> 44
+    total_samples = packed & 0xFFFFFFFFF
+
+    return {
+        "sample_rate": sample_rate or None,
+        "channels": ((packed >> 41) & 0b111) + 1,
+        "bits_per_sample": ((packed >> 36) & 0b11111) + 1,
+        "duration": total_samples / sample_rate
+        if sample_rate and total_samples
+        else None,
+    }
+
+
+def _parse_flac(file: BinaryIO, size: int) -> dict[str, Any]:
+    result: dict[str, Any] = {"format": "flac", "codec": "flac"}
+    tags: dict[str, str] = {}
+
+    file.seek(4)
+    last = False
+
+    while not last:
+        header = _read_exact(file, 4)
+        last = bool(header[0] & 0x80)
+        block_type = header[0] & 0x7F
+        length = int.from_bytes(header[1:4], "big")
+
+        if block_type == 0:
+            result.update(_parse_streaminfo(_read_exact(file, length)))
+        elif block_type == 4:
+            tags = _parse_vorbis_comment(_read_exact(file, length))
+        else:
+            file.seek(length, os.SEEK_CUR)
+
+    _apply_tags(result, tags, VORBIS_TAGS)
+    return _finish(result, size - file.tell())
+
+
+def _parse_wav(file: BinaryIO, size: int) -> dict[str, Any]:
+    result: dict[str, Any] = {"format": "wav"}
+    tags: dict[str, str] = {}
+    byte_rate = data_size = 0
+
+    file.seek(12)
+
+    while header := file.read(8):
+        if len(header) < 8:
+            break
+
+        chunk_id, length = header[:4], struct.unpack("<I", header[4:])[0]
+        padded = length + (length & 1)
+
+        if chunk_id == b"fmt ":
+            chunk = _read_exact(file, padded)
+            audio_format, channels, sample_rate, byte_rate, _, bits = (
+                struct.unpack_from("<HHIIHH", chunk)
+            )
+
+            # WAVE_FORMAT_EXTENSIBLE keeps the real format in the sub-format GUID
+            if audio_format == 0xFFFE and len(chunk) >= 26:
+                (audio_format,) = struct.unpack_from("<H", chunk, 24)
+
+            result.update(
+                codec=WAVE_FORMATS.get(audio_format, f"0x{audio_format:04x}"),
+                channels=channels,
+                sample_rate=sample_rate,
+                bits_per_sample=bits or None,
+                bitrate=byte_rate * 8 or None,
+            )
+
+        elif chunk_id == b"LIST":
+            chunk = _read_exact(file, padded)
+
+            if chunk[:4] == b"INFO":
+                offset = 4
+                while offset + 8 <= len(chunk):
+                    key = chunk[offset : offset + 4].decode("latin-1")
+                    (item_length,) = struct.unpack_from("<I", chunk, offset + 4)
+                    value = chunk[offset + 8 : offset + 8 + item_length]
+                    tags[key] = value.rstrip(b"\x00").decode("utf-8", "replace")
+                    offset += 8 + item_length + (item_length & 1)
+
+        else:
+            if chunk_id == b"data":
+                data_size = min(length, size - file.tell())
+            file.seek(padded, os.SEEK_CUR)
+
+    if byte_rate and data_size:
+        result["duration"] = data_size / byte_rate
+
+    _apply_tags(result, tags, RIFF_INFO_TAGS)
+    return _finish(result, data_size)
+
+
+def _iter_ogg_packets(file: BinaryIO, limit: int) -> Iterator[bytes]:
+    """
+    Yield the first ``limit`` packets, assuming a single logical stream
+    """
+    packet = b""
+    count = 0
+
+    file.seek(0)
+
+    while count < limit:
+        header = file.read(27)
+        if len(header) < 27 or header[:4] != b"OggS":
+            return
+
+        segments = _read_exact(file, header[26])
+
+        for lacing in segments:
+            packet += _read_exact(file, lacing)
+
+            if lacing < 255:
+                yield packet
+                packet = b""
+                count += 1
+
+                if count == limit:
+                    return
+
+            elif len(packet) > MAX_BLOCK_SIZE:
+                raise MetadataError("Metadata block is too large")
+
+
+def _last_granule(file: BinaryIO, size: int) -> int | None:
+    file.seek(max(0, size - 65536))
+    tail = file.read()
+
+    offset = tail.rfind(b"OggS")
+    while offset != -1:
+        if offset + 14 <= len(tail):
+            (granule,) = struct.unpack_from("<q", tail, offset + 6)
+            if granule >= 0:
+                return granule
+
+        offset = tail.rfind(b"OggS", 0, offset)
+
+    return None
+
+
+def _parse_ogg(file: BinaryIO, size: int) -> dict[str, Any]:
+    packets = list(_iter_ogg_packets(file, 2))
+    if not packets:
+        raise MetadataError("No Ogg packets")
+
+    ident = packets[0]
+    comment = packets[1] if len(packets) > 1 else b""
+    result: dict[str, Any] = {"format": "ogg"}
+    tags: dict[str, str] = {}
+    granule_rate = pre_skip = 0
+
+    if ident.startswith(b"\x01vorbis"):
+        channels, sample_rate, _, nominal = struct.unpack_from("<BIiiI", ident, 11)[:4]
+        result.update(
+            codec="vorbis",
+            channels=channels,
+            sample_rate=sample_rate,
+            bitrate=nominal if nominal > 0 else None,
+        )
+        granule_rate = sample_rate
+        if comment.startswith(b"\x03vorbis"):
+            tags = _parse_vorbis_comment(comment[7:])
+
+    elif ident.startswith(b"OpusHead"):
+        channels, pre_skip, sample_rate = struct.unpack_from("<BHI", ident, 9)
+        result.update(codec="opus", channels=channels, sample_rate=sample_rate)
+        granule_rate = 48000
+        if comment.startswith(b"OpusTags"):
+            tags = _parse_vorbis_comment(comment[8:])
+
+    elif ident.startswith(b"\x7fFLAC"):
+        result["codec"] = "flac"
+        result.update(_parse_streaminfo(ident[17:51]))
+        granule_rate = result.get("sample_rate") or 0
+        tags = _parse_vorbis_comment(comment[4:]) if comment else {}
+
+    else:
+        raise MetadataError("Unsupported Ogg codec")
+
+    if granule_rate and not result.get("duration"):
+        granule = _last_granule(file, size)
+        if granule and granule > pre_skip:
+            result["duration"] = (granule - pre_skip) / granule_rate
+
+    _apply_tags(result, tags, VORBIS_TAGS)
+    return _finish(result, size)
+
+
+def _synchsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_id3_text(data: bytes) -> str:
+    encoding, text = data[:1], data[1:]
+
+    if encoding == b"\x01":
+        value = text.decode("utf-16", "replace")
+    elif encoding == b"\x02":
+        value = text.decode("utf-16-be", "replace")
+    elif encoding == b"\x03":
+        value = text.decode("utf-8", "replace")
+    else:
+        value = text.decode("latin-1")
+
+    return "/".join(part for part in value.split("\x00") if part)
+
+
+def _parse_id3v2(header: bytes, body: bytes) -> dict[str, str]:
+    version, flags = header[3], header[5]
+    tags: dict[str, str] = {}
+
+    if version < 4 and flags & 0x80:
+        body = body.replace(b"\xff\x00", b"\xff")
+
+    offset = 0
+    if flags & 0x40 and len(body) >= 4:
+        if version == 4:
+            offset = _synchsafe(body[:4])
+        else:
+            offset = 4 + int.from_bytes(body[:4], "big")
+
+    id_size, header_size = (3, 6) if version == 2 else (4, 10)
+
+    while offset + header_size <= len(body):
+        frame_id = body[offset : offset + id_size]
+        if not frame_id.strip(b"\x00"):
+            break
+
+        raw_size = body[offset + id_size : offset + id_size * 2]
+        if version == 2:
+            frame_size = int.from_bytes(raw_size[:3], "big")
+        elif version == 4:
+            frame_size = _synchsafe(raw_size)
+        else:
+            frame_size = int.from_bytes(raw_size, "big")
+
+        data = body[offset + header_size : offset + header_size + frame_size]
+        offset += header_size + frame_size
+
+        key = frame_id.decode("latin-1")
+        if key.startswith("T") and key not in ("TXXX", "TXX") and data:
+            tags[key] = _decode_id3_text(data)
+
+    return tags
+
+
+def _parse_id3v1(file: BinaryIO, size: int) -> dict[str, str]:
+    if size < 128:
+        return {}
+
+    file.seek(size - 128)
+    tag = file.read(128)
+    if tag[:3] != b"TAG":
+        return {}
+
+    def text(data: bytes) -> str:
+        return data.split(b"\x00")[0].decode("latin-1").strip()
+
+    fields = {
+        "TIT2": text(tag[3:33]),
+        "TPE1": text(tag[33:63]),
+        "TALB": text(tag[63:93]),
+        "TYER": text(tag[93:97]),
+    }
+
+    # ID3v1.1 stores the track number in the last byte of the comment
+    if tag[125] == 0 and tag[126]:
+        fields["TRCK"] = str(tag[126])
+
+    return {key: value for key, value in fields.items() if value}
+
+
+def _mpeg_frame(data: bytes, offset: int) -> dict[str, Any] | None:
+    """
+    Decode the MPEG audio frame header at ``offset``
+    """
+    if offset + 4 > len(data) or data[offset] != 0xFF:
+        return None
+
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if b1 & 0xE0 != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0b11
+    layer = 4 - ((b1 >> 1) & 0b11)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0b11
+
+    if version == 0b01 or layer == 4 or bitrate_index in (0, 15):
+        return None
+    if sample_rate_index == 0b11:
+        return None
+
+    mpeg1 = version == 0b11
+    bitrate = MPEG_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 1
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+
+    return {
+        "mpeg1": mpeg1,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": 1 if b3 >> 6 == 0b11 else 2,
+        "samples": samples,
+        "length": length,
+    }
+
+
+def _vbr_frames(data: bytes, offset: int, frame: dict[str, Any]) -> int | None:
+    """
+    Read the total frame count from a Xing/Info or VBRI header
+    """
+    mono = frame["channels"] == 1
+    side_info = (17 if mono else 32) if frame["mpeg1"] else (9 if mono else 17)
+
+    xing = offset + 4 + side_info
+    if data[xing : xing + 4] in (b"Xing", b"Info"):
+        (flags,) = struct.unpack_from(">I", data, xing + 4)
+        if flags & 1:
+            return struct.unpack_from(">I", data, xing + 8)[0]
+
+    vbri = offset + 36
+    if data[vbri : vbri + 4] == b"VBRI":
+        return struct.unpack_from(">I", data, vbri + 14)[0]
+
+    return None
+
+
+def _parse_mp3(file: BinaryIO, size: int) -> dict[str, Any]:
+    result: dict[str, Any] = {"format": "mp3"}
+    tags: dict[str, str] = {}
+    audio_start = 0
+
+    file.seek(0)
+    header = file.read(10)
+    if header[:3] == b"ID3" and len(header) == 10:
+        tag_size = _synchsafe(header[6:10])
+        tags = _parse_id3v2(header, _read_exact(file, tag_size))
+        audio_start = 10 + tag_size + (10 if header[5] & 0x10 else 0)
+
+    audio_end = size
+    id3v1 = _parse_id3v1(file, size)
+    if id3v1:
+        audio_end -= 128
+        tags = {**id3v1, **tags}
+
+    file.seek(audio_start)
+    data = file.read(65536)
+
+    for offset in range(len(data) - 4):
+        frame = _mpeg_frame(data, offset)
+        if frame is None:
+            continue
+
+        # A second header right after the first rules out a false sync
+        following = offset + frame["length"]
+        if following + 4 <= len(data) and _mpeg_frame(data, following) is None:
+            continue
+        break
+    else:
+        raise MetadataError("No MPEG audio frames")
+
+    result.update(
+        codec=f"mp{frame['layer']}",
+        sample_rate=frame["sample_rate"],
+        channels=frame["channels"],
+    )
+
+    audio_size = audio_end - audio_start - offset
+    frames = _vbr_frames(data, offset, frame)
+
+    if frames:
+        result["duration"] = frames * frame["samples"] / frame["sample_rate"]
+    else:
+        result["bitrate"] = frame["bitrate"]
+        result["duration"] = audio_size * 8 / frame["bitrate"]
+
+    _apply_tags(result, tags, ID3_TAGS)
+    return _finish(result, audio_size)
+
+
+def extract_metadata(path: str) -> dict[str, Any]:
+    """
+    Read the technical fields and tags of an MP3, FLAC, Ogg or WAV file
+
+    Only container headers are parsed, the audio itself is never decoded.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        head = file.read(12)
+
+        if head.startswith(b"fLaC"):
+            return _parse_flac(file, size)
+
+        if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+            return _parse_wav(file, size)
+
+        if head.startswith(b"OggS"):
+            return _parse_ogg(file, size)
+
+        if head.startswith(b"ID3") or _mpeg_frame(head, 0):
+            return _parse_mp3(file, size)
+
+    raise MetadataError("Unsupported format")
@@ -1,21 +1,28 @@
 from datetime import datetime, timedelta, UTC
 from typing import Literal
 
-from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, Security
 from fastapi.security import APIKeyHeader
-from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from src.db.session import get_async_session
-from src.repositories.user_repo import UserRepository
+from src.db.uow import UnitOfWork, get_uow
 from src.schemas.auth import TokenPairResponseSchema, AccessTokenResponseSchema
 from src.schemas.user import UserTokenDataSchema, ReadUserSchema
 from src.core.config import Settings, get_settings
+from src.utils.cache import get_user_cache
+from src.utils.profiling import traced
+from src.utils.tokens import InvalidTokenError, TokenVerifier, get_jwt_backend
 
 
 settings: Settings = get_settings()
 
+token_verifier = TokenVerifier(
+    get_jwt_backend(settings.auth.jwt_backend),
+    settings.auth.secret_key,
+    max_size=settings.auth.token_cache_size,
+    max_ttl=settings.auth.refresh_token_expire_minutes * 60,
+)
+
 
 def create_tokens(
     data: UserTokenDataSchema, is_access_only: bool = False
@@ -25,7 +32,7 @@ def create_tokens(
         minutes=settings.auth.access_token_expire_minutes
     )
     to_encode.update({"exp": access_token_expire, "type": "access"})
-    access_token = jwt.encode(to_encode, settings.auth.secret_key, algorithm="HS256")
+    access_token = token_verifier.encode(to_encode)
 
     tokens = {"access_token": access_token}
 
@@ -34,9 +41,7 @@ def create_tokens(
             minutes=settings.auth.refresh_token_expire_minutes
         )
         to_encode.update({"exp": refresh_token_expire, "type": "refresh"})
-        refresh_token = jwt.encode(
-            to_encode, settings.auth.secret_key, algorithm="HS256"
-        )
+        refresh_token = token_verifier.encode(to_encode)
         tokens["refresh_token"] = refresh_token
 
         return TokenPairResponseSchema.model_validate(tokens)
@@ -48,23 +53,23 @@ def verify_token(
     token: str, token_type: Literal["access", "refresh"] = "access"
 ) -> UserTokenDataSchema | None:
     try:
-        payload = jwt.decode(token, settings.auth.secret_key, algorithms="HS256")
-        _type = payload.get("type")
-
-        if not _type or token_type != _type:
-            return None
+        verified = token_verifier.verify(token)
+    except InvalidTokenError:
+        return None
 
-        return UserTokenDataSchema.model_validate(payload)
-    except JWTError:
+    if not verified.type or token_type != verified.type:
         return None
 
+    return verified.data
+
 
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
 
+@traced("auth")
 async def get_current_user(
     authorization: str = Security(api_key_header),
-    session: AsyncSession = Depends(get_async_session),
+    uow: UnitOfWork = Depends(get_uow),
 ) -> ReadUserSchema:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(
@@ -82,14 +87,24 @@ async def get_current_user(
             detail="Invalid token",
         )
 
-    user_repository = UserRepository(session)
-    user: ReadUserSchema | None = await user_repository.get_user_by_id(
-        user_token_data.user_id
-    )
+    uow.bind_user(user_token_data.user_id)
+
+    user_cache = get_user_cache()
+    user: ReadUserSchema | None = user_cache.get(user_token_data.user_id)
 
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
+        # Every request of the worker gets the cached user, so it is read from
+        # the primary: a replica may lag behind a change made in another worker
+        cacheable = uow.read_primary()
+        generation = user_cache.generation(user_token_data.user_id)
+        user = await uow.users.get_user_by_id(user_token_data.user_id)
+
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+            )
+
+        if cacheable:
+            user_cache.set(user, generation)
 
-    return ReadUserSchema.model_validate(user)
+    return user
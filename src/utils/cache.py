@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Generic, Hashable, TypeVar
+
+import asyncpg
+
+from src.core.config import Settings, get_settings
+from src.schemas.user import ReadUserSchema
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+InvalidationCallback = Callable[[str], None]
+ResetCallback = Callable[[], None]
+
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts to reconnect the listener, in seconds
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Size-bounded LRU mapping whose entries expire ``ttl`` seconds after insertion
+
+    A shorter per-entry ttl can be passed to ``set``.
+    """
+
+    def __init__(
+        self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at <= self._clock():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+
+        self._data[key] = (self._clock() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class InvalidationBackend(ABC):
+    """
+    Broadcasts cache invalidations to every subscribed cache
+
+    ``reset`` is called when invalidations may have been missed, the cache
+    has to forget everything then.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: list[tuple[InvalidationCallback, ResetCallback]] = []
+
+    def subscribe(self, callback: InvalidationCallback, reset: ResetCallback) -> None:
+        self._subscribers.append((callback, reset))
+
+    def _deliver(self, key: str) -> None:
+        for callback, _ in self._subscribers:
+            callback(key)
+
+    def _reset(self) -> None:
+        for _, reset in self._subscribers:
+            reset()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def publish(self, key: str) -> None: ...
+
+
+class LocalInvalidationBackend(InvalidationBackend):
+    """
+    In-process backend: invalidations reach the caches of the current worker only
+    """
+
+    async def publish(self, key: str) -> None:
+        self._deliver(key)
+
+
+class PostgresInvalidationBackend(InvalidationBackend):
+    """
+    Shares invalidations between uvicorn workers via Postgres LISTEN/NOTIFY
+
+    A dropped listener connection is reconnected with backoff. Notifications
+    sent in the meantime are lost, so the caches are reset once it is gone
+    and once more when it is back.
+    """
+
+    def __init__(self, dsn: str, channel: str) -> None:
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._connection: asyncpg.Connection | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        await self._connect()
+
+    async def stop(self) -> None:
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            connection.remove_termination_listener(self._on_termination)
+            await connection.close()
+
+    async def publish(self, key: str) -> None:
+        # Drop the local entry right away, the notification echo is idempotent
+        self._deliver(key)
+
+        if self._connection is None:
+            return
+
+        async with self._lock:
+            await self._connection.execute(
+                "SELECT pg_notify($1, $2)", self.channel, key
+            )
+
+    async def _connect(self) -> None:
+        connection = await asyncpg.connect(self.dsn)
+        await connection.add_listener(self.channel, self._on_notification)
+        connection.add_termination_listener(self._on_termination)
+        self._connection = connection
+
+    async def _reconnect(self) -> None:
+        delay = RECONNECT_DELAY
+
+        while True:
+            await asyncio.sleep(delay)
+
+            try:
+                await self._connect()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning("Reconnecting the invalidation listener failed: %r", e)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+
+            self._reconnect_task = None
+            self._reset()
+            logger.info("Invalidation listener reconnected")
+            return
+
+    def _on_notification(
+        self, connection: asyncpg.Connection, pid: int, channel: str, payload: str
+    ) -> None:
+        self._deliver(payload)
+
+    def _on_termination(self, connection: asyncpg.Connection) -> None:
+        if connection is not self._connection:
+            return
+
+        logger.warning("Invalidation listener connection lost, reconnecting")
+        self._connection = None
+        self._reset()
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+
+class UserCache:
+    """
+    Cache of authenticated users keyed by user id
+
+    A user read from the database is only cached if it wasn't invalidated
+    while being read: take ``generation`` before the read and pass it to
+    ``set``, an update committed in between would be put back otherwise.
+    """
+
+    def __init__(
+        self, cache: TTLCache[str, ReadUserSchema], backend: InvalidationBackend
+    ) -> None:
+        self._cache = cache
+        # Invalidations by user, forgotten all at once when there are too many
+        # of them; the epoch tells the generations taken before that apart
+        self._invalidations: dict[str, int] = {}
+        self._epoch = 0
+        self.backend = backend
+        self.backend.subscribe(self._invalidated, self._reset)
+
+    def get(self, user_id: str | uuid.UUID) -> ReadUserSchema | None:
+        return self._cache.get(str(user_id))
+
+    def generation(self, user_id: str | uuid.UUID) -> tuple[int, int]:
+        return self._epoch, self._invalidations.get(str(user_id), 0)
+
+    def set(self, user: ReadUserSchema, generation: tuple[int, int]) -> None:
+        if self.generation(user.id) != generation:
+            return
+
+        self._cache.set(str(user.id), user)
+
+    async def invalidate(self, user_id: str | uuid.UUID) -> None:
+        await self.backend.publish(str(user_id))
+
+    def _invalidated(self, user_id: str) -> None:
+        self._cache.pop(user_id)
+
+        if len(self._invalidations) >= self._cache.max_size:
+            self._invalidations.clear()
+            self._epoch += 1
+
+        self._invalidations[user_id] = self._invalidations.get(user_id, 0) + 1
+
+    def _reset(self) -> None:
+        self._cache.clear()
+        self._invalidations.clear()
+        self._epoch += 1
+
+
+def _get_invalidation_backend(settings: Settings) -> InvalidationBackend:
+    if settings.cache.invalidation_backend == "postgres":
+        return PostgresInvalidationBackend(
+            settings.db.dsn, settings.cache.invalidation_channel
+        )
+
+    return LocalInvalidationBackend()
+
+
+@lru_cache
+def get_user_cache() -> UserCache:
+    settings: Settings = get_settings()
+
+    # A cached user must never outlive the access token that fetched it
+    ttl = min(
+        settings.cache.user_ttl_seconds,
+        settings.auth.access_token_expire_minutes * 60,
+    )
+
+    return UserCache(
+        TTLCache(max_size=settings.cache.user_max_size, ttl=ttl),
+        _get_invalidation_backend(settings),
+    )
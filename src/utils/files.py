@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, BinaryIO, Protocol
+
+from fastapi import UploadFile
+
+from src.utils.profiling import traced
+
+
+class FileTooLargeError(Exception):
+    pass
+
+
+class Digest(Protocol):
+    def update(self, data: bytes, /) -> None: ...
+
+
+async def iter_upload_file(file: UploadFile, chunk_size: int) -> AsyncIterator[bytes]:
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+async def rechunk(
+    chunks: AsyncIterable[bytes], chunk_size: int
+) -> AsyncIterator[bytes]:
+    """
+    Coalesce small ASGI body messages into blocks of at least ``chunk_size`` bytes
+    """
+    buffer = bytearray()
+
+    async for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield bytes(buffer)
+
+
+async def read_head(
+    chunks: AsyncIterator[bytes], size: int
+) -> tuple[bytes, AsyncIterator[bytes]]:
+    """
+    Read at least ``size`` leading bytes of the stream
+
+    Returns the head and a stream that yields the whole content again.
+    """
+    head = b""
+
+    async for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+
+    async def _stream() -> AsyncIterator[bytes]:
+        if head:
+            yield head
+
+        async for rest in chunks:
+            yield rest
+
+    return head, _stream()
+
+
+def _open_at(path: Path, offset: int) -> BinaryIO:
+    if not offset:
+        return open(path, "wb")
+
+    file = open(path, "r+b")
+
+    try:
+        if file.seek(0, 2) < offset:
+            raise FileNotFoundError(f"{path} is shorter than {offset} bytes")
+
+        file.seek(offset)
+        file.truncate()
+    except BaseException:
+        file.close()
+        raise
+
+    return file
+
+
+def _write_chunk(file: BinaryIO, chunk: bytes, digest: Digest | None) -> None:
+    file.write(chunk)
+    if digest is not None:
+        digest.update(chunk)
+
+
+@traced("io")
+async def write_stream(
+    chunks: AsyncIterable[bytes],
+    path: Path,
+    max_size: int,
+    digest: Digest | None = None,
+    offset: int = 0,
+) -> int:
+    """
+    Write the stream to ``path`` aborting as soon as it exceeds ``max_size``
+
+    Every chunk is written and fed to ``digest`` in a single worker thread hop.
+    A non-zero ``offset`` appends the stream to the first ``offset`` bytes of
+    the existing file, dropping whatever followed them.
+    """
+    size = 0
+    file: BinaryIO = await asyncio.to_thread(_open_at, path, offset)
+
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise FileTooLargeError
+
+            await asyncio.to_thread(_write_chunk, file, chunk, digest)
+    finally:
+        await asyncio.to_thread(file.close)
+
+    return size
+
+
+def _hash_file(path: Path) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+@traced("io")
+async def hash_file(path: Path) -> str:
+    """
+    SHA-256 hex digest of the file, read in a worker thread
+    """
+    return await asyncio.to_thread(_hash_file, path)
@@ -0,0 +1,325 @@
+import asyncio
+import contextvars
+import hmac
+import time
+from functools import lru_cache
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.config import get_settings
+from src.utils.metrics import (
+    REGISTRY,
+    Counter,
+    CounterValue,
+    Gauge,
+    Histogram,
+    MultiprocessStore,
+    merge,
+    render,
+)
+from src.utils.profiling import current_profile
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Finished HTTP requests",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve an HTTP request",
+    ["method", "route"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being served right now"
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries run while serving an HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries while serving an HTTP request",
+    ["route"],
+)
+
+DB_QUERIES = Counter("db_queries_total", "Database queries run", ["engine"])
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Database query time",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+
+DB_POOL_SIZE = Gauge("db_pool_size", "Connection pool size", ["pool"])
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently in use", ["pool"]
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond the pool size", ["pool"]
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total", "Connections handed out by the pool", ["pool"]
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total", "Checkouts that timed out waiting", ["pool"]
+)
+DB_POOL_ACQUIRE_TIME = Counter(
+    "db_pool_acquire_seconds_total", "Time spent waiting for a connection", ["pool"]
+)
+
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes of uploaded files received")
+UPLOAD_THROUGHPUT = Histogram(
+    "upload_throughput_bytes_per_second",
+    "Receive rate of single uploads",
+    buckets=(1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8, 5e8, 1e9),
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.query_time = 0.0
+
+
+# Stats of the request being served, shared with the tasks it spawns
+_request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+def observe_upload(size: int, seconds: float) -> None:
+    UPLOAD_BYTES.labels().inc(size)
+    if seconds > 0:
+        UPLOAD_THROUGHPUT.labels().observe(size / seconds)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status and database time of every HTTP request
+
+    A pure ASGI middleware, so it adds no per-request task or body wrapping.
+    Requests are labelled by route template to keep the number of series
+    bounded, requests that matched no route share the ``unmatched`` label.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.in_flight = HTTP_REQUESTS_IN_FLIGHT.labels()
+        self._series: dict[tuple[str, str], _RouteSeries] = {}
+
+    def _route_series(self, method: str, template: str) -> "_RouteSeries":
+        try:
+            return self._series[method, template]
+        except KeyError:
+            series = self._series[method, template] = _RouteSeries(method, template)
+            return series
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        self.in_flight.inc()
+        start = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            self.in_flight.dec()
+            _request_stats.reset(token)
+
+            if (route := scope.get("route")) is not None:
+                template = route.path
+            elif "endpoint" in scope and not scope.get("path_params"):
+                # Plain Starlette routes without parameters, e.g. the docs
+                template = scope["path"]
+            else:
+                template = "unmatched"
+
+            series = self._route_series(scope["method"], template)
+            series.count(status_code)
+            series.duration.observe(duration)
+            series.db_queries.observe(stats.queries)
+            series.db_duration.observe(stats.query_time)
+
+
+class _RouteSeries:
+    """
+    Values of one method and route, looked up once per request
+    """
+
+    __slots__ = (
+        "method",
+        "template",
+        "duration",
+        "db_queries",
+        "db_duration",
+        "_requests",
+    )
+
+    def __init__(self, method: str, template: str) -> None:
+        self.method = method
+        self.template = template
+        self.duration = HTTP_REQUEST_DURATION.labels(method, template)
+        self.db_queries = HTTP_REQUEST_DB_QUERIES.labels(template)
+        self.db_duration = HTTP_REQUEST_DB_DURATION.labels(template)
+        self._requests: dict[int, CounterValue] = {}
+
+    def count(self, status_code: int) -> None:
+        try:
+            counter = self._requests[status_code]
+        except KeyError:
+            counter = self._requests[status_code] = HTTP_REQUESTS.labels(
+                self.method, self.template, str(status_code)
+            )
+
+        counter.inc()
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """
+    Count the queries of the engine and their time, per request as well
+
+    The time also goes to the ``db`` span of the request being profiled.
+    """
+    queries = DB_QUERIES.labels(name)
+    durations = DB_QUERY_DURATION.labels(name)
+
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: Any, parameters: Any, context: Any, *_: Any
+    ) -> None:
+        conn.info["query_start"] = time.perf_counter()
+
+    def after_cursor_execute(
+        conn: Any, cursor: Any, statement: Any, parameters: Any, context: Any, *_: Any
+    ) -> None:
+        start = conn.info.pop("query_start", None)
+        if start is None:
+            return
+
+        duration = time.perf_counter() - start
+        queries.inc()
+        durations.observe(duration)
+
+        if stats := _request_stats.get():
+            stats.queries += 1
+            stats.query_time += duration
+
+        if profile := current_profile():
+            profile.add_span("db", duration)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+def collect_pool_stats() -> None:
+    from src.db.session import engine, get_pool_stats, replica_engines
+
+    pools = [get_pool_stats("primary", engine)] + [
+        get_pool_stats(f"replica-{i}", replica)
+        for i, replica in enumerate(replica_engines)
+    ]
+
+    for stats in pools:
+        DB_POOL_SIZE.labels(stats.name).set(stats.size)
+        DB_POOL_CHECKED_OUT.labels(stats.name).set(stats.checked_out)
+        DB_POOL_OVERFLOW.labels(stats.name).set(stats.overflow)
+        DB_POOL_CHECKOUTS.labels(stats.name).set(stats.checkouts)
+        DB_POOL_TIMEOUTS.labels(stats.name).set(stats.timeouts)
+        DB_POOL_ACQUIRE_TIME.labels(stats.name).set(
+            stats.acquire_time_avg_ms * stats.checkouts / 1000
+        )
+
+
+REGISTRY.add_collector(collect_pool_stats)
+
+
+class MetricsExporter:
+    """
+    Serves ``/metrics`` and, with several worker processes, shares the
+    metrics of this one through ``multiproc_dir``
+
+    With a ``token`` only requests bearing it are served.
+    """
+
+    def __init__(
+        self,
+        multiproc_dir: str | None,
+        flush_interval: float,
+        token: str | None = None,
+    ) -> None:
+        self.store = (
+            MultiprocessStore(REGISTRY, multiproc_dir) if multiproc_dir else None
+        )
+        self.flush_interval = flush_interval
+        self.token = token
+
+    def collect(self) -> str:
+        if self.store is None:
+            return render(merge([(REGISTRY.snapshot(), True)]))
+
+        return render(self.store.collect())
+
+    def authorized(self, request: Request) -> bool:
+        if self.token is None:
+            return True
+
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            token.encode(), self.token.encode()
+        )
+
+    async def endpoint(self, request: Request) -> Response:
+        if not self.authorized(request):
+            return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+        body = await asyncio.to_thread(self.collect)
+
+        return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    async def run(self, stop: asyncio.Event) -> None:
+        if self.store is None:
+            return
+
+        while not stop.is_set():
+            await asyncio.to_thread(self.store.flush)
+
+            try:
+                await asyncio.wait_for(stop.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        await asyncio.to_thread(self.store.flush)
+
+
+@lru_cache
+def get_metrics_exporter() -> MetricsExporter:
+    settings = get_settings()
+
+    return MetricsExporter(
+        settings.metrics.multiproc_dir,
+        settings.metrics.flush_interval,
+        settings.metrics.token,
+    )
@@ -0,0 +1,349 @@
+import bisect
+import json
+import math
+import os
+from typing import Any, Callable, Generic, Iterable, TypeVar
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        """
+        Mirror a counter kept elsewhere, e.g. by the connection pool
+        """
+        self.value = value
+
+
+class GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: list[float]) -> None:
+        self.bounds = bounds
+        # Per-bucket counts, the last one catches everything above the bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+V = TypeVar("V", CounterValue, GaugeValue, HistogramValue)
+
+
+class Metric(Generic[V]):
+    type: str
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: "Registry | None" = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], V] = {}
+
+        (registry or REGISTRY).register(self)
+
+    def _new_value(self) -> V:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> V:
+        """
+        Value for the label values, created on first use
+        """
+        try:
+            return self._children[values]
+        except KeyError:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+
+            child = self._children[values] = self._new_value()
+            return child
+
+    def samples(self) -> dict[tuple[str, ...], Any]:
+        return {
+            labels: self._dump(child) for labels, child in list(self._children.items())
+        }
+
+    def _dump(self, child: V) -> Any:
+        return child.value
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+        }
+
+
+class Counter(Metric[CounterValue]):
+    type = "counter"
+
+    def _new_value(self) -> CounterValue:
+        return CounterValue()
+
+
+class Gauge(Metric[GaugeValue]):
+    type = "gauge"
+
+    def _new_value(self) -> GaugeValue:
+        return GaugeValue()
+
+
+class Histogram(Metric[HistogramValue]):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = (
+            0.005,
+            0.01,
+            0.025,
+            0.05,
+            0.1,
+            0.25,
+            0.5,
+            1,
+            2.5,
+            5,
+            10,
+        ),
+        registry: "Registry | None" = None,
+    ) -> None:
+        self.buckets = sorted(float(bound) for bound in buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def _dump(self, child: HistogramValue) -> Any:
+        return {"counts": list(child.counts), "sum": child.sum}
+
+    def describe(self) -> dict[str, Any]:
+        return {**super().describe(), "buckets": self.buckets}
+
+
+class Registry:
+    """
+    Metrics of this process
+
+    ``snapshot`` dumps every metric into a JSON-serializable dict, ``merge``
+    adds up the snapshots of several processes and ``render`` turns one into
+    the Prometheus text exposition format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric[Any]] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric[Any]) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+
+        self._metrics[metric.name] = metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Run ``collector`` before every snapshot, to update metrics kept elsewhere
+        """
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict[str, Any]:
+        for collector in self._collectors:
+            collector()
+
+        return {
+            name: {
+                **metric.describe(),
+                "samples": [
+                    [list(labels), value] for labels, value in metric.samples().items()
+                ],
+            }
+            for name, metric in self._metrics.items()
+        }
+
+
+def merge(snapshots: Iterable[tuple[dict[str, Any], bool]]) -> dict[str, Any]:
+    """
+    Add up the snapshots of several processes
+
+    Takes pairs of a snapshot and whether its process is alive. Counters and
+    histograms of exited processes are kept so totals never go back, their
+    gauges are dropped.
+    """
+    merged: dict[str, Any] = {}
+
+    for snapshot, alive in snapshots:
+        for name, metric in snapshot.items():
+            if metric["type"] == "gauge" and not alive:
+                continue
+
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            samples = target["samples"]
+
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+
+                if metric["type"] != "histogram":
+                    samples[key] = samples.get(key, 0.0) + value
+                elif key not in samples:
+                    samples[key] = {
+                        "counts": list(value["counts"]),
+                        "sum": value["sum"],
+                    }
+                else:
+                    current = samples[key]
+                    current["counts"] = [
+                        a + b for a, b in zip(current["counts"], value["counts"])
+                    ]
+                    current["sum"] += value["sum"]
+
+    for metric in merged.values():
+        metric["samples"] = [
+            [list(key), value] for key, value in metric["samples"].items()
+        ]
+
+    return merged
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value.is_integer():
+        return f"{value:.1f}"
+    return repr(value)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""),
+        )
+        for name, value in zip(names, values)
+    )
+
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def render(snapshot: dict[str, Any]) -> str:
+    """
+    Prometheus text exposition format (version 0.0.4) of a snapshot
+    """
+    lines: list[str] = []
+
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+
+        for labels, value in sorted(metric["samples"], key=lambda sample: sample[0]):
+            if metric["type"] != "histogram":
+                lines.append(
+                    f"{name}{_format_labels(labelnames, labels)} "
+                    f"{_format_value(float(value))}"
+                )
+                continue
+
+            cumulative = 0
+            for bound, count in zip([*metric["buckets"], math.inf], value["counts"]):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    [*labelnames, "le"], [*labels, _format_value(bound)]
+                )
+                lines.append(f"{name}_bucket{bucket_labels} {float(cumulative):.1f}")
+
+            series_labels = _format_labels(labelnames, labels)
+            lines.append(f"{name}_sum{series_labels} {_format_value(value['sum'])}")
+            lines.append(f"{name}_count{series_labels} {float(cumulative):.1f}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+class MultiprocessStore:
+    """
+    Shares the metrics of the worker processes through a directory
+
+    Every process writes its snapshot to ``<directory>/<pid>.json``, whichever
+    worker serves the scrape adds up all of them. The directory should be
+    emptied when the server starts, otherwise the totals of a previous run are
+    carried over.
+    """
+
+    def __init__(self, registry: Registry, directory: str) -> None:
+        self.registry = registry
+        self.directory = directory
+
+    def flush(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Looked up every time, the store may be created before a fork
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, "w") as file:
+            json.dump(self.registry.snapshot(), file)
+
+        os.replace(tmp_path, path)
+
+    def collect(self) -> dict[str, Any]:
+        snapshots: list[tuple[dict[str, Any], bool]] = [
+            (self.registry.snapshot(), True)
+        ]
+
+        for entry in os.scandir(self.directory):
+            pid, _, suffix = entry.name.partition(".")
+            if suffix != "json" or not pid.isdecimal() or int(pid) == os.getpid():
+                continue
+
+            try:
+                with open(entry.path) as file:
+                    snapshots.append((json.load(file), _pid_alive(int(pid))))
+            except (OSError, ValueError):
+                continue
+
+        return merge(snapshots)
+
+
+REGISTRY = Registry()
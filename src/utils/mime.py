@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import magic
+
+from src.core.config import Settings, get_settings
+from src.utils.profiling import traced
+
+
+# Codec identification packets that may open the first Ogg page
+OGG_AUDIO_CODECS = (b"\x01vorbis", b"OpusHead", b"\x7fFLAC", b"Speex   ")
+
+
+def _is_mpeg_frame(head: bytes) -> bool:
+    """
+    Whether ``head`` starts with a valid MPEG audio frame header
+    """
+    if len(head) < 4 or head[0] != 0xFF or head[1] & 0xE0 != 0xE0:
+        return False
+
+    version = (head[1] >> 3) & 0b11
+    layer = (head[1] >> 1) & 0b11
+    bitrate = head[2] >> 4
+    sample_rate = (head[2] >> 2) & 0b11
+
+    return version != 0b01 and layer != 0 and bitrate != 0xF and sample_rate != 0b11
+
+
+def sniff_audio_type(head: bytes) -> str | None:
+    """
+    Recognize the common audio containers by their signature
+
+    Returns ``None`` when the type has to be left to libmagic.
+    """
+    if head.startswith(b"ID3") or _is_mpeg_frame(head):
+        return "audio/mpeg"
+
+    if head.startswith(b"fLaC"):
+        return "audio/flac"
+
+    if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+        return "audio/wav"
+
+    # The codec packet follows the 27 byte page header and its segment table
+    if head.startswith(b"OggS") and len(head) > 26:
+        offset = 27 + head[26]
+        if head[offset : offset + 8].startswith(OGG_AUDIO_CODECS):
+            return "audio/ogg"
+
+    return None
+
+
+class MimeDetector:
+    """
+    Detects MIME types of uploads without blocking the event loop
+
+    Known audio signatures are matched inline. Everything else goes to libmagic
+    in a bounded thread pool, each worker thread keeping its own ``magic.Magic``
+    since a libmagic handle can't be shared between threads.
+    """
+
+    def __init__(self, max_workers: int = 2) -> None:
+        self.max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._local = threading.local()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="mime"
+            )
+
+        return self._executor
+
+    def _from_buffer(self, head: bytes) -> str:
+        detector: magic.Magic | None = getattr(self._local, "magic", None)
+
+        if detector is None:
+            detector = self._local.magic = magic.Magic(mime=True)
+
+        return detector.from_buffer(head)
+
+    @traced("mime")
+    async def detect(self, head: bytes) -> str:
+        if file_type := sniff_audio_type(head):
+            return file_type
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._from_buffer, head)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+@lru_cache
+def get_mime_detector() -> MimeDetector:
+    settings: Settings = get_settings()
+
+    return MimeDetector(max_workers=settings.files.mime_workers)
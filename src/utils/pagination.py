@@ -0,0 +1,45 @@
+import base64
+import datetime as dt
+import uuid
+
+
+def _encode(key: str, item_id: uuid.UUID) -> str:
+    raw = f"{key}|{item_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> tuple[str, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    key, sep, item_id = raw.partition("|")
+    if not sep:
+        raise ValueError("Invalid cursor")
+
+    return key, uuid.UUID(item_id)
+
+
+def encode_cursor(created_at: dt.datetime, item_id: uuid.UUID) -> str:
+    return _encode(created_at.isoformat(), item_id)
+
+
+def decode_cursor(cursor: str) -> tuple[dt.datetime, uuid.UUID]:
+    """
+    Decode a keyset cursor, raises ``ValueError`` for malformed input
+    """
+    created_at, item_id = _decode(cursor)
+    return dt.datetime.fromisoformat(created_at), item_id
+
+
+def encode_rank_cursor(rank: float, item_id: uuid.UUID) -> str:
+    return _encode(repr(rank), item_id)
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, uuid.UUID]:
+    """
+    Decode a search results cursor, raises ``ValueError`` for malformed input
+    """
+    rank, item_id = _decode(cursor)
+    return float(rank), item_id
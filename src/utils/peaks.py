@@ -0,0 +1,161 @@
+import math
+import struct
+import subprocess
+import tempfile
+import threading
+from types import ModuleType
+
+from src.core.config import Peaks
+
+
+class PeaksError(Exception):
+    pass
+
+
+# Header of the audiowaveform binary format, version 2: version, flags, sample
+# rate, samples per pixel, length in pixels and channels. Waveform front-ends
+# such as peaks.js read it as is.
+HEADER = struct.Struct("<iIiiIi")
+FORMAT_VERSION = 2
+FLAG_8_BIT = 1
+
+# Samples decoded and reduced at a time, rounded to whole pixels of every level
+CHUNK_SAMPLES = 1024 * 256
+
+
+def level_key(path: str, samples_per_pixel: int) -> str:
+    """
+    Key of the peaks of one zoom level, stored next to the blob at ``path``
+    """
+    return f"{path}.{samples_per_pixel}.dat"
+
+
+def require_numpy() -> ModuleType:
+    try:
+        import numpy
+    except ImportError as e:
+        raise RuntimeError(
+            "Computing peaks requires the 'peaks' extra to be installed"
+        ) from e
+
+    return numpy
+
+
+def _encode_level(
+    np: ModuleType,
+    mins: list,
+    maxs: list,
+    sample_rate: int,
+    samples_per_pixel: int,
+    bits: int,
+) -> bytes:
+    pairs = np.column_stack((np.concatenate(mins), np.concatenate(maxs)))
+
+    if bits == 8:
+        pairs = (pairs >> 8).astype(np.int8)
+
+    header = HEADER.pack(
+        FORMAT_VERSION,
+        FLAG_8_BIT if bits == 8 else 0,
+        sample_rate,
+        samples_per_pixel,
+        len(pairs),
+        1,
+    )
+
+    # Row-major, so the min and max of every pixel go together
+    return header + pairs.astype("<i2" if bits == 16 else np.int8).tobytes()
+
+
+def compute_peaks(path: str, config: Peaks) -> dict[int, bytes]:
+    """
+    Peaks of the audio file in the audiowaveform format by zoom level
+
+    The audio is decoded to mono 16-bit PCM by ffmpeg and streamed through in
+    chunks, every chunk is reduced to the min and max of every pixel of every
+    level at once. Meant for a process pool, the reduction holds the GIL.
+    """
+    np = require_numpy()
+    levels = sorted(set(config.levels))
+    pixel = math.lcm(*levels)
+    chunk_samples = max(CHUNK_SAMPLES // pixel, 1) * pixel
+
+    mins: dict[int, list] = {level: [] for level in levels}
+    maxs: dict[int, list] = {level: [] for level in levels}
+    starts = {level: np.arange(0, chunk_samples, level) for level in levels}
+
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(
+            [
+                config.decoder,
+                "-nostdin",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-i",
+                path,
+                "-map",
+                "0:a:0",
+                "-ac",
+                "1",
+                "-ar",
+                str(config.sample_rate),
+                "-f",
+                "s16le",
+                "-",
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=errors,
+        )
+
+        timed_out = threading.Event()
+
+        def kill() -> None:
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(config.timeout, kill)
+        timer.start()
+
+        try:
+            while data := process.stdout.read(chunk_samples * 2):
+                samples = np.frombuffer(data, dtype="<i2", count=len(data) // 2)
+                if not len(samples):
+                    continue
+
+                for level in levels:
+                    # The last chunk may end with a partial pixel
+                    indices = starts[level][: math.ceil(len(samples) / level)]
+                    mins[level].append(np.minimum.reduceat(samples, indices))
+                    maxs[level].append(np.maximum.reduceat(samples, indices))
+
+            process.wait()
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+        if timed_out.is_set():
+            raise PeaksError(f"Decoding timed out after {config.timeout} seconds")
+
+        if process.returncode:
+            errors.seek(0)
+            message = errors.read().decode(errors="replace").strip()[-500:]
+            raise PeaksError(
+                f"{config.decoder} exited with {process.returncode}: {message}"
+            )
+
+    return {
+        level: _encode_level(
+            np,
+            mins[level] or [np.empty(0, np.int16)],
+            maxs[level] or [np.empty(0, np.int16)],
+            config.sample_rate,
+            level,
+            config.bits,
+        )
+        for level in levels
+    }
@@ -0,0 +1,457 @@
+import asyncio
+import collections
+import contextvars
+import functools
+import hashlib
+import hmac
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import sysconfig
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any, Awaitable, Callable, TypeVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.config import BASE_DIR, get_settings
+
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+T = TypeVar("T", bound=type)
+
+PROFILE_ID_PATTERN = r"^\d{8}T\d{6}-[0-9a-f]{8}$"
+MAX_STACK_DEPTH = 128
+
+# Decided once at import, so with profiling off nothing gets wrapped at all
+_enabled = get_settings().profiling.enabled
+
+
+class Profile:
+    """
+    Span timings and stack samples of one profiled request
+    """
+
+    def __init__(self, trigger: str, method: str, path: str) -> None:
+        self.id = (
+            f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{secrets.token_hex(4)}"
+        )
+        self.trigger = trigger
+        self.method = method
+        self.path = path
+        self.route: str | None = None
+        self.status = 500
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.finished = False
+        # Span name to its count and inclusive time
+        self.spans: dict[str, list[float]] = {}
+        self.stacks: collections.Counter[str] = collections.Counter()
+
+    def add_span(self, name: str, seconds: float) -> None:
+        try:
+            span = self.spans[name]
+        except KeyError:
+            span = self.spans[name] = [0, 0.0]
+
+        span[0] += 1
+        span[1] += seconds
+
+    def dump(self, interval: float) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "trigger": self.trigger,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "samples": sum(self.stacks.values()),
+            "interval": interval,
+            "spans": {
+                name: {"count": int(count), "seconds": seconds}
+                for name, (count, seconds) in sorted(self.spans.items())
+            },
+            "stacks": dict(self.stacks.most_common()),
+        }
+
+
+# Profile of the request being served, shared with the tasks it spawns
+_profile: contextvars.ContextVar[Profile | None] = contextvars.ContextVar(
+    "profile", default=None
+)
+# Innermost span of the current task, so nested calls of one kind count once
+_span: contextvars.ContextVar[str | None] = contextvars.ContextVar("span", default=None)
+
+
+def current_profile() -> Profile | None:
+    return _profile.get()
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """
+    Time the coroutine function as a ``name`` span of the profiled request
+    """
+
+    def decorator(func: F) -> F:
+        if not _enabled:
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            profile = _profile.get()
+            if profile is None or _span.get() == name:
+                return await func(*args, **kwargs)
+
+            token = _span.set(name)
+            start = time.perf_counter()
+
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profile.add_span(name, time.perf_counter() - start)
+                _span.reset(token)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def traced_methods(name: str) -> Callable[[T], T]:
+    """
+    Apply ``traced`` to the public coroutine methods defined by the class
+    """
+
+    def decorator(cls: T) -> T:
+        if not _enabled:
+            return cls
+
+        for attr, value in list(vars(cls).items()):
+            if not attr.startswith("_") and inspect.iscoroutinefunction(value):
+                setattr(cls, attr, traced(name)(value))
+
+        return cls
+
+    return decorator
+
+
+def _short_path(filename: str) -> str:
+    _, sep, rest = filename.rpartition("site-packages/")
+    if sep:
+        return rest
+
+    for root in (str(BASE_DIR), sysconfig.get_path("stdlib")):
+        if filename.startswith(root + os.sep):
+            return os.path.relpath(filename, root)
+
+    return filename
+
+
+class Sampler:
+    """
+    Samples the event loop stack every ``interval`` seconds while any request
+    is profiled
+
+    A sample goes to the profile of the task running at that moment, found by
+    the task registered for the request or, on Python 3.12+, by the context of
+    the tasks it spawned. Time the loop spends idle or in worker threads isn't
+    sampled, the spans account for it.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active: dict[
+            asyncio.Task[Any], tuple[Profile, asyncio.AbstractEventLoop, int]
+        ] = {}
+        self._thread: threading.Thread | None = None
+        self._labels: dict[CodeType, str] = {}
+
+    def add(self, task: asyncio.Task[Any], profile: Profile) -> None:
+        with self._lock:
+            self._active[task] = (
+                profile,
+                asyncio.get_running_loop(),
+                threading.get_ident(),
+            )
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="profiler", daemon=True
+                )
+                self._thread.start()
+
+    def remove(self, task: asyncio.Task[Any]) -> None:
+        with self._lock:
+            entry = self._active.pop(task, None)
+            if entry is not None:
+                entry[0].finished = True
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+
+                self._sample()
+
+    def _sample(self) -> None:
+        frames = sys._current_frames()
+        loops = {(loop, thread_id) for _, loop, thread_id in self._active.values()}
+
+        for loop, thread_id in loops:
+            frame = frames.get(thread_id)
+            task = asyncio.current_task(loop)
+            if frame is None or task is None:
+                continue
+
+            if (entry := self._active.get(task)) is not None:
+                profile: Profile | None = entry[0]
+            elif get_context := getattr(task, "get_context", None):
+                profile = get_context().get(_profile)
+            else:
+                profile = None
+
+            if profile is not None and not profile.finished:
+                profile.stacks[self._stack(frame)] += 1
+
+    def _label(self, code: CodeType) -> str:
+        try:
+            return self._labels[code]
+        except KeyError:
+            label = self._labels[code] = (
+                f"{code.co_qualname} "
+                f"({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            )
+            return label
+
+    def _stack(self, frame: FrameType | None) -> str:
+        labels = []
+
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+
+        # Collapsed format, root first, as read by flamegraph tools
+        return ";".join(reversed(labels))
+
+
+class ProfileStore:
+    """
+    Keeps the latest ``max_profiles`` profiles as JSON files in ``directory``
+
+    Profile ids start with their UTC time, so file names sort by age.
+    """
+
+    def __init__(self, directory: Path, max_profiles: int) -> None:
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def _path(self, profile_id: str) -> Path:
+        if not re.match(PROFILE_ID_PATTERN, profile_id):
+            raise ValueError(f"Invalid profile id: {profile_id!r}")
+
+        return self.directory / f"{profile_id}.json"
+
+    def _ids(self) -> list[str]:
+        if not self.directory.is_dir():
+            return []
+
+        return sorted(
+            name.removesuffix(".json")
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        )
+
+    def save(self, data: dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        path = self._path(data["id"])
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+
+        for profile_id in self._ids()[: -self.max_profiles]:
+            self._path(profile_id).unlink(missing_ok=True)
+
+    def load(self, profile_id: str) -> dict[str, Any] | None:
+        try:
+            with open(self._path(profile_id)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def list(self) -> list[dict[str, Any]]:
+        """
+        Profiles without their samples, newest first
+        """
+        profiles = []
+
+        for profile_id in reversed(self._ids()):
+            if (data := self.load(profile_id)) is not None:
+                data.pop("stacks", None)
+                profiles.append(data)
+
+        return profiles
+
+
+def sign_debug_token(secret_key: str, expires: int) -> str:
+    """
+    Value of the debug header that profiles requests until ``expires``
+    """
+    signature = hmac.new(
+        secret_key.encode(), f"profile:{expires}".encode(), hashlib.sha256
+    ).hexdigest()
+
+    return f"{expires}.{signature}"
+
+
+def verify_debug_token(secret_key: str, token: str) -> bool:
+    expires, _, _ = token.partition(".")
+    if not expires.isdecimal() or int(expires) < time.time():
+        return False
+
+    return hmac.compare_digest(token, sign_debug_token(secret_key, int(expires)))
+
+
+class Profiler:
+    """
+    Decides which requests are profiled and keeps their results
+    """
+
+    def __init__(
+        self,
+        sample_rate: float,
+        header: str,
+        secret_key: str,
+        sampler: Sampler,
+        store: ProfileStore,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.header = header.lower().encode("latin-1")
+        self.secret_key = secret_key
+        self.sampler = sampler
+        self.store = store
+
+    def trigger(self, scope: Scope) -> str | None:
+        for name, value in scope["headers"]:
+            if name == self.header:
+                if verify_debug_token(self.secret_key, value.decode("latin-1")):
+                    return "header"
+                break
+
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+
+        return None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the sampled requests and those carrying a signed debug header
+
+    The profile is stored once the response is sent and its id is returned
+    in the ``X-Profile-Id`` response header. Other requests only pay for the
+    header lookup and a random draw.
+    """
+
+    def __init__(self, app: ASGIApp, profiler: Profiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (trigger := self.profiler.trigger(scope)) is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(trigger, scope["method"], scope["path"])
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"x-profile-id", profile.id.encode()),
+                    ],
+                }
+            await send(message)
+
+        task = asyncio.current_task()
+        assert task is not None
+        token = _profile.set(profile)
+        self.profiler.sampler.add(task, profile)
+        start = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration = time.perf_counter() - start
+            self.profiler.sampler.remove(task)
+            _profile.reset(token)
+
+            if (route := scope.get("route")) is not None:
+                profile.route = route.path
+
+            try:
+                await asyncio.to_thread(
+                    self.profiler.store.save,
+                    profile.dump(self.profiler.sampler.interval),
+                )
+            except OSError:
+                logger.exception("Failed to store profile %s", profile.id)
+
+
+@lru_cache
+def get_profile_store() -> ProfileStore:
+    settings = get_settings()
+
+    return ProfileStore(settings.profiling.dir, settings.profiling.max_profiles)
+
+
+@lru_cache
+def get_profiler() -> Profiler:
+    settings = get_settings()
+
+    return Profiler(
+        settings.profiling.sample_rate,
+        settings.profiling.header,
+        settings.profiling.secret_key or settings.auth.secret_key,
+        Sampler(settings.profiling.interval),
+        get_profile_store(),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Print a debug header value that profiles requests"
+    )
+    parser.add_argument(
+        "--ttl", type=int, default=600, help="Seconds the value stays valid"
+    )
+    args = parser.parse_args()
+
+    settings = get_settings()
+    token = sign_debug_token(
+        settings.profiling.secret_key or settings.auth.secret_key,
+        int(time.time()) + args.ttl,
+    )
+    print(f"{settings.profiling.header}: {token}")
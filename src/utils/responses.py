@@ -0,0 +1,248 @@
+import mmap
+import operator
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, BinaryIO, Callable
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+class RangeNotSatisfiableError(Exception):
+    pass
+
+
+def _is_number(value: str) -> bool:
+    # Plain ASCII digits, str.isdigit alone lets through what int() rejects
+    return value.isascii() and value.isdigit()
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range ``Range`` header into a ``[start, end)`` byte span
+
+    Returns ``None`` when the whole file should be sent: no header, a unit other
+    than bytes or a multi-range request, which RFC 9110 allows us to ignore.
+    """
+    if not header:
+        return None
+
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    first, sep, last = ranges.strip().partition("-")
+    # Either side may be missing, but not both, and what is there is a number
+    if (
+        not sep
+        or not (first or last)
+        or not all(_is_number(part) for part in (first, last) if part)
+    ):
+        raise RangeNotSatisfiableError
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiableError
+        return max(size - length, 0), size
+
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+
+    if start >= size or start >= end:
+        raise RangeNotSatisfiableError
+
+    return start, end
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+
+    tags = (tag.strip().removeprefix("W/") for tag in header.split(","))
+    return etag.removeprefix("W/") in tags
+
+
+def _is_not_modified(headers: Headers, etag: str, mtime: float) -> bool:
+    if if_none_match := headers.get("if-none-match"):
+        return _etag_matches(if_none_match, etag)
+
+    if if_modified_since := headers.get("if-modified-since"):
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+class RangeResponse(Response):
+    """
+    Response with ``Range``, ``ETag`` and ``Last-Modified`` support
+
+    Subclasses send the ``[start, end)`` span of the body in ``send_span``.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        mtime: float,
+        request_headers: Headers,
+        etag: str,
+        media_type: str,
+        method: str = "GET",
+    ) -> None:
+        self.background = None
+        self.send_body = method != "HEAD"
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(mtime, usegmt=True),
+            "cache-control": "private, no-cache",
+        }
+
+        self.start, self.end = 0, size
+        self.status_code = 200
+        self.media_type = media_type
+
+        if _is_not_modified(request_headers, etag, mtime):
+            self.status_code = 304
+            self.media_type = None
+            self.start = self.end = 0
+            self.init_headers(headers)
+            return
+
+        if_range = request_headers.get("if-range")
+        range_header = request_headers.get("range")
+        if if_range and if_range.strip() != etag:
+            range_header = None
+
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiableError:
+            self.status_code = 416
+            self.media_type = None
+            self.start = self.end = 0
+            headers["content-range"] = f"bytes */{size}"
+            headers["content-length"] = "0"
+            self.init_headers(headers)
+            return
+
+        if byte_range is not None:
+            self.start, self.end = byte_range
+            self.status_code = 206
+            headers["content-range"] = f"bytes {self.start}-{self.end - 1}/{size}"
+
+        headers["content-length"] = str(self.end - self.start)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+
+        if not self.send_body or self.start >= self.end:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        await self.send_span(scope, send)
+
+    async def send_span(self, scope: Scope, send: Send) -> None:
+        raise NotImplementedError
+
+
+class RangeFileResponse(RangeResponse):
+    """
+    Range response for a local file
+
+    The body goes out through the ASGI zero-copy send extension (``os.sendfile``
+    on the server side) when the server advertises it, otherwise the requested
+    span is memory mapped and sent in large chunks.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        mtime: float,
+        request_headers: Headers,
+        etag: str,
+        media_type: str,
+        method: str = "GET",
+    ) -> None:
+        self.path = path
+        super().__init__(size, mtime, request_headers, etag, media_type, method)
+
+    async def send_span(self, scope: Scope, send: Send) -> None:
+        file: BinaryIO = await anyio.to_thread.run_sync(open, self.path, "rb")
+
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": self.start,
+                        "count": self.end - self.start,
+                        "more_body": False,
+                    }
+                )
+            else:
+                await self._send_mapped(file, send)
+        finally:
+            await anyio.to_thread.run_sync(file.close)
+
+    async def _send_mapped(self, file: BinaryIO, send: Send) -> None:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+            for offset in range(self.start, self.end, self.chunk_size):
+                chunk_end = min(offset + self.chunk_size, self.end)
+
+                # Slicing may fault pages in from disk, keep it off the event loop
+                chunk = await anyio.to_thread.run_sync(
+                    operator.getitem, mapped, slice(offset, chunk_end)
+                )
+
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": chunk_end < self.end,
+                    }
+                )
+
+
+class RangeStreamResponse(RangeResponse):
+    """
+    Range response streaming the span from ``read(start, end)``
+    """
+
+    def __init__(
+        self,
+        read: Callable[[int, int], AsyncIterator[bytes]],
+        size: int,
+        mtime: float,
+        request_headers: Headers,
+        etag: str,
+        media_type: str,
+        method: str = "GET",
+    ) -> None:
+        self.read = read
+        super().__init__(size, mtime, request_headers, etag, media_type, method)
+
+    async def send_span(self, scope: Scope, send: Send) -> None:
+        async for chunk in self.read(self.start, self.end):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,354 @@
+import asyncio
+import contextlib
+import datetime as dt
+import hashlib
+import hmac
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from src.core.config import S3
+from src.utils.profiling import traced_methods
+from src.utils.storage import ObjectStat, StorageBackend
+
+if TYPE_CHECKING:
+    import httpx
+
+
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+
+class S3Error(Exception):
+    def __init__(self, status_code: int, body: str) -> None:
+        super().__init__(f"S3 request failed with {status_code}: {body[:500]}")
+        self.status_code = status_code
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def sign_request(
+    method: str,
+    host: str,
+    path: str,
+    query: dict[str, str],
+    headers: dict[str, str],
+    access_key: str,
+    secret_key: str,
+    region: str,
+    now: dt.datetime,
+    payload_hash: str = UNSIGNED_PAYLOAD,
+) -> dict[str, str]:
+    """
+    Sign a request with AWS Signature Version 4
+
+    ``path`` must already be URI-encoded. Returns ``headers`` along with the
+    date, payload hash and authorization headers, every one of them signed.
+    """
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+
+    headers = {
+        **{name.lower(): value.strip() for name, value in headers.items()},
+        "host": host,
+        "x-amz-content-sha256": payload_hash,
+        "x-amz-date": amz_date,
+    }
+    signed_headers = ";".join(sorted(headers))
+
+    canonical_request = "\n".join(
+        [
+            method,
+            path,
+            "&".join(
+                f"{_quote(name)}={_quote(value)}"
+                for name, value in sorted(query.items())
+            ),
+            "".join(f"{name}:{headers[name]}\n" for name in sorted(headers)),
+            signed_headers,
+            payload_hash,
+        ]
+    )
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+
+    key = f"AWS4{secret_key}".encode()
+    for part in (amz_date[:8], region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    headers["authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    del headers["host"]
+
+    return headers
+
+
+async def _iter_parts(
+    chunks: AsyncIterable[bytes], part_size: int
+) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+
+    async for chunk in chunks:
+        buffer += chunk
+
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+
+    if buffer:
+        yield bytes(buffer)
+
+
+def _check_xml(body: bytes, status_code: int) -> ElementTree.Element:
+    # Multipart completion and copies report errors in a 200 response
+    root = ElementTree.fromstring(body)
+
+    if root.tag.rpartition("}")[2] == "Error":
+        raise S3Error(status_code, body.decode(errors="replace"))
+
+    return root
+
+
+@traced_methods("io")
+class S3Backend(StorageBackend):
+    """
+    Keeps the objects in a bucket of an S3-compatible service
+
+    Requests are signed with SigV4 and sent path-style, so any endpoint that
+    speaks the S3 API works, AWS as well as MinIO or another local stand-in.
+    Streams larger than one part are sent as a multipart upload with up to
+    ``concurrency`` parts in flight, which also bounds the memory per upload.
+    Requires the ``s3`` extra.
+    """
+
+    def __init__(self, config: S3) -> None:
+        try:
+            import httpx
+        except ImportError as e:
+            raise RuntimeError(
+                "The S3 storage backend requires the 's3' extra to be installed"
+            ) from e
+
+        self.config = config
+        self._httpx = httpx
+        self._client: httpx.AsyncClient | None = None
+
+        endpoint = urlsplit(config.endpoint_url)
+        self._base_url = f"{endpoint.scheme}://{endpoint.netloc}"
+        self._host = endpoint.netloc
+        self._bucket_path = f"{endpoint.path.rstrip('/')}/{config.bucket}"
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            self._client = self._httpx.AsyncClient(timeout=self.config.timeout)
+
+        return self._client
+
+    def _request(
+        self,
+        method: str,
+        key: str,
+        query: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        content: bytes | None = None,
+    ) -> "httpx.Request":
+        path = _quote(f"{self._bucket_path}/{key}", safe="/-_.~")
+        query = query or {}
+
+        signed_headers = sign_request(
+            method,
+            self._host,
+            path,
+            query,
+            headers or {},
+            self.config.access_key,
+            self.config.secret_key,
+            self.config.region,
+            dt.datetime.now(dt.UTC),
+        )
+
+        url = self._base_url + path
+        if query:
+            url += "?" + "&".join(
+                f"{_quote(name)}={_quote(value)}" for name, value in query.items()
+            )
+
+        return self.client.build_request(
+            method, url, headers=signed_headers, content=content
+        )
+
+    async def _send(
+        self, request: "httpx.Request", expected: tuple[int, ...] = (200,)
+    ) -> "httpx.Response":
+        response = await self.client.send(request)
+
+        if response.status_code == 404:
+            raise FileNotFoundError(request.url.path)
+
+        if response.status_code not in expected:
+            raise S3Error(response.status_code, response.text)
+
+        return response
+
+    async def write(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        parts = _iter_parts(chunks, self.config.part_size)
+        first = await anext(parts, b"")
+        second = await anext(parts, None)
+
+        if second is None:
+            await self._send(self._request("PUT", key, content=first))
+            return len(first)
+
+        response = await self._send(self._request("POST", key, query={"uploads": ""}))
+        upload_id = _check_xml(response.content, response.status_code).findtext(
+            "{*}UploadId"
+        )
+
+        if not upload_id:
+            raise S3Error(response.status_code, response.text)
+
+        async def rest() -> AsyncIterator[bytes]:
+            yield first
+            yield second
+            async for part in parts:
+                yield part
+
+        try:
+            etags, size = await self._upload_parts(key, upload_id, rest())
+
+            body = "".join(
+                f"<Part><PartNumber>{number}</PartNumber>"
+                f"<ETag>{escape(etags[number])}</ETag></Part>"
+                for number in sorted(etags)
+            )
+            response = await self._send(
+                self._request(
+                    "POST",
+                    key,
+                    query={"uploadId": upload_id},
+                    content=(
+                        f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>"
+                    ).encode(),
+                )
+            )
+            _check_xml(response.content, response.status_code)
+        except BaseException:
+            # Parts of an abandoned upload are billed until it is aborted
+            with contextlib.suppress(Exception):
+                await asyncio.shield(
+                    self.client.send(
+                        self._request("DELETE", key, query={"uploadId": upload_id})
+                    )
+                )
+            raise
+
+        return size
+
+    async def _upload_parts(
+        self, key: str, upload_id: str, parts: AsyncIterator[bytes]
+    ) -> tuple[dict[int, str], int]:
+        semaphore = asyncio.Semaphore(self.config.concurrency)
+        etags: dict[int, str] = {}
+        size = 0
+
+        async def upload(number: int, data: bytes) -> None:
+            try:
+                response = await self._send(
+                    self._request(
+                        "PUT",
+                        key,
+                        query={"partNumber": str(number), "uploadId": upload_id},
+                        content=data,
+                    )
+                )
+                etags[number] = response.headers["etag"]
+            finally:
+                semaphore.release()
+
+        # A part is only read once a slot is free
+        try:
+            async with asyncio.TaskGroup() as group:
+                number = 0
+
+                async for data in parts:
+                    await semaphore.acquire()
+                    number += 1
+                    size += len(data)
+                    group.create_task(upload(number, data))
+        except ExceptionGroup as e:
+            raise e.exceptions[0]
+
+        return etags, size
+
+    async def read(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        if end is not None and end <= start:
+            return
+
+        headers = {}
+        if start or end is not None:
+            headers["range"] = f"bytes={start}-{'' if end is None else end - 1}"
+
+        response = await self.client.send(
+            self._request("GET", key, headers=headers), stream=True
+        )
+
+        try:
+            if response.status_code == 404:
+                raise FileNotFoundError(key)
+
+            if response.status_code not in (200, 206):
+                await response.aread()
+                raise S3Error(response.status_code, response.text)
+
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def stat(self, key: str) -> ObjectStat:
+        response = await self._send(self._request("HEAD", key))
+
+        return ObjectStat(
+            size=int(response.headers["content-length"]),
+            mtime=parsedate_to_datetime(response.headers["last-modified"]).timestamp(),
+        )
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self._send(self._request("DELETE", key), expected=(200, 204))
+        except FileNotFoundError:
+            pass
+
+    async def copy(self, src: str, dst: str) -> None:
+        response = await self._send(
+            self._request(
+                "PUT",
+                dst,
+                headers={
+                    "x-amz-copy-source": _quote(
+                        f"/{self.config.bucket}/{src}", safe="/-_.~"
+                    )
+                },
+            )
+        )
+        _check_xml(response.content, response.status_code)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
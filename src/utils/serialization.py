@@ -0,0 +1,89 @@
+from typing import Any, Callable, Coroutine
+
+import orjson
+from fastapi import Request, Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute, get_request_handler
+from pydantic import BaseModel
+
+
+class TrustedResponseField:
+    """
+    Response field letting instances of the response model through
+
+    They are trusted to be valid as is and serialized to JSON by pydantic-core
+    in one pass, the bytes go into the orjson response untouched. Anything
+    else, subclasses of the model included, is validated and serialized by
+    the wrapped field.
+    """
+
+    def __init__(self, field: Any, model: type[BaseModel]) -> None:
+        self.field = field
+        self.model = model
+
+    def validate(
+        self, value: Any, values: dict[str, Any], *, loc: tuple[int | str, ...] = ()
+    ) -> tuple[Any, list[Any]]:
+        if type(value) is self.model:
+            return value, []
+
+        return self.field.validate(value, values, loc=loc)
+
+    def serialize(self, value: Any, *, by_alias: bool = True, **kwargs: Any) -> Any:
+        if type(value) is self.model:
+            return orjson.Fragment(
+                self.model.__pydantic_serializer__.to_json(value, by_alias=by_alias)
+            )
+
+        return self.field.serialize(value, by_alias=by_alias, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.field, name)
+
+
+class TrustedSchemaRoute(APIRoute):
+    """
+    Route that skips re-validating a returned instance of its response model
+
+    Repositories build schemas from database rows, FastAPI would validate
+    and dump them once more before the response is encoded. Routes with
+    include/exclude options or a non-orjson response class behave as usual.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+
+        field = self.secure_cloned_response_field
+        trusted = (
+            field is not None
+            and isinstance(self.response_model, type)
+            and issubclass(self.response_model, BaseModel)
+            and issubclass(response_class, ORJSONResponse)
+            and self.response_model_include is None
+            and self.response_model_exclude is None
+            and not self.response_model_exclude_unset
+            and not self.response_model_exclude_defaults
+            and not self.response_model_exclude_none
+        )
+
+        if not trusted:
+            return super().get_route_handler()
+
+        return get_request_handler(
+            dependant=self.dependant,
+            body_field=self.body_field,
+            status_code=self.status_code,
+            response_class=self.response_class,
+            response_field=TrustedResponseField(field, self.response_model),
+            response_model_include=self.response_model_include,
+            response_model_exclude=self.response_model_exclude,
+            response_model_by_alias=self.response_model_by_alias,
+            response_model_exclude_unset=self.response_model_exclude_unset,
+            response_model_exclude_defaults=self.response_model_exclude_defaults,
+            response_model_exclude_none=self.response_model_exclude_none,
+            dependency_overrides_provider=self.dependency_overrides_provider,
+            embed_body_fields=self._embed_body_fields,
+        )
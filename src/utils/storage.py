@@ -0,0 +1,408 @@
+import asyncio
+import errno
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Callable
+
+import aiofiles
+import aiofiles.os
+
+from src.core.config import Settings, get_settings
+from src.utils.files import write_stream
+from src.utils.profiling import traced_methods
+
+
+@dataclass(frozen=True, slots=True)
+class ObjectStat:
+    size: int
+    mtime: float
+
+
+async def iter_file(
+    path: Path | str, chunk_size: int, start: int = 0, end: int | None = None
+) -> AsyncIterator[bytes]:
+    """
+    Read the ``[start, end)`` span of a local file in chunks
+    """
+    async with aiofiles.open(path, "rb") as file:
+        await file.seek(start)
+        remaining = end - start if end is not None else None
+
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = await file.read(size)
+            if not chunk:
+                return
+
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class StorageBackend(ABC):
+    """
+    Where the stored files live, addressed by ``/`` separated relative keys
+
+    Missing keys raise ``FileNotFoundError`` from ``stat``, ``read`` and
+    ``copy``, deleting one is a no-op.
+    """
+
+    chunk_size = 1024 * 1024
+
+    @abstractmethod
+    async def write(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """
+        Store the stream under ``key``, returns its size
+
+        The object shows up complete or not at all.
+        """
+
+    @abstractmethod
+    def read(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream the ``[start, end)`` span of the object
+        """
+
+    @abstractmethod
+    async def stat(self, key: str) -> ObjectStat: ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None: ...
+
+    @abstractmethod
+    async def copy(self, src: str, dst: str) -> None: ...
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await self.stat(key)
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    async def put_file(self, key: str, path: Path) -> None:
+        """
+        Store a local file under ``key``, the file may be moved away
+        """
+        await self.write(key, iter_file(path, self.chunk_size))
+
+    def local_path(self, key: str) -> str | None:
+        """
+        Path of the object on the local filesystem, if it is stored there
+        """
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+async def discard(path: Path | str) -> None:
+    if await aiofiles.os.path.exists(path):
+        await aiofiles.os.remove(path)
+
+
+@traced_methods("io")
+class LocalBackend(StorageBackend):
+    """
+    Keeps the objects as files under ``root``
+
+    Directories known to exist are remembered for the life of the process, so
+    storing a file doesn't pay a ``mkdir`` per call. One removed from under a
+    running process is created again on the first failed rename.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._dirs: set[Path] = set()
+
+    def path(self, key: str) -> Path:
+        if key.startswith("/") or ".." in key.split("/"):
+            raise ValueError(f"Invalid storage key: {key!r}")
+
+        return self.root / key
+
+    async def _makedirs(self, path: Path, force: bool = False) -> None:
+        if force or path not in self._dirs:
+            await aiofiles.os.makedirs(path, exist_ok=True)
+            self._dirs.add(path)
+
+    async def _replace(self, src: Path, dst: Path) -> None:
+        await self._makedirs(dst.parent)
+
+        try:
+            await aiofiles.os.replace(src, dst)
+        except FileNotFoundError:
+            await self._makedirs(dst.parent, force=True)
+            await aiofiles.os.replace(src, dst)
+
+    async def write(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        path = self.path(key)
+        await self._makedirs(path.parent)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4()}")
+        size = 0
+
+        try:
+            async with aiofiles.open(tmp_path, "wb") as file:
+                async for chunk in chunks:
+                    await file.write(chunk)
+                    size += len(chunk)
+
+            await self._replace(tmp_path, path)
+        finally:
+            await discard(tmp_path)
+
+        return size
+
+    def read(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        return iter_file(self.path(key), self.chunk_size, start, end)
+
+    async def stat(self, key: str) -> ObjectStat:
+        stat_result = await aiofiles.os.stat(self.path(key))
+
+        return ObjectStat(size=stat_result.st_size, mtime=stat_result.st_mtime)
+
+    async def delete(self, key: str) -> None:
+        await discard(self.path(key))
+
+    async def copy(self, src: str, dst: str) -> None:
+        """
+        Hard link ``src`` at ``dst``, an existing ``dst`` is kept
+
+        Copies are only made for content-addressed keys, so an existing
+        destination already has the same content.
+        """
+        src_path, dst_path = self.path(src), self.path(dst)
+        await self._makedirs(dst_path.parent)
+
+        try:
+            await aiofiles.os.link(src_path, dst_path)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            if not await aiofiles.os.path.exists(src_path):
+                raise
+
+            await self._makedirs(dst_path.parent, force=True)
+            await aiofiles.os.link(src_path, dst_path)
+        except OSError:
+            # Hard links don't cross filesystems, fall back to a copy
+            tmp_path = dst_path.with_name(f".{dst_path.name}.{uuid.uuid4()}")
+
+            try:
+                await asyncio.to_thread(shutil.copyfile, src_path, tmp_path)
+                await self._replace(tmp_path, dst_path)
+            finally:
+                await discard(tmp_path)
+
+    async def put_file(self, key: str, path: Path) -> None:
+        try:
+            await self._replace(path, self.path(key))
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+            await super().put_file(key, path)
+
+    def local_path(self, key: str) -> str | None:
+        return str(self.path(key))
+
+
+def _create_s3_backend(settings: Settings) -> StorageBackend:
+    from src.utils.s3 import S3Backend
+
+    return S3Backend(settings.storage.s3)
+
+
+STORAGE_BACKENDS: dict[str, Callable[[Settings], StorageBackend]] = {
+    "local": lambda settings: LocalBackend(settings.storage.root),
+    "s3": _create_s3_backend,
+}
+
+
+class BlobLayout:
+    """
+    Maps a hex digest to the blob's path relative to the blob prefix
+
+    ``levels`` nested directories are named after consecutive ``width`` digit
+    slices of the digest, so 2 and 2 give ``ab/cd/abcd...`` and 0 levels keep
+    every blob in the root.
+    """
+
+    def __init__(self, levels: int = 2, width: int = 2) -> None:
+        if levels < 0 or width < 1 or levels * width > 64:
+            raise ValueError("Invalid blob layout")
+
+        self.levels = levels
+        self.width = width
+
+    def relative_path(self, digest: str) -> str:
+        parts = [
+            digest[level * self.width : (level + 1) * self.width]
+            for level in range(self.levels)
+        ]
+
+        return "/".join([*parts, digest])
+
+
+class BlobStorage:
+    """
+    Content-addressed file store on top of a storage backend
+
+    Blobs are stored under ``blobs/`` as laid out by ``layout``. Uploads are
+    written to a local temp directory first and handed to the backend once
+    their hash is known.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        tmp_dir: Path,
+        layout: BlobLayout | None = None,
+    ) -> None:
+        self.backend = backend
+        self.tmp_dir = tmp_dir
+        self.layout = layout or BlobLayout()
+        self._tmp_dir_exists = False
+
+    def temp_path(self) -> Path:
+        if not self._tmp_dir_exists:
+            self.tmp_dir.mkdir(parents=True, exist_ok=True)
+            self._tmp_dir_exists = True
+
+        return self.tmp_dir / str(uuid.uuid4())
+
+    def blob_key(self, digest: str) -> str:
+        return f"blobs/{self.layout.relative_path(digest)}"
+
+    async def publish(self, tmp_path: Path, key: str, created: bool) -> None:
+        """
+        Store the uploaded temp file unless the blob is already stored
+        """
+        if not created and await self.backend.exists(key):
+            return
+
+        await self.backend.put_file(key, tmp_path)
+
+    @asynccontextmanager
+    async def open_local(self, key: str) -> AsyncIterator[str]:
+        """
+        Make the object available as a local file for the duration of the block
+        """
+        if path := self.backend.local_path(key):
+            yield path
+            return
+
+        tmp_path = self.temp_path()
+
+        try:
+            async with aiofiles.open(tmp_path, "wb") as file:
+                async for chunk in self.backend.read(key):
+                    await file.write(chunk)
+
+            yield str(tmp_path)
+        finally:
+            await discard(tmp_path)
+
+    @staticmethod
+    async def discard(path: Path | str) -> None:
+        await discard(path)
+
+
+@traced_methods("io")
+class UploadParts:
+    """
+    Part files of the resumable uploads, one per upload named after its id
+
+    They stay on the local disk whatever the storage backend, a finished part
+    is handed to the blob storage like any other upload.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._directory_exists = False
+
+    def path(self, upload_id: uuid.UUID) -> Path:
+        if not self._directory_exists:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._directory_exists = True
+
+        return self.directory / str(upload_id)
+
+    async def write(
+        self,
+        upload_id: uuid.UUID,
+        offset: int,
+        chunks: AsyncIterable[bytes],
+        max_size: int,
+    ) -> None:
+        """
+        Write the stream at ``offset`` of the part, up to ``max_size`` bytes
+
+        Raises ``FileNotFoundError`` if the part has less than ``offset`` bytes.
+        """
+        await write_stream(chunks, self.path(upload_id), max_size, offset=offset)
+
+    async def read_head(self, upload_id: uuid.UUID, size: int) -> bytes:
+        """
+        Up to ``size`` leading bytes of the part, empty if there is none
+        """
+        try:
+            async with aiofiles.open(self.path(upload_id), "rb") as f:
+                return await f.read(size)
+        except FileNotFoundError:
+            return b""
+
+    async def size(self, upload_id: uuid.UUID) -> int:
+        """
+        Bytes written to the part, 0 if there is none
+        """
+        try:
+            return (await aiofiles.os.stat(self.path(upload_id))).st_size
+        except FileNotFoundError:
+            return 0
+
+    async def link(self, upload_id: uuid.UUID, path: Path) -> None:
+        """
+        Make the part available at ``path`` too, keeping it in place
+        """
+        try:
+            await aiofiles.os.link(self.path(upload_id), path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            await asyncio.to_thread(shutil.copyfile, self.path(upload_id), path)
+
+    async def delete(self, upload_id: uuid.UUID) -> None:
+        await discard(self.path(upload_id))
+
+
+@lru_cache
+def get_storage_backend() -> StorageBackend:
+    settings = get_settings()
+
+    return STORAGE_BACKENDS[settings.storage.backend](settings)
+
+
+@lru_cache
+def get_blob_storage() -> BlobStorage:
+    settings = get_settings()
+
+    return BlobStorage(
+        get_storage_backend(),
+        settings.storage.root / "blobs" / "tmp",
+        BlobLayout(settings.storage.layout_levels, settings.storage.layout_width),
+    )
+
+
+@lru_cache
+def get_upload_parts() -> UploadParts:
+    return UploadParts(get_settings().storage.root / "uploads")
@@ -0,0 +1,136 @@
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Literal
+
+from src.schemas.user import UserTokenDataSchema
+from src.utils.cache import TTLCache
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+class JWTBackend(ABC):
+    """
+    JWT implementation used to sign and verify tokens
+    """
+
+    @abstractmethod
+    def encode(self, payload: dict[str, Any], key: str, algorithm: str) -> str: ...
+
+    @abstractmethod
+    def decode(self, token: str, key: str, algorithm: str) -> dict[str, Any]:
+        """
+        Verify the signature and the registered claims, raises ``InvalidTokenError``
+        """
+
+
+class JoseBackend(JWTBackend):
+    def __init__(self) -> None:
+        from jose import jwt, JWTError
+
+        self._jwt = jwt
+        self._error = JWTError
+
+    def encode(self, payload: dict[str, Any], key: str, algorithm: str) -> str:
+        return self._jwt.encode(payload, key, algorithm=algorithm)
+
+    def decode(self, token: str, key: str, algorithm: str) -> dict[str, Any]:
+        try:
+            return self._jwt.decode(token, key, algorithms=algorithm)
+        except self._error as e:
+            raise InvalidTokenError from e
+
+
+class PyJWTBackend(JWTBackend):
+    """
+    PyJWT based backend, requires the ``fast-jwt`` extra
+    """
+
+    def __init__(self) -> None:
+        try:
+            import jwt
+        except ImportError as e:
+            raise RuntimeError(
+                "The pyjwt backend requires the 'fast-jwt' extra to be installed"
+            ) from e
+
+        self._jwt = jwt
+        self._error = jwt.PyJWTError
+
+    def encode(self, payload: dict[str, Any], key: str, algorithm: str) -> str:
+        return self._jwt.encode(payload, key, algorithm=algorithm)
+
+    def decode(self, token: str, key: str, algorithm: str) -> dict[str, Any]:
+        try:
+            return self._jwt.decode(token, key, algorithms=[algorithm])
+        except self._error as e:
+            raise InvalidTokenError from e
+
+
+JWT_BACKENDS: dict[str, Callable[[], JWTBackend]] = {
+    "jose": JoseBackend,
+    "pyjwt": PyJWTBackend,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class VerifiedToken:
+    type: str | None
+    data: UserTokenDataSchema
+
+
+class TokenVerifier:
+    """
+    Verifies tokens through a JWT backend and remembers the verified ones
+
+    Entries are keyed by the token's SHA-256 digest and expire at the token's
+    ``exp``, so a cached token is accepted exactly as long as a full decode
+    would accept it. Only successfully verified tokens are cached.
+    """
+
+    def __init__(
+        self,
+        backend: JWTBackend,
+        secret_key: str,
+        algorithm: str = "HS256",
+        max_size: int = 10_000,
+        max_ttl: float = 60 * 60 * 24 * 7,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.backend = backend
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self._clock = clock
+        self._cache: TTLCache[bytes, VerifiedToken] = TTLCache(
+            max_size=max_size, ttl=max_ttl
+        )
+
+    def encode(self, payload: dict[str, Any]) -> str:
+        return self.backend.encode(payload, self.secret_key, self.algorithm)
+
+    def verify(self, token: str) -> VerifiedToken:
+        digest = hashlib.sha256(token.encode()).digest()
+
+        if verified := self._cache.get(digest):
+            return verified
+
+        payload = self.backend.decode(token, self.secret_key, self.algorithm)
+        verified = VerifiedToken(
+            type=payload.get("type"),
+            data=UserTokenDataSchema.model_validate(payload),
+        )
+
+        exp = payload.get("exp")
+        if exp is None:
+            self._cache.set(digest, verified)
+        elif (ttl := exp - self._clock()) > 0:
+            self._cache.set(digest, verified, ttl=ttl)
+
+        return verified
+
+
+def get_jwt_backend(name: Literal["jose", "pyjwt"]) -> JWTBackend:
+    return JWT_BACKENDS[name]()
@@ -0,0 +1,406 @@
+import asyncio
+import contextlib
+import datetime as dt
+import functools
+import logging
+import math
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import aiofiles.os
+from starlette.datastructures import Headers
+
+from src.core.config import Rendition, Settings, get_settings
+from src.db.routing import ReplicaRouter
+from src.db.session import router
+from src.db.uow import UnitOfWork
+from src.schemas.file import (
+    CreateRenditionSchema,
+    FileContentSchema,
+    ReadRenditionSchema,
+)
+from src.utils.profiling import traced_methods
+from src.utils.storage import BlobStorage, get_blob_storage
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Codec:
+    encoder: str
+    format: str
+    mime_type: str
+    extension: str
+
+
+CODECS = {
+    "opus": Codec("libopus", "ogg", "audio/ogg", "ogg"),
+    "mp3": Codec("libmp3lame", "mp3", "audio/mpeg", "mp3"),
+}
+
+# Roughly the downlink in kbit/s of the effective connection types, 4g is
+# left unconstrained
+ECT_DOWNLINKS = {"slow-2g": 50, "2g": 70, "3g": 700}
+
+# Share of the downlink a stream may take
+DOWNLINK_SHARE = 0.5
+
+# Bitrate in kbit/s assumed until the metadata is extracted, CD quality
+UNKNOWN_BITRATE = 1411
+
+# Client hints the choice of a rendition depends on
+CLIENT_HINTS = "Save-Data, ECT, Downlink"
+
+EVICT_BATCH_SIZE = 100
+
+# How often a process waiting for a rendition made by another one checks on it
+WAIT_INTERVAL = 0.5
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def _bitrate_budget(headers: Headers) -> float | None:
+    """
+    Kbit/s a stream may take according to the client hints, ``None`` if the
+    client hints no limit
+    """
+    if headers.get("save-data", "").strip().lower() == "on":
+        return 0
+
+    budgets = []
+
+    if (ect := headers.get("ect", "").strip().lower()) in ECT_DOWNLINKS:
+        budgets.append(ECT_DOWNLINKS[ect] * DOWNLINK_SHARE)
+
+    try:
+        # Mbit/s
+        downlink = float(headers.get("downlink", ""))
+    except ValueError:
+        pass
+    else:
+        if math.isfinite(downlink) and downlink >= 0:
+            budgets.append(downlink * 1000 * DOWNLINK_SHARE)
+
+    return min(budgets) if budgets else None
+
+
+def choose_rendition(
+    renditions: dict[str, Rendition], headers: Headers, bitrate: int | None
+) -> str | None:
+    """
+    Name of the rendition to stream instead of an original of ``bitrate``
+    bits per second, ``None`` to stream the original
+
+    Clients sending no hints get the original, as does one whose budget the
+    original fits. Otherwise the best rendition within the budget is taken,
+    or the smallest one if none fits. Opus is preferred by clients that
+    accept Ogg, everyone else gets MP3.
+    """
+    budget = _bitrate_budget(headers)
+    if budget is None or not renditions:
+        return None
+
+    source = bitrate / 1000 if bitrate else UNKNOWN_BITRATE
+    if source <= budget:
+        return None
+
+    codec = "opus" if "audio/ogg" in headers.get("accept", "") else "mp3"
+    candidates = sorted(
+        (rendition.bitrate, name)
+        for name, rendition in renditions.items()
+        if rendition.codec == codec
+    ) or sorted((rendition.bitrate, name) for name, rendition in renditions.items())
+
+    fitting = [candidate for candidate in candidates if candidate[0] <= budget]
+    rendition_bitrate, name = fitting[-1] if fitting else candidates[0]
+
+    return name if rendition_bitrate < source else None
+
+
+@traced_methods("transcode")
+class Transcoder:
+    """
+    Makes renditions of blobs on demand with a local ffmpeg
+
+    Making a rendition is single-flighted: the requests of a process share
+    one task, processes lease the rendition's row and wait for the one
+    holding it. No transaction stays open while encoding. Every process runs
+    up to ``concurrency`` encoders, each one in its own subprocess.
+    Renditions are stored next to their blob and evicted least recently used
+    first once they take more than the disk budget.
+    """
+
+    def __init__(
+        self, settings: Settings, router: ReplicaRouter, storage: BlobStorage
+    ) -> None:
+        self.settings = settings
+        self.router = router
+        self.storage = storage
+        self._semaphore = asyncio.Semaphore(settings.transcode.concurrency)
+        self._pending: dict[tuple[uuid.UUID, str], asyncio.Task] = {}
+
+    async def get(
+        self, uow: UnitOfWork, file: FileContentSchema, name: str
+    ) -> ReadRenditionSchema | None:
+        """
+        The rendition of the file's blob, made on the first request
+
+        ``None`` if it can't be made, the original has to do then.
+        """
+        try:
+            rendition = await uow.renditions.get_rendition(file.blob_id, name)
+
+            if rendition is None:
+                rendition = await self._make_shared(file, name)
+            else:
+                await self.touch(rendition)
+        except Exception:
+            logger.exception(
+                "Making the %s rendition of blob %s failed", name, file.blob_id
+            )
+            return None
+
+        return rendition
+
+    async def touch(self, rendition: ReadRenditionSchema) -> None:
+        """
+        Mark the rendition used, at most once per touch interval
+        """
+        age = dt.datetime.now(dt.UTC) - rendition.last_used_at
+        if age.total_seconds() < self.settings.transcode.touch_interval:
+            return
+
+        uow = UnitOfWork(self.router)
+
+        try:
+            await uow.renditions.touch(rendition.id)
+            await uow.commit()
+        finally:
+            await uow.close()
+
+    async def evict(self) -> None:
+        """
+        Delete the least recently used renditions until the rest fit the budget
+        """
+        uow = UnitOfWork(self.router)
+
+        try:
+            excess = (
+                await uow.renditions.total_size() - self.settings.transcode.disk_budget
+            )
+
+            while excess > 0:
+                renditions = await uow.renditions.lock_least_recent(EVICT_BATCH_SIZE)
+                if not renditions:
+                    break
+
+                victims = []
+                for rendition in renditions:
+                    if excess <= 0:
+                        break
+
+                    victims.append(rendition)
+                    excess -= rendition.size
+
+                # The rows go first, a crash in between leaves unreferenced
+                # objects rather than renditions without them
+                await uow.renditions.delete_renditions(
+                    [rendition.id for rendition in victims]
+                )
+                await uow.commit()
+
+                for rendition in victims:
+                    await self.storage.backend.delete(rendition.path)
+        finally:
+            await uow.close()
+
+    async def _make_shared(
+        self, file: FileContentSchema, name: str
+    ) -> ReadRenditionSchema:
+        key = (file.blob_id, name)
+        task = self._pending.get(key)
+
+        if task is None:
+            task = asyncio.create_task(self._make(file, name))
+            self._pending[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+
+        # A client going away doesn't cancel the encoding others wait for
+        return await asyncio.shield(task)
+
+    def _done(self, key: tuple[uuid.UUID, str], task: asyncio.Task) -> None:
+        del self._pending[key]
+
+        # Retrieved even if every waiter has gone, asyncio complains otherwise
+        if not task.cancelled():
+            task.exception()
+
+    async def _make(self, file: FileContentSchema, name: str) -> ReadRenditionSchema:
+        while True:
+            async with self._semaphore:
+                rendition_id, rendition = await self._claim(file, name)
+
+                if rendition_id is not None:
+                    rendition = await self._store(file, name, rendition_id)
+                    break
+
+            if rendition is not None:
+                return rendition
+
+            # Another process is making it
+            await asyncio.sleep(WAIT_INTERVAL)
+
+        try:
+            await self.evict()
+        except Exception:
+            logger.exception("Evicting renditions failed")
+
+        return rendition
+
+    async def _claim(
+        self, file: FileContentSchema, name: str
+    ) -> tuple[uuid.UUID | None, ReadRenditionSchema | None]:
+        """
+        Lease the rendition, or get it if it is made already
+        """
+        # The encoder is killed after the timeout, storing the result may take
+        # about as long again
+        lease_seconds = self.settings.transcode.timeout * 2
+        uow = UnitOfWork(self.router)
+
+        try:
+            rendition_id = await uow.renditions.claim_rendition(
+                file.blob_id, name, lease_seconds
+            )
+            rendition = (
+                None
+                if rendition_id
+                else await uow.renditions.get_rendition(file.blob_id, name)
+            )
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return rendition_id, rendition
+
+    async def _store(
+        self, file: FileContentSchema, name: str, rendition_id: uuid.UUID
+    ) -> ReadRenditionSchema:
+        """
+        Encode the leased rendition and record it
+        """
+        try:
+            data = await self._encode(file, name)
+        except BaseException:
+            await asyncio.shield(self._release(rendition_id))
+            raise
+
+        uow = UnitOfWork(self.router)
+
+        try:
+            rendition = await uow.renditions.finish_rendition(rendition_id, data)
+            if rendition is None:
+                # Made by a process that took over a lease run out, to the same
+                # key, or the blob is gone
+                rendition = await uow.renditions.get_rendition(file.blob_id, name)
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        if rendition is None:
+            await self.storage.backend.delete(data.path)
+            raise TranscodeError(f"Blob {file.blob_id} was deleted while encoding")
+
+        return rendition
+
+    async def _release(self, rendition_id: uuid.UUID) -> None:
+        uow = UnitOfWork(self.router)
+
+        try:
+            await uow.renditions.release_rendition(rendition_id)
+            await uow.commit()
+        except Exception:
+            logger.exception("Releasing rendition %s failed", rendition_id)
+        finally:
+            await uow.close()
+
+    async def _encode(
+        self, file: FileContentSchema, name: str
+    ) -> CreateRenditionSchema:
+        rendition = self.settings.transcode.renditions[name]
+        codec = CODECS[rendition.codec]
+        key = f"{file.path}.{name}.{codec.extension}"
+        tmp_path = self.storage.temp_path()
+
+        try:
+            # Files outside the local disk are encoded from a temporary copy
+            async with self.storage.open_local(file.path) as source:
+                await self._run_encoder(source, tmp_path, codec, rendition.bitrate)
+
+            size = (await aiofiles.os.stat(tmp_path)).st_size
+            await self.storage.backend.put_file(key, tmp_path)
+        finally:
+            await self.storage.discard(tmp_path)
+
+        return CreateRenditionSchema(
+            blob_id=file.blob_id,
+            name=name,
+            path=key,
+            size=size,
+            mime_type=codec.mime_type,
+        )
+
+    async def _run_encoder(
+        self, source: str, target: Path, codec: Codec, bitrate: int
+    ) -> None:
+        encoder = self.settings.transcode.encoder
+        process = await asyncio.create_subprocess_exec(
+            encoder,
+            "-nostdin",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            source,
+            # Just the audio, cover art would be taken for a video stream
+            "-map",
+            "0:a:0",
+            "-c:a",
+            codec.encoder,
+            "-b:a",
+            f"{bitrate}k",
+            "-f",
+            codec.format,
+            "-y",
+            str(target),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        try:
+            _, stderr = await asyncio.wait_for(
+                process.communicate(), self.settings.transcode.timeout
+            )
+        except BaseException:
+            # Timed out or cancelled by the shutdown
+            with contextlib.suppress(ProcessLookupError):
+                process.kill()
+            await process.wait()
+            raise
+
+        if process.returncode:
+            raise TranscodeError(
+                f"{encoder} exited with {process.returncode}: "
+                f"{stderr.decode(errors='replace').strip()[-500:]}"
+            )
+
+
+@lru_cache
+def get_transcoder() -> Transcoder:
+    return Transcoder(get_settings(), router, get_blob_storage())
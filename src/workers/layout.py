@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import uuid
+from collections import Counter
+from typing import Awaitable, TypeVar
+
+from src.core.config import Settings, get_settings
+from src.db.routing import ReplicaRouter
+from src.db.session import router
+from src.db.uow import UnitOfWork
+from src.schemas.file import CreateBlobSchema, ReadBlobSchema, ReadFileSchema
+from src.utils.mime import MimeDetector, get_mime_detector
+from src.utils.storage import BlobStorage, get_blob_storage
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _digest_file(path: str, chunk_size: int, sniff_size: int) -> tuple[str, int, bytes]:
+    """
+    Hash the file, returns the hex digest, the size and the leading bytes
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    with open(path, "rb") as file:
+        head = file.read(sniff_size)
+        digest.update(head)
+        size += len(head)
+
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+            size += len(chunk)
+
+    return digest.hexdigest(), size, head
+
+
+class LayoutMigrator:
+    """
+    Moves stored files to the configured storage layout while the app runs
+
+    Files from before the blob store are hashed into blobs, blobs stored under
+    another layout are moved to their current key. Each batch copies the files
+    to their new keys (a hard link on local disk), rewrites the rows and
+    commits before the old keys are deleted, so a reader always finds the key
+    it got from the database. Rows are locked with ``SKIP LOCKED`` and the
+    batches are repeatable, a stopped or contended migration is finished by
+    running it again.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        router: ReplicaRouter,
+        storage: BlobStorage,
+        detector: MimeDetector,
+    ) -> None:
+        self.settings = settings
+        self.router = router
+        self.storage = storage
+        self.detector = detector
+        self._semaphore = asyncio.Semaphore(settings.storage.migrate_concurrency)
+
+    async def _limited(self, aw: Awaitable[T]) -> T:
+        async with self._semaphore:
+            return await aw
+
+    async def _stage(self, file: ReadFileSchema) -> CreateBlobSchema | None:
+        try:
+            async with self.storage.open_local(file.path) as path:
+                digest, size, head = await asyncio.to_thread(
+                    _digest_file,
+                    path,
+                    self.settings.files.chunk_size,
+                    self.settings.files.sniff_size,
+                )
+        except FileNotFoundError:
+            logger.warning("File %s is missing at %s, skipped", file.id, file.path)
+            return None
+
+        return CreateBlobSchema(
+            hash=digest,
+            path=self.storage.blob_key(digest),
+            size=size,
+            mime_type=await self.detector.detect(head),
+        )
+
+    async def _delete(self, keys: list[str]) -> None:
+        await asyncio.gather(
+            *(self._limited(self.storage.backend.delete(key)) for key in keys)
+        )
+
+    async def migrate_legacy_files(self) -> tuple[int, int]:
+        """
+        Move the files kept in per-user directories into the blob store
+
+        Returns how many files were moved and how many were skipped.
+        """
+        batch_size = self.settings.storage.migrate_batch_size
+        after: uuid.UUID | None = None
+        moved = skipped = 0
+
+        while True:
+            uow = UnitOfWork(self.router)
+
+            try:
+                files = await uow.files.get_legacy_files(batch_size, after)
+            finally:
+                await uow.close()
+
+            if not files:
+                return moved, skipped
+
+            after = files[-1].id
+
+            # Hashing reads whole files, so it's done before any row is locked
+            staged = await asyncio.gather(
+                *(self._limited(self._stage(file)) for file in files)
+            )
+            blob_data = {
+                file.id: data for file, data in zip(files, staged) if data is not None
+            }
+
+            uow = UnitOfWork(self.router)
+
+            try:
+                locked = await uow.files.lock_legacy_files(list(blob_data))
+
+                # One blob per content, copied from the first of its files
+                sources: dict[str, ReadFileSchema] = {}
+                for file in locked:
+                    sources.setdefault(blob_data[file.id].hash, file)
+                refs = Counter(blob_data[file.id].hash for file in locked)
+
+                blobs: dict[str, tuple[ReadBlobSchema, bool]] = {}
+                if sources:
+                    blobs = await uow.blobs.acquire_blobs(
+                        [
+                            blob_data[file.id].model_copy(update={"refs": refs[digest]})
+                            for digest, file in sources.items()
+                        ]
+                    )
+
+                await asyncio.gather(
+                    *(
+                        self._limited(
+                            self.storage.backend.copy(sources[digest].path, blob.path)
+                        )
+                        for digest, (blob, created) in blobs.items()
+                        if created
+                    )
+                )
+
+                await uow.files.attach_blobs(
+                    {file.id: blobs[blob_data[file.id].hash][0] for file in locked}
+                )
+                await uow.commit()
+            finally:
+                await uow.close()
+
+            await self._delete([file.path for file in locked])
+
+            moved += len(locked)
+            skipped += len(files) - len(locked)
+            logger.info("Moved %d legacy files into the blob store", moved)
+
+    async def relayout_blobs(self) -> tuple[int, int]:
+        """
+        Move the blobs stored under another layout to their current keys
+
+        Returns how many blobs were moved and how many were skipped.
+        """
+        batch_size = self.settings.storage.migrate_batch_size
+        after: uuid.UUID | None = None
+        moved = skipped = 0
+
+        while True:
+            uow = UnitOfWork(self.router)
+
+            try:
+                blobs = await uow.blobs.get_blobs(batch_size, after)
+            finally:
+                await uow.close()
+
+            if not blobs:
+                return moved, skipped
+
+            after = blobs[-1].id
+            stale = [
+                blob.id
+                for blob in blobs
+                if blob.path != self.storage.blob_key(blob.hash)
+            ]
+
+            if not stale:
+                continue
+
+            uow = UnitOfWork(self.router)
+
+            try:
+                locked = [
+                    blob
+                    for blob in await uow.blobs.lock_blobs(stale)
+                    if blob.path != self.storage.blob_key(blob.hash)
+                ]
+
+                await asyncio.gather(
+                    *(
+                        self._limited(
+                            self.storage.backend.copy(
+                                blob.path, self.storage.blob_key(blob.hash)
+                            )
+                        )
+                        for blob in locked
+                    )
+                )
+
+                await uow.blobs.move_blobs(
+                    {blob.id: self.storage.blob_key(blob.hash) for blob in locked}
+                )
+                await uow.commit()
+            finally:
+                await uow.close()
+
+            await self._delete([blob.path for blob in locked])
+
+            moved += len(locked)
+            skipped += len(stale) - len(locked)
+            logger.info("Moved %d blobs to the current layout", moved)
+
+
+async def _main(command: str) -> None:
+    settings: Settings = get_settings()
+    detector = get_mime_detector()
+    migrator = LayoutMigrator(settings, router, get_blob_storage(), detector)
+
+    try:
+        if command in ("all", "legacy"):
+            moved, skipped = await migrator.migrate_legacy_files()
+            logger.info("Legacy files: %d moved, %d skipped", moved, skipped)
+
+        if command in ("all", "blobs"):
+            moved, skipped = await migrator.relayout_blobs()
+            logger.info("Blobs: %d moved, %d skipped", moved, skipped)
+    finally:
+        detector.shutdown()
+        await migrator.storage.backend.close()
+        await router.primary.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Move stored files to the configured storage layout"
+    )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="all",
+        choices=["all", "legacy", "blobs"],
+        help="move everything (default), only the files from before the blob "
+        "store, or only the blobs stored under another layout",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    asyncio.run(_main(args.command))
+
+
+if __name__ == "__main__":
+    main()
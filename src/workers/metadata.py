@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import logging
+import signal
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any
+
+from src.core.config import Settings, get_settings
+from src.db.routing import ReplicaRouter
+from src.db.session import router
+from src.db.uow import UnitOfWork
+from src.schemas.metadata import FileMetadataSchema, MetadataJobSchema
+from src.utils.audio import MetadataError, extract_metadata
+from src.utils.storage import BlobStorage, get_blob_storage
+
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataWorker:
+    """
+    Extracts audio metadata of the files queued in ``metadata_jobs``
+
+    Jobs are leased in batches with ``FOR UPDATE SKIP LOCKED``, so any number of
+    workers can share the queue. Header parsing runs in a process pool, the
+    event loop only talks to the database.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        router: ReplicaRouter,
+        executor: Executor,
+        storage: BlobStorage,
+    ) -> None:
+        self.settings = settings
+        self.router = router
+        self.executor = executor
+        self.storage = storage
+
+    async def _extract(self, job: MetadataJobSchema) -> dict[str, Any]:
+        # Files outside the local disk are parsed from a temporary copy
+        async with self.storage.open_local(job.path) as path:
+            timeout = self.settings.metadata.timeout
+
+            try:
+                return await asyncio.wait_for(
+                    asyncio.get_running_loop().run_in_executor(
+                        self.executor, extract_metadata, path
+                    ),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                raise MetadataError(
+                    f"Parsing timed out after {timeout} seconds"
+                ) from None
+
+    async def _claim(self) -> list[MetadataJobSchema]:
+        uow = UnitOfWork(self.router)
+
+        try:
+            jobs = await uow.metadata.claim_jobs(
+                self.settings.metadata.batch_size,
+                self.settings.metadata.lease_seconds,
+            )
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return jobs
+
+    async def run_once(self) -> int:
+        """
+        Process one batch of jobs, returns how many were claimed
+        """
+        jobs = await self._claim()
+        if not jobs:
+            return 0
+
+        results = await asyncio.gather(
+            *(self._extract(job) for job in jobs), return_exceptions=True
+        )
+
+        done: list[MetadataJobSchema] = []
+        extracted: list[FileMetadataSchema] = []
+        failed: list[MetadataJobSchema] = []
+        errors: list[str] = []
+
+        for job, result in zip(jobs, results):
+            try:
+                if isinstance(result, BaseException):
+                    raise result
+
+                extracted.append(FileMetadataSchema(file_id=job.file_id, **result))
+                done.append(job)
+            except Exception as e:
+                logger.warning("Metadata extraction failed for %s: %r", job.path, e)
+                failed.append(job)
+                errors.append(repr(e))
+
+        uow = UnitOfWork(self.router)
+
+        try:
+            await uow.metadata.finish_jobs([job.id for job in done], extracted)
+            await uow.metadata.fail_jobs(
+                failed, errors, self.settings.metadata.max_attempts
+            )
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return len(jobs)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("Metadata batch failed")
+                claimed = 0
+
+            # Keep draining while there is a backlog, poll once the queue is empty
+            if not claimed:
+                try:
+                    await asyncio.wait_for(
+                        stop.wait(), self.settings.metadata.poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def backfill(self) -> int:
+        """
+        Queue every file that has no metadata yet, one committed batch at a time
+        """
+        total = 0
+
+        while True:
+            uow = UnitOfWork(self.router)
+
+            try:
+                queued = await uow.metadata.enqueue_missing(
+                    self.settings.metadata.backfill_batch_size
+                )
+                await uow.commit()
+            finally:
+                await uow.close()
+
+            if not queued:
+                return total
+
+            total += queued
+            logger.info("Queued %d files for metadata extraction", total)
+
+    async def retry_failed(self) -> int:
+        uow = UnitOfWork(self.router)
+
+        try:
+            count = await uow.metadata.retry_failed()
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return count
+
+
+async def _main(command: str) -> None:
+    settings: Settings = get_settings()
+    executor = ProcessPoolExecutor(max_workers=settings.metadata.processes)
+    storage = get_blob_storage()
+    worker = MetadataWorker(settings, router, executor, storage)
+
+    try:
+        if command == "backfill":
+            logger.info("Queued %d files in total", await worker.backfill())
+        elif command == "retry-failed":
+            logger.info("Requeued %d failed jobs", await worker.retry_failed())
+        else:
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stop.set)
+
+            logger.info("Metadata worker started")
+            await worker.run(stop)
+    finally:
+        executor.shutdown()
+        await storage.backend.close()
+        await router.primary.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Audio metadata extraction worker")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="run",
+        choices=["run", "backfill", "retry-failed"],
+        help="process the queue (default), queue all files without metadata, "
+        "or give failed jobs another round of attempts",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    asyncio.run(_main(args.command))
+
+
+if __name__ == "__main__":
+    main()
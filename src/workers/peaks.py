@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import logging
+import signal
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator
+
+from src.core.config import Settings, get_settings
+from src.db.routing import ReplicaRouter
+from src.db.session import router
+from src.db.uow import UnitOfWork
+from src.schemas.peaks import PeaksJobSchema
+from src.utils.peaks import compute_peaks, level_key, require_numpy
+from src.utils.storage import BlobStorage, get_blob_storage
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _chunks(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+class PeaksWorker:
+    """
+    Computes the waveform peaks of the blobs queued in ``peaks``
+
+    Blobs are leased in batches with ``FOR UPDATE SKIP LOCKED`` like metadata
+    jobs. Every blob is decoded once, in a process pool, whatever number of
+    files share it.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        router: ReplicaRouter,
+        executor: Executor,
+        storage: BlobStorage,
+    ) -> None:
+        self.settings = settings
+        self.router = router
+        self.executor = executor
+        self.storage = storage
+
+    async def _compute(self, job: PeaksJobSchema) -> list[int]:
+        # Files outside the local disk are decoded from a temporary copy
+        async with self.storage.open_local(job.path) as path:
+            levels = await asyncio.get_running_loop().run_in_executor(
+                self.executor, compute_peaks, path, self.settings.peaks
+            )
+
+        for samples_per_pixel, data in levels.items():
+            await self.storage.backend.write(
+                level_key(job.path, samples_per_pixel), _chunks(data)
+            )
+
+        return list(levels)
+
+    async def _claim(self) -> list[PeaksJobSchema]:
+        uow = UnitOfWork(self.router)
+
+        try:
+            jobs = await uow.peaks.claim_jobs(
+                self.settings.peaks.batch_size,
+                self.settings.peaks.lease_seconds,
+            )
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return jobs
+
+    async def run_once(self) -> int:
+        """
+        Process one batch of blobs, returns how many were claimed
+        """
+        jobs = await self._claim()
+        if not jobs:
+            return 0
+
+        results = await asyncio.gather(
+            *(self._compute(job) for job in jobs), return_exceptions=True
+        )
+
+        failed: list[PeaksJobSchema] = []
+        errors: list[str] = []
+        orphaned: list[str] = []
+
+        uow = UnitOfWork(self.router)
+
+        try:
+            for job, result in zip(jobs, results):
+                if isinstance(result, BaseException):
+                    logger.warning(
+                        "Computing peaks failed for %s: %r", job.path, result
+                    )
+                    failed.append(job)
+                    errors.append(repr(result))
+                elif not await uow.peaks.finish_job(job, result):
+                    # The blob was reclaimed while it was being decoded
+                    orphaned += [level_key(job.path, level) for level in result]
+
+            await uow.peaks.fail_jobs(failed, errors, self.settings.peaks.max_attempts)
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        for key in orphaned:
+            await self.storage.backend.delete(key)
+
+        return len(jobs)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("Peaks batch failed")
+                claimed = 0
+
+            # Keep draining while there is a backlog, poll once the queue is empty
+            if not claimed:
+                try:
+                    await asyncio.wait_for(
+                        stop.wait(), self.settings.peaks.poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def backfill(self) -> int:
+        """
+        Queue every blob that has no peaks yet, one committed batch at a time
+        """
+        total = 0
+
+        while True:
+            uow = UnitOfWork(self.router)
+
+            try:
+                queued = await uow.peaks.enqueue_missing(
+                    self.settings.peaks.backfill_batch_size
+                )
+                await uow.commit()
+            finally:
+                await uow.close()
+
+            if not queued:
+                return total
+
+            total += queued
+            logger.info("Queued %d blobs for peaks", total)
+
+    async def retry_failed(self) -> int:
+        uow = UnitOfWork(self.router)
+
+        try:
+            count = await uow.peaks.retry_failed()
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return count
+
+
+async def _main(command: str) -> None:
+    settings: Settings = get_settings()
+    executor = ProcessPoolExecutor(max_workers=settings.peaks.processes)
+    storage = get_blob_storage()
+    worker = PeaksWorker(settings, router, executor, storage)
+
+    try:
+        if command == "backfill":
+            logger.info("Queued %d blobs in total", await worker.backfill())
+        elif command == "retry-failed":
+            logger.info("Requeued %d failed blobs", await worker.retry_failed())
+        else:
+            # Fail at the start rather than on every blob
+            require_numpy()
+
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stop.set)
+
+            logger.info("Peaks worker started")
+            await worker.run(stop)
+    finally:
+        executor.shutdown()
+        await storage.backend.close()
+        await router.primary.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Waveform peaks worker")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="run",
+        choices=["run", "backfill", "retry-failed"],
+        help="process the queue (default), queue all blobs without peaks, "
+        "or give failed blobs another round of attempts",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    asyncio.run(_main(args.command))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+from functools import lru_cache
+
+from src.core.config import Settings, get_settings
+from src.db.routing import ReplicaRouter
+from src.db.session import router
+from src.db.uow import UnitOfWork
+from src.utils.storage import (
+    StorageBackend,
+    UploadParts,
+    get_storage_backend,
+    get_upload_parts,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class StorageReaper:
+    """
+    Reclaims what deleted users and abandoned uploads leave behind
+
+    Deleting a user only marks it deleted. The reaper then drops the user's
+    files in batches, unlinks blobs that are no longer referenced and finally
+    deletes the user row. Resumable uploads that expired are deleted along
+    with their parts. Every step is committed on its own and repeating it
+    is harmless, so a reaper killed halfway just continues on the next run.
+    Rows are locked with ``SKIP LOCKED``, so the reapers of all app workers
+    share the work.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        router: ReplicaRouter,
+        backend: StorageBackend,
+        parts: UploadParts,
+    ) -> None:
+        self.settings = settings
+        self.router = router
+        self.backend = backend
+        self.parts = parts
+        self._wake = asyncio.Event()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def _delete(self, keys: list[str]) -> None:
+        semaphore = asyncio.Semaphore(self.settings.reaper.concurrency)
+
+        async def delete(key: str) -> None:
+            async with semaphore:
+                await self.backend.delete(key)
+
+        await asyncio.gather(*(delete(key) for key in keys))
+
+    async def reap_user_files(self) -> bool:
+        """
+        Drop one batch of a deleted user's files, or the user once none are left
+        """
+        uow = UnitOfWork(self.router)
+
+        try:
+            user_id = await uow.users.lock_deleted_user()
+            if user_id is None:
+                return False
+
+            file_ids = await uow.files.get_user_file_ids(
+                user_id, self.settings.reaper.batch_size
+            )
+
+            if file_ids:
+                # Files from before the blob store own their content
+                await self._delete(await uow.files.get_legacy_paths(file_ids))
+                await uow.blobs.release_file_blobs(file_ids)
+                await uow.files.delete_files(file_ids)
+            else:
+                # Unfinished uploads go with the user row, their parts don't
+                for upload_id in await uow.uploads.get_user_upload_ids(user_id):
+                    await self.parts.delete(upload_id)
+
+                await uow.users.delete_user(user_id)
+
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return True
+
+    async def reclaim_blobs(self) -> bool:
+        """
+        Unlink one batch of unreferenced blobs and delete their rows
+        """
+        uow = UnitOfWork(self.router)
+
+        try:
+            blobs = await uow.blobs.lock_unreferenced(self.settings.reaper.batch_size)
+            if not blobs:
+                return False
+
+            blob_ids = [blob.id for blob in blobs]
+
+            # Unlinked before the rows go, so a crash in between is retried.
+            # Renditions and peaks go with their blob
+            await self._delete(
+                [blob.path for blob in blobs]
+                + await uow.renditions.get_blob_rendition_paths(blob_ids)
+                + await uow.peaks.get_blob_peaks_keys(blob_ids)
+            )
+            await uow.blobs.delete_blobs(blob_ids)
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return True
+
+    async def reap_uploads(self) -> bool:
+        """
+        Delete one batch of expired uploads and their parts
+        """
+        uow = UnitOfWork(self.router)
+
+        try:
+            upload_ids = await uow.uploads.lock_expired(self.settings.reaper.batch_size)
+            if not upload_ids:
+                return False
+
+            for upload_id in upload_ids:
+                await self.parts.delete(upload_id)
+
+            await uow.uploads.delete_uploads(upload_ids)
+            await uow.commit()
+        finally:
+            await uow.close()
+
+        return True
+
+    async def run_once(self) -> bool:
+        """
+        Do one batch of each kind of work, returns whether there was any
+        """
+        reaped = await self.reap_user_files()
+        reclaimed = await self.reclaim_blobs()
+        expired = await self.reap_uploads()
+
+        return reaped or reclaimed or expired
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            self._wake.clear()
+
+            try:
+                busy = await self.run_once()
+            except Exception:
+                logger.exception("Storage reaper batch failed")
+                busy = False
+
+            if busy:
+                continue
+
+            # Sleep until the next poll, a deletion or the shutdown
+            wait_stop = asyncio.ensure_future(stop.wait())
+            wait_wake = asyncio.ensure_future(self._wake.wait())
+
+            await asyncio.wait(
+                [wait_stop, wait_wake],
+                timeout=self.settings.reaper.poll_interval,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            wait_stop.cancel()
+            wait_wake.cancel()
+
+
+@lru_cache
+def get_storage_reaper() -> StorageReaper:
+    return StorageReaper(
+        get_settings(), router, get_storage_backend(), get_upload_parts()
+    )
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from typing import AsyncIterator, Iterator
+
+import pytest
+
+from src.core.config import Settings
+
+
+# The settings are read on the first use, point them at a database and a
+# storage of the tests before that
+STORAGE_ROOT = tempfile.mkdtemp(prefix="test-storage-")
+os.environ["DB__DATABASE"] = f"{Settings().db.database}_test"
+os.environ["STORAGE__ROOT"] = STORAGE_ROOT
+os.environ.setdefault("REAPER__ENABLED", "false")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def storage_root() -> Iterator[str]:
+    yield STORAGE_ROOT
+    shutil.rmtree(STORAGE_ROOT, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def database() -> None:
+    """
+    ``<DB__DATABASE>_test`` recreated and migrated once per run, the tests
+    using it are skipped if Postgres is unreachable
+    """
+    from benchmarks.harness import reset_database
+    from src.core.config import get_settings
+
+    try:
+        asyncio.run(reset_database(get_settings().db, suffix="_test"))
+    except OSError as exc:
+        pytest.skip(f"Postgres is unreachable: {exc}")
+
+
+@pytest.fixture
+async def db(database: None) -> AsyncIterator[None]:
+    from src.db.session import engine
+
+    yield
+
+    # Pooled connections belong to the event loop of the test
+    await engine.dispose()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from src.db.models import User
+from src.db.session import engine
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def _live_users(yandex_id: str) -> int:
+    async with engine.connect() as connection:
+        return await connection.scalar(
+            select(func.count())
+            .select_from(User)
+            .where(User.yandex_id == yandex_id, User.deleted_at.is_(None))
+        )
+
+
+async def test_racing_first_logins_create_one_user(db):
+    from benchmarks.harness import asgi_client
+
+    async with asgi_client() as client:
+        responses = await asyncio.gather(
+            *(
+                client.get("/api/auth/callback", params={"code": "racing"})
+                for _ in range(20)
+            )
+        )
+        users = await asyncio.gather(
+            *(
+                client.get(
+                    "/api/users/my-info",
+                    headers={
+                        "Authorization": f"Bearer {response.json()['access_token']}"
+                    },
+                )
+                for response in responses
+                if response.status_code == 200
+            )
+        )
+
+    assert [response.status_code for response in responses] == [200] * 20
+    assert len({user.json()["id"] for user in users}) == 1
+    assert await _live_users("racing") == 1
+
+
+async def test_a_login_refreshes_the_cached_user(db, monkeypatch):
+    from benchmarks.app import StubYandexSSO
+    from benchmarks.harness import asgi_client
+
+    async with asgi_client() as client:
+        login = await client.get("/api/auth/callback", params={"code": "renamed"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        before = await client.get("/api/users/my-info", headers=headers)
+
+        verify = StubYandexSSO.verify_and_process
+
+        async def renamed(self, request):
+            return {**await verify(self, request), "first_name": "Renamed"}
+
+        monkeypatch.setattr(StubYandexSSO, "verify_and_process", renamed)
+        await client.get("/api/auth/callback", params={"code": "renamed"})
+        after = await client.get("/api/users/my-info", headers=headers)
+
+    assert before.json()["first_name"] == "Bench"
+    assert after.json()["first_name"] == "Renamed"
@@ -0,0 +1,120 @@
+import uuid
+
+import pytest
+
+from src.schemas.user import ReadUserSchema, UserTokenDataSchema
+from src.utils import auth
+from src.utils.auth import create_tokens, get_current_user
+from src.utils.cache import LocalInvalidationBackend, TTLCache, UserCache
+
+
+pytestmark = pytest.mark.anyio
+
+
+def _user(**update) -> ReadUserSchema:
+    user = ReadUserSchema(
+        id=uuid.uuid4(),
+        yandex_id="1",
+        username="user",
+        first_name="First",
+        last_name="Last",
+        email="user@example.com",
+        is_admin=True,
+    )
+    return user.model_copy(update=update)
+
+
+def _user_cache(max_size: int = 10) -> UserCache:
+    return UserCache(TTLCache(max_size=max_size, ttl=60), LocalInvalidationBackend())
+
+
+class RacingUserRepository:
+    """
+    On the first read, lets an update of the user commit and invalidate it
+    before the caller gets to cache the copy read
+    """
+
+    def __init__(self, user: ReadUserSchema, user_cache: UserCache) -> None:
+        self.user = user
+        self.user_cache = user_cache
+        self.raced = False
+
+    async def get_user_by_id(self, user_id: str) -> ReadUserSchema | None:
+        read = self.user
+
+        if not self.raced:
+            self.raced = True
+            self.user = read.model_copy(update={"is_admin": False})
+            await self.user_cache.invalidate(user_id)
+
+        return read
+
+
+class UnitOfWork:
+    def __init__(self, users: RacingUserRepository) -> None:
+        self.users = users
+
+    def bind_user(self, user_id: str) -> None:
+        pass
+
+    def read_primary(self) -> bool:
+        return True
+
+
+async def test_a_user_invalidated_while_read_is_not_cached(monkeypatch):
+    user = _user()
+    user_cache = _user_cache()
+    monkeypatch.setattr(auth, "get_user_cache", lambda: user_cache)
+
+    token = create_tokens(UserTokenDataSchema(user_id=str(user.id))).access_token
+    uow = UnitOfWork(RacingUserRepository(user, user_cache))
+
+    # Demoted while this request was reading it
+    assert (await get_current_user(f"Bearer {token}", uow)).is_admin
+    assert user_cache.get(user.id) is None
+
+    # The next request caches the demoted user
+    assert not (await get_current_user(f"Bearer {token}", uow)).is_admin
+    assert not user_cache.get(user.id).is_admin
+
+
+async def test_set_is_dropped_after_an_invalidation():
+    user, other = _user(), _user()
+    user_cache = _user_cache()
+
+    generation = user_cache.generation(user.id)
+    other_generation = user_cache.generation(other.id)
+    await user_cache.invalidate(user.id)
+    user_cache.set(user, generation)
+    user_cache.set(other, other_generation)
+
+    assert user_cache.get(user.id) is None
+    assert user_cache.get(other.id) == other
+
+    user_cache.set(user, user_cache.generation(user.id))
+
+    assert user_cache.get(user.id) == user
+
+
+async def test_set_is_dropped_after_a_reset():
+    user = _user()
+    user_cache = _user_cache()
+
+    generation = user_cache.generation(user.id)
+    user_cache.backend._reset()
+    user_cache.set(user, generation)
+
+    assert user_cache.get(user.id) is None
+
+
+async def test_forgotten_invalidations_still_drop_sets():
+    user = _user()
+    user_cache = _user_cache(max_size=2)
+
+    generation = user_cache.generation(user.id)
+    # More invalidations than are kept, the one of the user among them
+    for user_id in (user.id, uuid.uuid4(), uuid.uuid4()):
+        await user_cache.invalidate(user_id)
+    user_cache.set(user, generation)
+
+    assert user_cache.get(user.id) is None
@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from src.db.models import MetadataJob
+from src.db.session import engine, router
+from src.utils.storage import get_blob_storage
+from src.workers import metadata
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_a_stuck_file_fails_its_job(db, monkeypatch):
+    from benchmarks.harness import Seeder
+    from src.core.config import get_settings
+
+    seeder = Seeder()
+    (user,) = await seeder.users(1, "metadata")
+    blob_id, key = await seeder.blob(1024, seed=3)
+    await seeder.files(user.id, 1, blob_id, key)
+
+    async with engine.begin() as connection:
+        # Jobs of the other tests would be claimed along
+        await connection.execute(delete(MetadataJob))
+        await connection.execute(
+            insert(MetadataJob).values(file_id=await seeder.first_file(user.id))
+        )
+
+    release = threading.Event()
+    monkeypatch.setattr(
+        metadata, "extract_metadata", lambda path: release.wait(60) and {}
+    )
+
+    settings = get_settings()
+    settings = settings.model_copy(
+        update={"metadata": settings.metadata.model_copy(update={"timeout": 0.2})}
+    )
+    executor = ThreadPoolExecutor(max_workers=1)
+    worker = metadata.MetadataWorker(settings, router, executor, get_blob_storage())
+
+    try:
+        assert await worker.run_once() == 1
+    finally:
+        release.set()
+        executor.shutdown()
+
+    async with engine.connect() as connection:
+        job = (
+            await connection.execute(
+                select(
+                    MetadataJob.attempts,
+                    MetadataJob.failed,
+                    MetadataJob.locked_until,
+                    MetadataJob.error,
+                )
+            )
+        ).one()
+
+    # Released for a retry right away instead of waiting for the lease
+    assert job[:3] == (1, False, None)
+    assert "timed out after 0.2 seconds" in job.error
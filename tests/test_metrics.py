@@ -0,0 +1,36 @@
+import httpx
+import pytest
+from starlette.applications import Starlette
+
+from src.utils.instrumentation import MetricsExporter
+
+
+pytestmark = pytest.mark.anyio
+
+
+def _client(token: str | None) -> httpx.AsyncClient:
+    app = Starlette()
+    app.add_route("/metrics", MetricsExporter(None, 5.0, token).endpoint)
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+
+
+async def test_metrics_need_the_token():
+    async with _client("secret") as client:
+        missing = await client.get("/metrics")
+        wrong = await client.get(
+            "/metrics", headers={"Authorization": "Bearer not-the-secret"}
+        )
+        right = await client.get("/metrics", headers={"Authorization": "Bearer secret"})
+
+    assert missing.status_code == wrong.status_code == 401
+    assert missing.headers["www-authenticate"] == "Bearer"
+    assert right.status_code == 200
+    assert "http_requests_total" in right.text
+
+
+async def test_metrics_are_open_without_a_token():
+    async with _client(None) as client:
+        assert (await client.get("/metrics")).status_code == 200
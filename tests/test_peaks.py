@@ -0,0 +1,101 @@
+import random
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.core.config import Peaks
+from src.utils.peaks import HEADER, PeaksError, compute_peaks
+
+
+pytest.importorskip("numpy")
+
+# Stands in for ffmpeg: the input path is the number of samples to decode,
+# "bad" fails and "slow" hangs
+DECODER = """#!{python}
+import random, struct, sys, time
+
+source = sys.argv[sys.argv.index("-i") + 1]
+if source == "bad":
+    sys.exit("Invalid data found when processing input")
+if source == "slow":
+    time.sleep(60)
+
+count = int(source)
+rng = random.Random(count)
+sys.stdout.buffer.write(
+    struct.pack(f"<{{count}}h", *(rng.randint(-32768, 32767) for _ in range(count)))
+)
+"""
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Peaks:
+    decoder = tmp_path / "ffmpeg"
+    decoder.write_text(DECODER.format(python=sys.executable))
+    decoder.chmod(0o755)
+
+    # Levels whose least common multiple doesn't divide the chunks evenly
+    return Peaks(decoder=str(decoder), levels=[256, 768, 1024], timeout=5)
+
+
+def _samples(count: int) -> list[int]:
+    rng = random.Random(count)
+    return [rng.randint(-32768, 32767) for _ in range(count)]
+
+
+def _naive_peaks(samples: list[int], samples_per_pixel: int, bits: int) -> list:
+    pairs = []
+
+    for start in range(0, len(samples), samples_per_pixel):
+        pixel = samples[start : start + samples_per_pixel]
+        low, high = min(pixel), max(pixel)
+        pairs.append((low >> 8, high >> 8) if bits == 8 else (low, high))
+
+    return pairs
+
+
+def _parse(data: bytes) -> tuple[tuple, list]:
+    header = HEADER.unpack_from(data)
+    body = data[HEADER.size :]
+    values = (
+        struct.unpack(f"<{len(body)}b", body)
+        if header[1] & 1
+        else struct.unpack(f"<{len(body) // 2}h", body)
+    )
+
+    return header, list(zip(values[::2], values[1::2]))
+
+
+@pytest.mark.parametrize("bits", [8, 16])
+@pytest.mark.parametrize("count", [100, 1024 * 256 * 3 + 1000])
+def test_peaks_match_a_naive_reduction(config, bits, count):
+    config.bits = bits
+    samples = _samples(count)
+
+    peaks = compute_peaks(str(count), config)
+
+    assert sorted(peaks) == [256, 768, 1024]
+    for level, data in peaks.items():
+        header, pairs = _parse(data)
+
+        assert header == (2, 1 if bits == 8 else 0, 22050, level, len(pairs), 1)
+        assert pairs == _naive_peaks(samples, level, bits)
+
+
+def test_empty_audio_has_no_pixels(config):
+    for level, data in compute_peaks("0", config).items():
+        assert _parse(data) == ((2, 1, 22050, level, 0, 1), [])
+
+
+def test_decoder_errors_are_raised(config):
+    with pytest.raises(PeaksError, match="exited with 1: Invalid data"):
+        compute_peaks("bad", config)
+
+
+def test_decoding_times_out(config):
+    config.timeout = 0.5
+
+    with pytest.raises(PeaksError, match="timed out"):
+        compute_peaks("slow", config)
@@ -0,0 +1,125 @@
+import uuid
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from src.db.routing import ReplicaRouter
+from src.db.uow import UnitOfWork
+from src.schemas.user import ReadUserSchema, UserTokenDataSchema
+from src.utils import auth
+from src.utils.auth import create_tokens, get_current_user
+from src.utils.cache import LocalInvalidationBackend, TTLCache, UserCache
+
+
+pytestmark = pytest.mark.anyio
+
+
+def _engine(host: str) -> AsyncEngine:
+    # Never connected, sessions are only routed
+    return create_async_engine(f"postgresql+asyncpg://user:password@{host}/db")
+
+
+def _host(maker) -> str:
+    return maker.kw["bind"].url.host
+
+
+@pytest.fixture
+def engines() -> tuple[AsyncEngine, list[AsyncEngine]]:
+    return _engine("primary"), [_engine("replica-1"), _engine("replica-2")]
+
+
+def _router(engines: tuple[AsyncEngine, list[AsyncEngine]]) -> ReplicaRouter:
+    primary, replicas = engines
+    return ReplicaRouter(primary, replicas, stickiness=60)
+
+
+def test_writable_work_goes_to_the_primary(engines):
+    router = _router(engines)
+
+    assert _host(router.get_session_maker(read_only=False)) == "primary"
+
+
+def test_reads_go_round_robin_over_the_replicas(engines):
+    router = _router(engines)
+
+    hosts = [_host(router.get_session_maker(read_only=True)) for _ in range(4)]
+
+    assert hosts == ["replica-1", "replica-2", "replica-1", "replica-2"]
+
+
+def test_reads_go_to_the_primary_without_replicas(engines):
+    router = ReplicaRouter(engines[0])
+
+    assert _host(router.get_session_maker(read_only=True)) == "primary"
+
+
+def test_recent_writer_reads_from_the_primary_in_its_own_worker_only(engines):
+    worker, other_worker = _router(engines), _router(engines)
+
+    worker.mark_write({"user"})
+
+    assert _host(worker.get_session_maker(True, "user")) == "primary"
+    assert _host(worker.get_session_maker(True, "other")).startswith("replica")
+    assert _host(other_worker.get_session_maker(True, "user")).startswith("replica")
+
+
+def test_read_primary_routes_read_only_work_to_the_primary(engines):
+    uow = UnitOfWork(_router(engines), read_only=True)
+
+    assert uow.read_primary()
+    assert uow.session.bind.url.host == "primary"
+
+
+def test_read_primary_is_too_late_once_a_replica_session_is_open(engines):
+    uow = UnitOfWork(_router(engines), read_only=True)
+
+    assert uow.session.bind.url.host.startswith("replica")
+    assert not uow.read_primary()
+
+
+def test_writable_work_reads_from_the_primary_anyway(engines):
+    uow = UnitOfWork(_router(engines))
+    assert uow.session.bind.url.host == "primary"
+
+    assert uow.read_primary()
+
+
+class HostUserRepository:
+    """
+    Answers with the copy of the user the database the session is bound to has
+    """
+
+    def __init__(self, uow: UnitOfWork, users: dict[str, ReadUserSchema]) -> None:
+        self.uow = uow
+        self.users = users
+
+    async def get_user_by_id(self, user_id: str) -> ReadUserSchema | None:
+        host = self.uow.session.bind.url.host
+        return self.users["primary" if host == "primary" else "replica"]
+
+
+async def test_user_cache_is_never_filled_from_a_lagging_replica(engines, monkeypatch):
+    user_id = uuid.uuid4()
+    user = ReadUserSchema(
+        id=user_id,
+        yandex_id="1",
+        username="user",
+        first_name="First",
+        last_name="Last",
+        email="user@example.com",
+        is_admin=False,
+    )
+    # Demoted through another worker, the replicas haven't caught up yet
+    users = {"primary": user, "replica": user.model_copy(update={"is_admin": True})}
+
+    user_cache = UserCache(TTLCache(max_size=10, ttl=60), LocalInvalidationBackend())
+    monkeypatch.setattr(auth, "get_user_cache", lambda: user_cache)
+
+    token = create_tokens(UserTokenDataSchema(user_id=str(user_id))).access_token
+    uow = UnitOfWork(_router(engines), read_only=True)
+    uow.users = HostUserRepository(uow, users)
+
+    current_user = await get_current_user(f"Bearer {token}", uow)
+
+    assert not current_user.is_admin
+    assert user_cache.get(user_id) == user
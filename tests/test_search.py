@@ -0,0 +1,163 @@
+import uuid
+from typing import TYPE_CHECKING
+
+import pytest
+from sqlalchemy import insert
+
+from src.db.models import File
+from src.db.session import engine
+from src.schemas.user import ReadUserSchema
+
+if TYPE_CHECKING:
+    import httpx
+
+
+pytestmark = pytest.mark.anyio
+
+
+def _word() -> str:
+    # Unique to the test, the files of the other tests never match it
+    return f"w{uuid.uuid4().hex[:12]}"
+
+
+async def _add_files(
+    user: ReadUserSchema, *files: tuple[str, str | None]
+) -> list[uuid.UUID]:
+    async with engine.begin() as connection:
+        return list(
+            await connection.scalars(
+                insert(File)
+                .values(
+                    [
+                        {
+                            "user_id": user.id,
+                            "name": name,
+                            "path": f"legacy/{uuid.uuid4()}",
+                            "tags_text": tags,
+                        }
+                        for name, tags in files
+                    ]
+                )
+                .returning(File.id)
+            )
+        )
+
+
+def _headers(user: ReadUserSchema) -> dict[str, str]:
+    from benchmarks.harness import tokens
+
+    return {"Authorization": f"Bearer {tokens(user).access_token}"}
+
+
+async def test_files_of_deleted_users_are_hidden(db):
+    from benchmarks.harness import Seeder, asgi_client
+
+    seeder = Seeder()
+    (admin,) = await seeder.users(1, f"admin-{_word()}", is_admin=True)
+    (user,) = await seeder.users(1, f"user-{_word()}")
+    word = _word()
+    (file_id,) = await _add_files(user, (f"{word} song", None))
+
+    async with asgi_client() as client:
+        search = {"q": word, "everyone": "true"}
+        before = await client.get(
+            "/api/files/search", params=search, headers=_headers(admin)
+        )
+        deleted = await client.delete(f"/api/users/{user.id}", headers=_headers(admin))
+        after = await client.get(
+            "/api/files/search", params=search, headers=_headers(admin)
+        )
+        stream = await client.get(
+            f"/api/files/{file_id}/stream", headers=_headers(admin)
+        )
+
+    assert [item["id"] for item in before.json()["items"]] == [str(file_id)]
+    assert deleted.status_code == 204
+    assert after.json()["items"] == []
+    assert stream.status_code == 404
+
+
+async def _search(client, user: ReadUserSchema, **params) -> "httpx.Response":
+    return await client.get("/api/files/search", params=params, headers=_headers(user))
+
+
+async def test_name_prefixes_rank_above_word_matches(db):
+    from benchmarks.harness import Seeder, asgi_client
+
+    (user,) = await Seeder().users(1, f"rank-{_word()}")
+    word = _word()
+    prefix, in_name, in_tags, other = await _add_files(
+        user,
+        (f"{word} live", None),
+        (f"best of {word}", None),
+        ("untitled", f"{word} rock"),
+        ("unrelated", "jazz"),
+    )
+
+    async with asgi_client() as client:
+        response = await _search(client, user, q=word)
+        # Every word of the query has to match, as a prefix
+        narrowed = await _search(client, user, q=f"{word[:-2]} roc")
+
+    items = response.json()["items"]
+    assert [item["id"] for item in items][0] == str(prefix)
+    assert {item["id"] for item in items} == {str(prefix), str(in_name), str(in_tags)}
+    assert [item["rank"] for item in items] == sorted(
+        (item["rank"] for item in items), reverse=True
+    )
+    assert [item["id"] for item in narrowed.json()["items"]] == [str(in_tags)]
+
+
+async def test_search_pages_follow_the_cursor(db):
+    from benchmarks.harness import Seeder, asgi_client
+
+    (user,) = await Seeder().users(1, f"pages-{_word()}")
+    word = _word()
+    file_ids = await _add_files(user, *((f"{word} {i}", None) for i in range(7)))
+
+    pages = []
+    async with asgi_client() as client:
+        params = {"q": word, "limit": "3"}
+
+        while True:
+            page = (await _search(client, user, **params)).json()
+            pages.append([item["id"] for item in page["items"]])
+            if not page["next_cursor"]:
+                break
+            params["cursor"] = page["next_cursor"]
+
+        invalid = await _search(client, user, q=word, cursor="not-a-cursor")
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sorted(sum(pages, [])) == sorted(map(str, file_ids))
+    assert invalid.status_code == 400
+    assert invalid.json()["detail"] == "Invalid cursor"
+
+
+async def test_only_admins_search_everyone(db):
+    from benchmarks.harness import Seeder, asgi_client
+
+    seeder = Seeder()
+    (admin,) = await seeder.users(1, f"admin-{_word()}", is_admin=True)
+    first, second = await seeder.users(2, f"user-{_word()}")
+    word = _word()
+    (first_file,) = await _add_files(first, (f"{word} first", None))
+    (second_file,) = await _add_files(second, (f"{word} second", None))
+
+    async with asgi_client() as client:
+        own = await _search(client, first, q=word)
+        forbidden = await _search(client, first, q=word, everyone="true")
+        everyone = await _search(client, admin, q=word, everyone="true")
+        admin_own = await _search(client, admin, q=word)
+
+    assert [item["id"] for item in own.json()["items"]] == [str(first_file)]
+    assert forbidden.status_code == 403
+    assert {item["id"] for item in everyone.json()["items"]} == {
+        str(first_file),
+        str(second_file),
+    }
+    assert {item["user_id"] for item in everyone.json()["items"]} == {
+        str(first.id),
+        str(second.id),
+    }
+    assert admin_own.json()["items"] == []
@@ -0,0 +1,280 @@
+import asyncio
+import datetime as dt
+import hashlib
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import delete, func, select, update
+from starlette.datastructures import Headers
+
+from src.core.config import Rendition as RenditionSettings
+from src.core.config import get_settings
+from src.db.models import Rendition
+from src.db.session import engine, router
+from src.db.uow import UnitOfWork
+from src.schemas.file import FileContentSchema
+from src.utils.storage import get_blob_storage
+from src.utils.transcode import Transcoder, choose_rendition
+
+
+pytestmark = pytest.mark.anyio
+
+RENDITIONS = {
+    "opus-48": RenditionSettings(codec="opus", bitrate=48),
+    "opus-96": RenditionSettings(codec="opus", bitrate=96),
+    "mp3-96": RenditionSettings(codec="mp3", bitrate=96),
+    "mp3-160": RenditionSettings(codec="mp3", bitrate=160),
+}
+
+# Stands in for ffmpeg: counts its runs and writes the first 100 bytes of the
+# input to the output, the last argument
+ENCODER = """#!/bin/sh
+echo run >> {runs}
+sleep {delay}
+{stop}
+for arg; do target=$arg; done
+while [ $# -gt 0 ]; do [ "$1" = "-i" ] && source=$2; shift; done
+head -c 100 "$source" > "$target"
+"""
+
+
+def _choose(headers: dict[str, str], bitrate: int | None) -> str | None:
+    return choose_rendition(RENDITIONS, Headers(headers), bitrate)
+
+
+def test_no_hints_get_the_original():
+    assert _choose({}, 320_000) is None
+    assert _choose({"ect": "4g"}, 320_000) is None
+
+
+def test_save_data_gets_the_smallest_rendition():
+    assert _choose({"save-data": "on"}, 320_000) == "mp3-96"
+    assert _choose({"save-data": "on", "accept": "audio/ogg, */*"}, 320_000) == (
+        "opus-48"
+    )
+
+
+def test_slow_connections_get_what_fits():
+    # Until the metadata is extracted the original is taken for CD quality
+    assert _choose({"ect": "3g"}, None) == "mp3-160"
+    assert _choose({"ect": "3g"}, 320_000) is None
+    assert _choose({"downlink": "0.25", "accept": "audio/ogg"}, 320_000) == "opus-96"
+
+
+def test_originals_within_the_budget_are_kept():
+    assert _choose({"ect": "2g"}, 32_000) is None
+    assert _choose({"downlink": "10"}, 320_000) is None
+    assert _choose({"downlink": "nan"}, 320_000) is None
+
+
+class Encoder:
+    def __init__(self, directory: Path) -> None:
+        self.path = directory / "ffmpeg"
+        self.runs = directory / "runs"
+        self.write()
+
+    def write(self, stop: str = "") -> None:
+        self.path.write_text(ENCODER.format(runs=self.runs, delay=0.2, stop=stop))
+        self.path.chmod(0o755)
+
+    @property
+    def run_count(self) -> int:
+        return self.runs.read_text().count("run") if self.runs.exists() else 0
+
+
+@pytest.fixture
+def encoder(tmp_path: Path) -> Encoder:
+    return Encoder(tmp_path)
+
+
+def _transcoder(encoder: Encoder, **transcode) -> Transcoder:
+    settings = get_settings().model_copy(deep=True)
+    settings.transcode.encoder = str(encoder.path)
+    settings.transcode.renditions = RENDITIONS
+    for name, value in transcode.items():
+        setattr(settings.transcode, name, value)
+
+    return Transcoder(settings, router, get_blob_storage())
+
+
+async def _file(seed: int) -> FileContentSchema:
+    from benchmarks.harness import Seeder
+
+    blob_id, key = await Seeder().blob(1000, seed)
+
+    return FileContentSchema(
+        id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        name="track.mp3",
+        path=key,
+        blob_id=blob_id,
+        hash=None,
+        mime_type="audio/mpeg",
+    )
+
+
+async def _get(transcoder: Transcoder, file: FileContentSchema, name: str):
+    uow = UnitOfWork(router, read_only=True)
+
+    try:
+        return await transcoder.get(uow, file, name)
+    finally:
+        await uow.close()
+
+
+async def _names(blob_id: uuid.UUID) -> set[str]:
+    async with engine.connect() as connection:
+        return set(
+            await connection.scalars(
+                select(Rendition.name).where(Rendition.blob_id == blob_id)
+            )
+        )
+
+
+async def test_a_rendition_is_encoded_once(db, encoder):
+    file = await _file(1)
+    # Two processes, each with several requests for the same rendition
+    transcoders = [_transcoder(encoder), _transcoder(encoder)]
+
+    renditions = await asyncio.gather(
+        *(
+            _get(transcoder, file, "opus-48")
+            for transcoder in transcoders
+            for _ in range(4)
+        )
+    )
+
+    assert encoder.run_count == 1
+    assert len({rendition.id for rendition in renditions}) == 1
+    assert renditions[0].mime_type == "audio/ogg"
+    assert renditions[0].size == 100
+    assert await get_blob_storage().backend.stat(renditions[0].path)
+
+    # Made already
+    assert (await _get(transcoders[0], file, "opus-48")).id == renditions[0].id
+    assert encoder.run_count == 1
+
+
+async def test_a_failed_encoding_falls_back_and_is_retried(db, encoder):
+    file = await _file(2)
+    transcoder = _transcoder(encoder)
+    encoder.write(stop="echo broken >&2; exit 1")
+
+    assert await _get(transcoder, file, "mp3-96") is None
+    assert await _names(file.blob_id) == set()
+
+    encoder.write()
+
+    assert (await _get(transcoder, file, "mp3-96")).mime_type == "audio/mpeg"
+    assert encoder.run_count == 2
+
+
+async def test_a_timed_out_encoding_falls_back(db, encoder):
+    file = await _file(3)
+    transcoder = _transcoder(encoder, timeout=0.2)
+    # Exec'd, ffmpeg leaves no children holding on to its pipes
+    encoder.write(stop="exec sleep 60")
+
+    started = asyncio.get_running_loop().time()
+
+    assert await _get(transcoder, file, "mp3-96") is None
+    assert asyncio.get_running_loop().time() - started < 2
+    assert await _names(file.blob_id) == set()
+
+
+async def test_a_lease_run_out_is_taken_over(db, encoder):
+    file = await _file(4)
+    transcoder = _transcoder(encoder)
+
+    uow = UnitOfWork(router)
+    try:
+        # A process that died while encoding
+        assert await uow.renditions.claim_rendition(file.blob_id, "mp3-96", 60)
+        assert await uow.renditions.claim_rendition(file.blob_id, "mp3-96", 60) is None
+        await uow.session.execute(
+            update(Rendition)
+            .where(Rendition.blob_id == file.blob_id)
+            .values(locked_until=func.now() - dt.timedelta(seconds=1))
+        )
+        await uow.commit()
+    finally:
+        await uow.close()
+
+    assert (await _get(transcoder, file, "mp3-96")).size == 100
+    assert encoder.run_count == 1
+
+
+async def test_the_least_recently_used_renditions_are_evicted(db, encoder):
+    file = await _file(5)
+    transcoder = _transcoder(encoder)
+    storage = get_blob_storage()
+
+    # The budget is shared with the renditions of the other tests
+    async with engine.begin() as connection:
+        await connection.execute(delete(Rendition))
+
+    made = [await _get(transcoder, file, name) for name in RENDITIONS]
+
+    async with engine.begin() as connection:
+        for age, rendition in enumerate(reversed(made)):
+            await connection.execute(
+                update(Rendition)
+                .where(Rendition.id == rendition.id)
+                .values(last_used_at=func.now() - dt.timedelta(hours=age))
+            )
+
+    # Room for the two most recent ones
+    transcoder.settings.transcode.disk_budget = 250
+    await transcoder.evict()
+
+    kept = await _names(file.blob_id)
+    assert kept == {"mp3-96", "mp3-160"}
+
+    for rendition in made:
+        exists = await storage.backend.exists(rendition.path)
+        assert exists == (rendition.name in kept)
+
+
+async def test_streams_vary_with_the_client_hints(db, encoder, monkeypatch):
+    from benchmarks.harness import Seeder, asgi_client, payload, tokens
+
+    monkeypatch.setattr(get_settings().transcode, "encoder", str(encoder.path))
+    seeder = Seeder()
+    (user,) = await seeder.users(1, "stream")
+    blob_id, key = await seeder.blob(1000, 6)
+    await seeder.files(user.id, 1, blob_id, key)
+
+    digest = hashlib.sha256(payload(1000, 6)).hexdigest()
+    path = f"/api/files/{await seeder.first_file(user.id)}/stream"
+    headers = {"Authorization": f"Bearer {tokens(user).access_token}"}
+    slow = {**headers, "Save-Data": "on", "Accept": "audio/ogg"}
+
+    async with asgi_client() as client:
+        original = await client.get(path, headers=headers)
+        rendition = await client.get(path, headers=slow)
+        cached = await client.get(
+            path, headers={**slow, "If-None-Match": f'"{digest}"'}
+        )
+        explicit = await client.get(
+            path, params={"rendition": "original"}, headers=slow
+        )
+
+    assert original.status_code == 200
+    assert original.headers["etag"] == f'"{digest}"'
+    assert original.headers["vary"] == "Accept, Save-Data, ECT, Downlink"
+    assert original.headers["accept-ch"] == "Save-Data, ECT, Downlink"
+    assert len(original.content) == 1000
+
+    assert rendition.status_code == 200
+    assert rendition.headers["etag"] == f'"{digest}-opus-48"'
+    assert rendition.headers["content-type"] == "audio/ogg"
+    assert rendition.headers["vary"] == original.headers["vary"]
+    assert rendition.content == original.content[:100]
+
+    # The ETag of the original doesn't validate the rendition
+    assert cached.status_code == 200
+
+    assert explicit.headers["etag"] == f'"{digest}"'
+    assert "vary" not in explicit.headers
+    assert encoder.run_count == 1
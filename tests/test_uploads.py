@@ -0,0 +1,239 @@
+import asyncio
+import io
+import uuid
+import wave
+from typing import AsyncIterator
+
+import pytest
+from sqlalchemy import func, select, update
+
+from src.db.models import Upload
+from src.db.session import engine, router
+from src.schemas.user import ReadUserSchema
+from src.utils.storage import get_storage_backend, get_upload_parts
+
+
+pytestmark = pytest.mark.anyio
+
+
+def _wav(frames: int = 4000) -> bytes:
+    content = io.BytesIO()
+
+    with wave.open(content, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(8000)
+        audio.writeframes(bytes(range(256)) * (frames * 2 // 256))
+
+    return content.getvalue()
+
+
+@pytest.fixture
+async def user(db) -> ReadUserSchema:
+    from benchmarks.harness import Seeder
+
+    (user,) = await Seeder().users(1, f"uploads-{uuid.uuid4().hex[:8]}")
+    return user
+
+
+@pytest.fixture
+async def client(user):
+    from benchmarks.harness import asgi_client, tokens
+
+    async with asgi_client() as client:
+        client.headers["Authorization"] = f"Bearer {tokens(user).access_token}"
+        yield client
+
+
+async def _create(client, length: int, name: str = "track.wav") -> str:
+    response = await client.post(
+        "/api/files/uploads", json={"name": name, "length": length}
+    )
+    assert response.status_code == 201
+
+    return response.json()["id"]
+
+
+async def _append(client, upload_id: str, offset: int, content):
+    return await client.patch(
+        f"/api/files/uploads/{upload_id}",
+        content=content,
+        headers={"Upload-Offset": str(offset)},
+    )
+
+
+async def _offset(client, upload_id: str) -> int | None:
+    response = await client.head(f"/api/files/uploads/{upload_id}")
+
+    return int(response.headers["upload-offset"]) if response.is_success else None
+
+
+async def test_an_upload_is_resumed_and_finalized(client):
+    content = _wav()
+    upload_id = await _create(client, len(content))
+
+    # Shorter than the WAV signature, the type is checked on the next chunk
+    first = await _append(client, upload_id, 0, content[:6])
+    assert first.status_code == 204
+    assert first.headers["upload-offset"] == "6"
+    assert first.headers["upload-length"] == str(len(content))
+
+    assert await _offset(client, upload_id) == 6
+    assert (await _append(client, upload_id, 6, content[6:1000])).status_code == 204
+    assert (await client.post(f"/api/files/uploads/{upload_id}/finalize")).json()[
+        "detail"
+    ] == "Upload is not complete"
+    assert (await _append(client, upload_id, 1000, content[1000:])).status_code == 204
+
+    finalized = await client.post(f"/api/files/uploads/{upload_id}/finalize")
+    assert finalized.status_code == 201
+    assert finalized.json()["name"] == "track.wav"
+
+    stream = await client.get(f"/api/files/{finalized.json()['id']}/stream")
+    assert stream.content == content
+    assert stream.headers["content-type"] == "audio/wav"
+
+    assert await _offset(client, upload_id) is None
+    assert not get_upload_parts().path(uuid.UUID(upload_id)).exists()
+
+
+async def test_a_chunk_at_the_wrong_offset_is_rejected(client):
+    content = _wav()
+    upload_id = await _create(client, len(content))
+    await _append(client, upload_id, 0, content[:100])
+
+    for offset in (0, 50, 200):
+        response = await _append(client, upload_id, offset, content[offset:])
+
+        assert response.status_code == 409
+        assert response.json()["detail"] == "Upload offset mismatch"
+
+    assert await _offset(client, upload_id) == 100
+
+
+async def test_a_chunk_beyond_the_length_is_rejected(client):
+    content = _wav()
+    upload_id = await _create(client, 100)
+
+    response = await _append(client, upload_id, 0, content[:200])
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Chunk exceeds the upload length"
+
+
+async def test_a_type_not_allowed_deletes_the_upload(client):
+    upload_id = await _create(client, 5000)
+
+    # Too short to tell yet
+    assert (await _append(client, upload_id, 0, b"MZ")).status_code == 204
+
+    response = await _append(client, upload_id, 2, bytes(4998))
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "File type not allowed"
+    assert await _offset(client, upload_id) is None
+    assert not get_upload_parts().path(uuid.UUID(upload_id)).exists()
+
+
+async def test_an_upload_is_held_by_one_request(client):
+    content = _wav()
+    upload_id = await _create(client, len(content))
+    sent = asyncio.Event()
+    resume = asyncio.Event()
+
+    async def slow_body() -> AsyncIterator[bytes]:
+        yield content[:2048]
+        sent.set()
+        await resume.wait()
+        yield content[2048:]
+
+    slow = asyncio.create_task(_append(client, upload_id, 0, slow_body()))
+    await sent.wait()
+
+    concurrent = await _append(client, upload_id, 0, content)
+    finalize = await client.post(f"/api/files/uploads/{upload_id}/finalize")
+    resume.set()
+
+    assert concurrent.status_code == 409
+    assert concurrent.json()["detail"] == "Upload is in progress"
+    assert finalize.status_code == 409
+    assert (await slow).headers["upload-offset"] == str(len(content))
+
+
+async def test_a_lost_lease_leaves_the_upload_alone(client):
+    content = _wav()
+    upload_id = await _create(client, len(content))
+    sent = asyncio.Event()
+    resume = asyncio.Event()
+
+    async def slow_body() -> AsyncIterator[bytes]:
+        yield content[:2048]
+        sent.set()
+        await resume.wait()
+        yield content[2048:]
+
+    slow = asyncio.create_task(_append(client, upload_id, 0, slow_body()))
+    await sent.wait()
+
+    # The request looked dead and another one took the upload over
+    async with engine.begin() as connection:
+        await connection.execute(
+            update(Upload)
+            .where(Upload.id == uuid.UUID(upload_id))
+            .values(lock_token=uuid.uuid4())
+        )
+    resume.set()
+
+    response = await slow
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Upload is in progress"
+
+    async with engine.connect() as connection:
+        upload = (
+            await connection.execute(
+                select(Upload.offset, Upload.mime_type).where(
+                    Upload.id == uuid.UUID(upload_id)
+                )
+            )
+        ).one()
+
+    assert upload == (0, None)
+
+
+async def test_expired_uploads_are_reaped(client):
+    from src.core.config import get_settings
+    from src.workers.reaper import StorageReaper
+
+    content = _wav()
+    upload_id = await _create(client, len(content))
+    await _append(client, upload_id, 0, content[:3000])
+    part = get_upload_parts().path(uuid.UUID(upload_id))
+    assert part.exists()
+
+    async with engine.begin() as connection:
+        await connection.execute(
+            update(Upload)
+            .where(Upload.id == uuid.UUID(upload_id))
+            .values(expires_at=func.now())
+        )
+
+    assert await _offset(client, upload_id) is None
+    # Not resumable anymore, but nothing to append to either
+    assert (await _append(client, upload_id, 3000, content[3000:])).status_code == 404
+
+    reaper = StorageReaper(
+        get_settings(), router, get_storage_backend(), get_upload_parts()
+    )
+    while await reaper.reap_uploads():
+        pass
+
+    assert not part.exists()
+    async with engine.connect() as connection:
+        assert (
+            await connection.scalar(
+                select(func.count())
+                .select_from(Upload)
+                .where(Upload.id == uuid.UUID(upload_id))
+            )
+            == 0
+        )